@@ -14,8 +14,8 @@ cd ../..
 # Collect static files
 python manage.py collectstatic --noinput
 
-# Run migrations
-python manage.py migrate
+# Run migrations (records the fingerprint so the first boot can skip them)
+python manage.py migrate_if_needed
 
 # Create admin user if environment variables are set
 python manage.py create_admin
\ No newline at end of file
@@ -1,6 +1,46 @@
+import json
+
+from django.conf import settings
 from django.contrib import admin
+from django.contrib.admin.utils import unquote
+from django.core import signing
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.core.files import File
+from django.db import transaction
+from django.db.models import Max
+from django.http import Http404, JsonResponse
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.utils import timezone
+from django.utils.decorators import method_decorator
 from django.utils.html import format_html
-from .models import Profile, Project, ProjectRender, ContactMessage
+from django.views.decorators.http import require_http_methods, require_POST
+
+from . import background, chunked_uploads, spam, stats
+from .message_export import streaming_export
+from .models import Profile, Project, ProjectRender, ContactMessage, update_render_stats
+from .renditions import warm_renditions
+from .uploads import store_image
+
+# Signs the stored image of a finished upload until the renders are created
+RENDER_UPLOAD_SALT = 'main.admin.render-upload'
+
+
+def warm_render_renditions(render_ids):
+    """Background job queued by the bulk render upload"""
+    for render in ProjectRender.objects.filter(pk__in=render_ids):
+        warm_renditions(render.image)
+
+
+def json_body(request):
+    try:
+        return json.loads(request.body)
+    except ValueError:
+        raise chunked_uploads.UploadError('Invalid JSON.')
+
+
+def upload_error_response(error):
+    return JsonResponse({'error': str(error), 'offset': error.offset}, status=error.status)
 
 @admin.register(Profile)
 class ProfileAdmin(admin.ModelAdmin):
@@ -34,6 +74,7 @@ class ProjectAdmin(admin.ModelAdmin):
     list_display = (
         'title', 
         'project_type', 
+        'render_count',
         'is_featured', 
         'is_published', 
         'display_order',
@@ -80,6 +121,7 @@ class ProjectAdmin(admin.ModelAdmin):
     )
     
     inlines = [ProjectRenderInline]
+    change_form_template = 'admin/main/project/change_form.html'
     
     def project_image_preview(self, obj):
         if obj.featured_image:
@@ -89,6 +131,136 @@ class ProjectAdmin(admin.ModelAdmin):
             )
         return "-"
     project_image_preview.short_description = "Image Preview"
+    
+    # Bulk render upload: the files arrive in resumable chunks
+    # (main/chunked_uploads.py), the renders are created in one bulk insert
+    # and their renditions are warmed in the background
+    
+    def get_urls(self):
+        def view(function, name):
+            return path(
+                f'<path:object_id>/renders/upload/{name}',
+                self.admin_site.admin_view(function),
+                name=f"main_project_render_upload{'_' + name.strip('/') if name else ''}",
+            )
+        upload_urls = [
+            view(self.render_upload_view, ''),
+            view(self.render_upload_start_view, 'start/'),
+            view(self.render_upload_complete_view, 'complete/'),
+            path(
+                '<path:object_id>/renders/upload/<str:upload>/',
+                self.admin_site.admin_view(self.render_upload_chunk_view),
+                name='main_project_render_upload_chunk',
+            ),
+        ]
+        return upload_urls + super().get_urls()
+    
+    def get_upload_project(self, request, object_id):
+        project = self.get_object(request, unquote(object_id))
+        if project is None:
+            raise Http404
+        if not (self.has_change_permission(request, project) and request.user.has_perm('main.add_projectrender')):
+            raise PermissionDenied
+        return project
+    
+    def render_upload_view(self, request, object_id):
+        project = self.get_upload_project(request, object_id)
+        context = {
+            **self.admin_site.each_context(request),
+            'title': f'Upload renders: {project}',
+            'opts': self.model._meta,
+            'original': project,
+            'chunk_size': chunked_uploads.UPLOAD_CHUNK_SIZE,
+            'max_size': settings.RENDER_UPLOAD_MAX_SIZE,
+        }
+        return TemplateResponse(request, 'admin/main/project/render_upload.html', context)
+    
+    @method_decorator(require_POST)
+    def render_upload_start_view(self, request, object_id):
+        project = self.get_upload_project(request, object_id)
+        try:
+            data = json_body(request)
+            upload, offset = chunked_uploads.start(
+                project.pk, str(data['key']), str(data['name']), int(data['size'])
+            )
+        except (KeyError, TypeError, ValueError):
+            return JsonResponse({'error': 'key, name and size are required.'}, status=400)
+        except chunked_uploads.UploadError as e:
+            return upload_error_response(e)
+        url = reverse('admin:main_project_render_upload_chunk', args=[project.pk, upload])
+        return JsonResponse({'url': url, 'offset': offset})
+    
+    @method_decorator(require_http_methods(['PUT']))
+    def render_upload_chunk_view(self, request, object_id, upload):
+        project = self.get_upload_project(request, object_id)
+        try:
+            if chunked_uploads.metadata(upload)['scope'] != project.pk:
+                raise Http404
+            offset = chunked_uploads.append(
+                upload,
+                int(request.headers.get('Upload-Offset', -1)),
+                request,
+                int(request.META.get('CONTENT_LENGTH') or 0),
+            )
+            if not chunked_uploads.is_complete(upload):
+                return JsonResponse({'offset': offset})
+            token = self.store_upload(upload)
+        except ValueError:
+            return JsonResponse({'error': 'Upload-Offset header required.'}, status=400)
+        except chunked_uploads.UploadError as e:
+            return upload_error_response(e)
+        return JsonResponse({'offset': offset, 'token': token})
+    
+    def store_upload(self, upload):
+        """Move a finished upload into media storage; returns its signed token"""
+        name = chunked_uploads.metadata(upload)['name']
+        try:
+            with chunked_uploads.part_path(upload).open('rb') as content:
+                stored = store_image(ProjectRender._meta.get_field('image'), File(content, name=name))
+        except ValidationError as e:
+            raise chunked_uploads.UploadError(f'{name}: {e.messages[0]}')
+        finally:
+            chunked_uploads.discard(upload)
+        return signing.dumps(stored, salt=RENDER_UPLOAD_SALT)
+    
+    @method_decorator(require_POST)
+    def render_upload_complete_view(self, request, object_id):
+        project = self.get_upload_project(request, object_id)
+        try:
+            tokens = json_body(request).get('tokens', [])
+            if not isinstance(tokens, list) or not all(isinstance(token, str) for token in tokens):
+                raise chunked_uploads.UploadError('tokens must be a list of upload tokens.')
+            images = [
+                signing.loads(token, salt=RENDER_UPLOAD_SALT, max_age=settings.RENDER_UPLOAD_MAX_AGE)
+                for token in tokens
+            ]
+        except chunked_uploads.UploadError as e:
+            return upload_error_response(e)
+        except (AttributeError, signing.BadSignature):
+            return JsonResponse({'error': 'Invalid or expired upload.'}, status=400)
+        
+        with transaction.atomic():
+            last = project.renders.aggregate(last=Max('display_order'))['last']
+            first = 0 if last is None else last + 1
+            renders = ProjectRender.objects.bulk_create([
+                ProjectRender(
+                    project=project, image=name, image_width=width, image_height=height,
+                    display_order=first + i,
+                )
+                for i, (name, width, height) in enumerate(images)
+            ])
+            # bulk_create skips the signals that maintain these
+            update_render_stats([project.pk])
+            if renders:
+                stats.record('renders', timezone.now(), len(renders))
+        render_ids = [render.pk for render in renders]
+        transaction.on_commit(lambda: background.submit(warm_render_renditions, render_ids))
+        
+        self.message_user(request, f'Added {len(renders)} renders to {project}.')
+        return JsonResponse({
+            'created': len(renders),
+            'redirect': reverse('admin:main_project_change', args=[project.pk]),
+        })
 
 @admin.register(ProjectRender)
 class ProjectRenderAdmin(admin.ModelAdmin):
@@ -127,7 +299,8 @@ class ContactMessageAdmin(admin.ModelAdmin):
         'name', 'email', 'subject', 'message', 'ip_address', 
         'user_agent', 'created_at', 'updated_at'
     )
-    actions = ['mark_as_read', 'mark_as_replied', 'archive_messages']
+    actions = ['mark_as_read', 'mark_as_replied', 'archive_messages', 'export_csv', 'export_jsonl']
+    change_list_template = 'admin/main/contactmessage/change_list.html'
     
     fieldsets = (
         ('Message Details', {
@@ -146,6 +319,18 @@ class ContactMessageAdmin(admin.ModelAdmin):
         }),
     )
     
+    def changelist_view(self, request, extra_context=None):
+        # Submissions the spam pre-filter dropped before they got here
+        counts = spam.shed_counts()
+        extra_context = {
+            **(extra_context or {}),
+            'shed_counts': [
+                (reason.replace('_', ' '), counts['today'][reason], counts['week'][reason])
+                for reason in spam.COUNTED
+            ],
+        }
+        return super().changelist_view(request, extra_context)
+    
     def mark_as_read(self, request, queryset):
         updated = queryset.update(status='read')
         self.message_user(request, f'{updated} messages marked as read.')
@@ -161,6 +346,15 @@ class ContactMessageAdmin(admin.ModelAdmin):
         self.message_user(request, f'{updated} messages archived.')
     archive_messages.short_description = "Archive selected messages"
     
+    # Streamed row by row ("Select all" exports everything the filters match)
+    def export_csv(self, request, queryset):
+        return streaming_export(queryset, 'csv')
+    export_csv.short_description = "Export selected messages as CSV"
+    
+    def export_jsonl(self, request, queryset):
+        return streaming_export(queryset, 'jsonl')
+    export_jsonl.short_description = "Export selected messages as JSON Lines"
+    
     def has_add_permission(self, request):
         # Prevent adding messages through admin (they should come from contact form)
         return False
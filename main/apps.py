@@ -3,4 +3,17 @@ from django.apps import AppConfig
 class MainConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'main'
-    verbose_name = 'Main Portfolio'
\ No newline at end of file
+    verbose_name = 'Main Portfolio'
+    
+    def ready(self):
+        from django.conf import settings
+        # Already imported with the models (see sitecore/startup.py), so free here
+        from PIL import Image
+        from sitecore import sqlite_tuning, startup
+        
+        from . import signals  # noqa: F401
+        
+        # Pillow's own decompression bomb check (renditions, admin previews)
+        Image.MAX_IMAGE_PIXELS = settings.IMAGE_UPLOAD_MAX_PIXELS
+        sqlite_tuning.install()
+        startup.mark('apps ready')
@@ -0,0 +1,111 @@
+"""
+Async versions of the read-heavy public views.
+
+Used when the app runs under ASGI (``SERVER_MODE=asgi``). Each view fetches
+its querysets with the async ORM and hands plain lists to the same templates
+as the sync views in ``main/views.py``.
+
+Django 4.2's async ORM runs every query through sync_to_async on the
+thread-sensitive executor, one after another, so the views simply await
+their queries in turn: there is no parallelism to be had within a request.
+What they buy is that the event loop serves other requests while a view
+waits on the database.
+"""
+from asgiref.sync import sync_to_async
+from django.core.paginator import InvalidPage
+from django.http import Http404
+
+from . import spam, views
+from .context_processors import get_profile
+
+
+async def as_list(queryset):
+    """Evaluate a queryset with the async ORM"""
+    return [obj async for obj in queryset]
+
+
+class HomeView(views.HomeView):
+    """Homepage - profile, projects and featured projects"""
+
+    async def get(self, request, *args, **kwargs):
+        profile = await sync_to_async(get_profile)()
+        projects = await as_list(self.get_projects())
+        featured_projects = await as_list(self.get_featured_projects())
+        context = self.get_context_data(
+            profile=profile,
+            projects=projects,
+            featured_projects=featured_projects,
+            **spam.form_context(),
+            **kwargs
+        )
+        return self.render_to_response(context)
+
+    def get_context_data(self, **kwargs):
+        # Skip the sync queries in views.HomeView, everything is fetched in get()
+        return super(views.HomeView, self).get_context_data(**kwargs)
+
+
+class ProjectListView(views.ProjectListView):
+    """Project list - page, total count and type counts"""
+
+    async def get(self, request, *args, **kwargs):
+        self.object_list = self.get_queryset()
+        paginator = self.get_paginator(self.object_list, self.paginate_by)
+
+        total = await self.object_list.acount()
+        count_rows = await as_list(self.get_project_counts_queryset())
+        # Seed the paginator so it doesn't run its own COUNT query
+        paginator.count = total
+
+        page_number = self.kwargs.get(self.page_kwarg) or request.GET.get(self.page_kwarg) or 1
+        try:
+            if page_number == 'last':
+                page_number = paginator.num_pages
+            page = paginator.page(page_number)
+        except InvalidPage as e:
+            raise Http404(f'Invalid page ({page_number}): {e}')
+        page.object_list = await as_list(page.object_list)
+
+        self.page_result = (paginator, page, page.object_list, page.has_other_pages())
+        self.project_count_rows = count_rows
+        context = self.get_context_data()
+        return self.render_to_response(context)
+
+    def paginate_queryset(self, queryset, page_size):
+        return self.page_result
+
+    def get_project_counts(self, rows=None):
+        return super().get_project_counts(self.project_count_rows)
+
+
+class ProjectDetailView(views.ProjectDetailView):
+    """Project detail - the project with its renders, then the related projects"""
+
+    async def get(self, request, *args, **kwargs):
+        slug = self.kwargs.get(self.slug_url_kwarg)
+        try:
+            # Runs the prefetch of the renders too
+            self.object = await self.get_queryset().aget(slug=slug)
+        except self.model.DoesNotExist:
+            raise Http404('No project found matching the query')
+
+        related_projects = await as_list(self.get_related_projects(self.object))
+        context = self.get_context_data(related_projects=related_projects)
+        return self.render_to_response(context)
+
+
+class StatsView(views.StatsView):
+    """Statistics dashboard"""
+
+    async def get(self, request, *args, **kwargs):
+        counts = {name: await queryset.acount() for name, queryset in self.get_count_querysets().items()}
+        recent = {name: await as_list(queryset) for name, queryset in self.get_recent_querysets().items()}
+        by_type = await as_list(self.get_projects_by_type_queryset())
+        technologies = await as_list(self.get_technologies_queryset())
+
+        context = super(views.StatsView, self).get_context_data(**kwargs)
+        context.update(counts)
+        context.update(recent)
+        context['projects_by_type'] = self.get_projects_by_type(by_type)
+        context['technology_usage'] = self.get_technology_usage(technologies)
+        return self.render_to_response(context)
@@ -0,0 +1,39 @@
+"""
+In-process background jobs.
+
+The deployment is a single web service with no task queue, so work that
+shouldn't hold up a response (warming the renditions of bulk-uploaded
+renders) runs on one background thread of the worker process that queued
+it. Jobs run one at a time, in order. A job queued by a worker that is then
+killed is lost; what it would have produced is recreated on demand or by
+`manage.py optimize_images`.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_lock = threading.Lock()
+
+
+def run(job, args):
+    try:
+        job(*args)
+    except Exception:
+        logger.exception('Background job %s failed', job.__name__)
+    finally:
+        # The thread's own connections, the request threads' are untouched
+        connections.close_all()
+
+
+def submit(job, *args):
+    """Queue job(*args); returns its Future"""
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='background')
+    return _executor.submit(run, job, args)
@@ -0,0 +1,138 @@
+"""
+Resumable chunked uploads (the admin's bulk render upload).
+
+A file is sent as a series of raw request bodies of at most
+UPLOAD_CHUNK_SIZE bytes, each appended to a part file under
+RENDER_UPLOAD_DIR, so neither the chunks nor the assembled file are ever
+held in memory and no single request runs long:
+
+1. start(): the client names the file with a key of its own (name, size,
+   modification time); the same key maps to the same upload, so after a
+   dropped connection or a page reload the client asks again and continues
+   from the returned offset
+2. append(): a chunk is only accepted at the current offset
+3. when the offset reaches the announced size, the caller stores the file
+   and discard()s the upload
+
+Part files untouched for RENDER_UPLOAD_MAX_AGE seconds are pruned.
+"""
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Read size when copying a chunk from the request to the part file
+COPY_BUFFER = 64 * 1024
+
+
+class UploadError(Exception):
+    """A request the client has to correct; `status` is the HTTP status to answer with"""
+
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+def upload_dir():
+    path = Path(settings.RENDER_UPLOAD_DIR)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def upload_id(scope, key):
+    """
+    Stable id (also the part file's name) of a client's file within `scope`,
+    a JSON value identifying what the upload is for (e.g. the project id)
+    """
+    return hashlib.sha256(f'{scope}:{key}'.encode()).hexdigest()[:32]
+
+
+def paths(upload):
+    if len(upload) != 32 or not all(c in '0123456789abcdef' for c in upload):
+        raise UploadError('Unknown upload.', status=404)
+    directory = upload_dir()
+    return directory / f'{upload}.part', directory / f'{upload}.json'
+
+
+def prune(max_age=None):
+    max_age = settings.RENDER_UPLOAD_MAX_AGE if max_age is None else max_age
+    cutoff = time.time() - max_age
+    for path in upload_dir().iterdir():
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def start(scope, key, name, size):
+    """Begin or resume an upload; returns (upload id, offset to continue from)"""
+    if not 0 < size <= settings.RENDER_UPLOAD_MAX_SIZE:
+        raise UploadError(f'Files must be between 1 byte and {settings.RENDER_UPLOAD_MAX_SIZE} bytes.')
+    prune()
+    upload = upload_id(scope, key)
+    part, meta = paths(upload)
+    if meta.exists() and part.exists():
+        return upload, part.stat().st_size
+    meta.write_text(json.dumps({'scope': scope, 'name': os.path.basename(name), 'size': size}))
+    part.write_bytes(b'')
+    return upload, 0
+
+
+def metadata(upload):
+    _, meta = paths(upload)
+    try:
+        return json.loads(meta.read_text())
+    except FileNotFoundError:
+        raise UploadError('Unknown upload.', status=404)
+
+
+def append(upload, offset, stream, length):
+    """
+    Append `length` bytes read from `stream` at `offset`; returns the new
+    offset. A chunk at the wrong offset (a retry of one that did arrive)
+    is refused with the offset to continue from.
+    """
+    info = metadata(upload)
+    part, meta = paths(upload)
+    # Keeps an upload that is still in progress from being pruned
+    meta.touch()
+    current = part.stat().st_size
+    if offset != current:
+        raise UploadError('Chunk at the wrong offset.', status=409, offset=current)
+    if not 0 < length <= UPLOAD_CHUNK_SIZE or current + length > info['size']:
+        raise UploadError('Invalid chunk size.')
+
+    remaining = length
+    with part.open('ab') as output:
+        while remaining:
+            data = stream.read(min(COPY_BUFFER, remaining))
+            if not data:
+                break
+            output.write(data)
+            remaining -= len(data)
+    if remaining:
+        # Connection dropped mid-chunk: drop the partial chunk, the client resends it
+        os.truncate(part, current)
+        raise UploadError('Incomplete chunk.', offset=current)
+    return current + length
+
+
+def is_complete(upload):
+    part, _ = paths(upload)
+    return part.stat().st_size == metadata(upload)['size']
+
+
+def part_path(upload):
+    return paths(upload)[0]
+
+
+def discard(upload):
+    for path in paths(upload):
+        path.unlink(missing_ok=True)
@@ -0,0 +1,66 @@
+"""
+Template context shared by every page.
+
+base.html shows the Profile (name, social links) in the navigation and
+footer. The row is a singleton that almost never changes, so each worker
+process keeps the instance, with its srcset already computed, in memory
+instead of querying it per request.
+
+Workers find out about edits through a version key in the
+PROFILE_VERSION_CACHE cache, which every worker of a deployment shares: a
+Profile save or delete bumps it (main/signals.py) and a worker whose copy
+was loaded under another version reloads it. In the steady state a page gets
+the profile with one cache read and no queries.
+"""
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+
+PROFILE_VERSION_KEY = 'main:profile-version'
+
+# (version, Profile or None); replaced as a whole so threads never see half of it
+_profile = (None, None)
+
+
+def version_cache():
+    return caches[getattr(settings, 'PROFILE_VERSION_CACHE', 'default')]
+
+
+def profile_version():
+    cache = version_cache()
+    version = cache.get(PROFILE_VERSION_KEY)
+    if version is None:
+        # First worker after a cache flush; add() keeps a concurrent bump
+        cache.add(PROFILE_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(PROFILE_VERSION_KEY)
+    return version
+
+
+def bump_profile_version():
+    """Make every worker reload the Profile on its next request"""
+    version_cache().set(PROFILE_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def load_profile():
+    profile = apps.get_model('main', 'Profile').objects.first()
+    if profile is not None:
+        # cached_property: computed once per load, not per page
+        profile.profile_image_srcset
+    return profile
+
+
+def get_profile():
+    """The site's Profile (None before one is created)"""
+    global _profile
+    version = profile_version()
+    cached_version, profile = _profile
+    if cached_version != version:
+        profile = load_profile()
+        _profile = (version, profile)
+    return profile
+
+
+def profile(request):
+    return {'profile': get_profile()}
@@ -0,0 +1,306 @@
+"""
+Signed on-the-fly image resizes.
+
+The renditions in VERSATILEIMAGEFIELD_RENDITION_KEY_SETS are the only sizes
+versatileimagefield knows about, and production doesn't create those on
+demand either. resized_url() (the {% resized_image_url %} tag) instead
+builds a URL that names the size itself:
+
+    /images/<signature>/1280x960-fit-q80.webp/projects/featured/3f/a2/3fa2...c9.png
+
+    fit   scale to fit inside the box, never upscaled (0 leaves a side free)
+    crop  cover the box and trim the overflow, centred
+
+The signature covers the spec and the file name, so only URLs the site has
+rendered are ever encoded. get_resized() answers them:
+
+- the result is cached under IMAGE_RESIZE_CACHE_DIR, sharded by the hash of
+  the spec and name, and served from there by sitecore.media.serve_media
+- a variant is encoded once however many requests ask for it at the same
+  time (single_flight): threads wait on a per-variant lock, other worker
+  processes on one of LOCK_STRIPES lock files, and whoever gets the lock
+  second finds the file already written
+- the cache is kept under IMAGE_RESIZE_CACHE_MAX_BYTES by evicting the least
+  recently used files first, by access time: a hit sets its file's atime (at
+  most once per TOUCH_INTERVAL; explicitly, so noatime mounts don't matter)
+  and evict() removes the oldest down to EVICT_TO of the cap. The mtime is
+  left alone, it is what serve_media's ETag and Last-Modified come from.
+  Each worker counts what it writes and rescans the directory when its count
+  reaches the cap or after RESCAN_INTERVAL, so the cap can be overshot by
+  what the other workers wrote since then.
+"""
+import hashlib
+import io
+import os
+import re
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: only the threads of one process are coordinated
+    fcntl = None
+
+SIGNATURE_SALT = 'main.image_resize'
+
+# URL extension: (Pillow format, save options)
+FORMATS = {
+    'jpg': ('JPEG', {'optimize': True, 'progressive': True}),
+    'png': ('PNG', {'optimize': True}),
+    'webp': ('WEBP', {'method': 4}),
+}
+
+SPEC_RE = re.compile(r'^(\d{1,5})x(\d{1,5})-(fit|crop)-q(\d{1,3})\.(jpg|png|webp)$')
+
+LOCK_STRIPES = 256
+
+EVICT_TO = 0.9
+
+RESCAN_INTERVAL = 60
+
+TOUCH_INTERVAL = 600
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+# (bytes in the cache by this worker's count, time of the last scan)
+_usage = (None, 0)
+_usage_lock = threading.Lock()
+
+
+class ResizeError(ValueError):
+    pass
+
+
+def format_spec(width=0, height=0, mode='fit', image_format='jpg', quality=None):
+    if quality is None:
+        quality = settings.VERSATILEIMAGEFIELD_SETTINGS['jpeg_resize_quality']
+    spec = f'{width}x{height}-{mode}-q{quality}.{image_format}'
+    parse_spec(spec)
+    return spec
+
+
+def parse_spec(spec):
+    """(width, height, mode, quality, image_format) of a spec, or ResizeError"""
+    match = SPEC_RE.match(spec)
+    if not match:
+        raise ResizeError(f'Invalid resize spec {spec!r}')
+    width, height, mode, quality, image_format = match.groups()
+    width, height, quality = int(width), int(height), int(quality)
+    max_edge = settings.IMAGE_RESIZE_MAX_EDGE
+    if width > max_edge or height > max_edge:
+        raise ResizeError(f'Sizes are limited to {max_edge}px')
+    if mode == 'crop' and not (width and height):
+        raise ResizeError('crop needs both a width and a height')
+    if not (width or height):
+        raise ResizeError('Give a width, a height or both')
+    if not 1 <= quality <= 100:
+        raise ResizeError('quality goes from 1 to 100')
+    return width, height, mode, quality, image_format
+
+
+def signature(spec, name):
+    return signing.Signer(salt=SIGNATURE_SALT).signature(f'{spec}/{name}')
+
+
+def check_signature(value, spec, name):
+    # So the signature can't be guessed byte by byte from response times
+    return constant_time_compare(value, signature(spec, name))
+
+
+def resized_url(image, width=0, height=0, mode='fit', image_format=None, quality=None):
+    """
+    Signed URL of `image` (a file field value or a storage name) resized to
+    the box; image_format defaults to the original's when it is one of
+    FORMATS, JPEG otherwise.
+    """
+    name = getattr(image, 'name', image)
+    if image_format is None:
+        extension = os.path.splitext(name)[1].lower().lstrip('.')
+        image_format = {'jpeg': 'jpg'}.get(extension, extension)
+        if image_format not in FORMATS:
+            image_format = 'jpg'
+    spec = format_spec(width, height, mode, image_format, quality)
+    return reverse('resized_image', args=[signature(spec, name), spec, name])
+
+
+def cache_dir():
+    return Path(settings.IMAGE_RESIZE_CACHE_DIR)
+
+
+def cache_key(spec, name):
+    return hashlib.sha256(f'{spec}/{name}'.encode()).hexdigest()
+
+
+def cache_name(spec, name):
+    """Path of the variant relative to cache_dir()"""
+    key = cache_key(spec, name)
+    return f"{key[:2]}/{key}.{spec.rsplit('.', 1)[1]}"
+
+
+@contextmanager
+def file_lock(key):
+    if fcntl is None:
+        yield
+        return
+    lock_dir = cache_dir() / 'locks'
+    lock_dir.mkdir(parents=True, exist_ok=True)
+    # A fixed set of lock files, never deleted: removing a lock file while
+    # another process waits on it would let a third one in
+    with open(lock_dir / f'{int(key[:8], 16) % LOCK_STRIPES:03d}.lock', 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+@contextmanager
+def single_flight(key):
+    """Hold the variant's lock, shared by this process's threads and the other workers"""
+    with _flights_lock:
+        flight = _flights.setdefault(key, [threading.Lock(), 0])
+        flight[1] += 1
+    try:
+        with flight[0], file_lock(key):
+            yield
+    finally:
+        with _flights_lock:
+            flight[1] -= 1
+            if not flight[1]:
+                del _flights[key]
+
+
+def encode(name, width, height, mode, quality, image_format):
+    """The resized image as bytes"""
+    from PIL import Image, ImageOps
+
+    pillow_format, options = FORMATS[image_format]
+    with default_storage.open(name, 'rb') as original, Image.open(original) as image:
+        image = ImageOps.exif_transpose(image)
+        if mode == 'crop':
+            image = ImageOps.fit(image, (width, height), Image.LANCZOS)
+        else:
+            # thumbnail() keeps the aspect ratio and never upscales, so a
+            # free side only needs to be no smaller than the original's
+            image.thumbnail((width or image.width, height or image.height), Image.LANCZOS)
+
+        if pillow_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, 'white')
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        elif image.mode not in ('RGB', 'RGBA', 'L', 'LA', 'P'):
+            image = image.convert('RGBA')
+
+        buffer = io.BytesIO()
+        if pillow_format != 'PNG':
+            options = {**options, 'quality': quality}
+        image.save(buffer, pillow_format, **options)
+        return buffer.getvalue()
+
+
+def write_atomic(path, content):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as temp_file:
+            temp_file.write(content)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def cached_files():
+    """(atime, size, path) of every variant in the cache"""
+    files = []
+    with os.scandir(cache_dir()) as shards:
+        for shard in shards:
+            if shard.name == 'locks' or not shard.is_dir():
+                continue
+            with os.scandir(shard.path) as entries:
+                for entry in entries:
+                    if entry.name.endswith('.tmp'):
+                        continue
+                    try:
+                        stat_result = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    files.append((stat_result.st_atime, stat_result.st_size, entry.path))
+    return files
+
+
+def evict(max_bytes=None):
+    """Delete the least recently used variants until the cache is under the cap; returns its size"""
+    if max_bytes is None:
+        max_bytes = settings.IMAGE_RESIZE_CACHE_MAX_BYTES
+    files = cached_files()
+    total = sum(size for _, size, _ in files)
+    if total <= max_bytes:
+        return total
+    files.sort()
+    for _, size, path in files:
+        if total <= max_bytes * EVICT_TO:
+            break
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+    return total
+
+
+def record_write(size):
+    global _usage
+    with _usage_lock:
+        usage, scanned = _usage
+        now = time.monotonic()
+        if usage is None or usage + size > settings.IMAGE_RESIZE_CACHE_MAX_BYTES or now - scanned > RESCAN_INTERVAL:
+            _usage = (evict(), now)
+        else:
+            _usage = (usage + size, scanned)
+
+
+def touch(path, stat_result):
+    """Mark a variant as used, keeping its mtime (and so its validators)"""
+    if time.time() - stat_result.st_atime > TOUCH_INTERVAL:
+        try:
+            os.utime(path, ns=(time.time_ns(), stat_result.st_mtime_ns))
+        except FileNotFoundError:
+            pass
+
+
+def get_resized(name, spec):
+    """
+    Path relative to cache_dir() of `name` resized per `spec`, encoding it
+    if it isn't cached. Raises ResizeError for an invalid spec and
+    FileNotFoundError if there is no such original.
+    """
+    width, height, mode, quality, image_format = parse_spec(spec)
+    relative = cache_name(spec, name)
+    path = cache_dir() / relative
+    try:
+        touch(path, path.stat())
+        return relative
+    except FileNotFoundError:
+        pass
+
+    with single_flight(cache_key(spec, name)):
+        # Encoded while we waited for the lock
+        if path.exists():
+            return relative
+        content = encode(name, width, height, mode, quality, image_format)
+        write_atomic(path, content)
+    record_write(len(content))
+    return relative
@@ -0,0 +1,24 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from main.stats import backfill
+
+class Command(BaseCommand):
+    help = 'Recompute the daily stats rollup from the projects, renders and contact messages tables'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--start',
+            type=date.fromisoformat,
+            help='First day to recompute (YYYY-MM-DD, default: the beginning)',
+        )
+        parser.add_argument(
+            '--end',
+            type=date.fromisoformat,
+            help='Last day to recompute (YYYY-MM-DD, default: the latest)',
+        )
+    
+    def handle(self, *args, **options):
+        days = backfill(options['start'], options['end'])
+        self.stdout.write(self.style.SUCCESS(f'Recomputed {days} days of stats.'))
@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from whitenoise.compress import Compressor
+from pathlib import Path
+
+from sitecore.media import PRECOMPRESSED_ENCODINGS
+
+class Command(BaseCommand):
+    help = 'Write .br/.gz variants next to compressible files in MEDIA_ROOT (served by sitecore.media)'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Recompress files that already have up-to-date variants',
+        )
+    
+    def handle(self, *args, **options):
+        compressor = Compressor(quiet=True)
+        suffixes = tuple(suffix for _, suffix in PRECOMPRESSED_ENCODINGS)
+        root = Path(settings.MEDIA_ROOT)
+        compressed = skipped = 0
+        
+        for path in sorted(root.rglob('*')):
+            if not path.is_file() or path.name.endswith(suffixes) or not compressor.should_compress(path.name):
+                continue
+            
+            mtime = path.stat().st_mtime
+            variants = [path.with_name(path.name + suffix) for suffix in suffixes]
+            if not options['force'] and any(v.exists() and v.stat().st_mtime >= mtime for v in variants):
+                skipped += 1
+                continue
+            
+            written = list(compressor.compress(str(path)))
+            if written:
+                compressed += 1
+                self.stdout.write(f'{path.relative_to(root)}: {", ".join(Path(w).suffix for w in written)}')
+        
+        self.stdout.write(
+            self.style.SUCCESS(f'Compressed {compressed} files ({skipped} already up to date).')
+        )
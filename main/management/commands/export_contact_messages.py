@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+
+from main.message_export import CONTENT_TYPES, export_lines
+from main.models import ContactMessage
+
+class Command(BaseCommand):
+    help = 'Stream contact messages as CSV or JSON Lines (see main/message_export.py)'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format',
+            choices=list(CONTENT_TYPES),
+            default='csv',
+        )
+        parser.add_argument(
+            '--output',
+            default='-',
+            help='File to write, "-" (the default) for stdout',
+        )
+        parser.add_argument(
+            '--status',
+            choices=[choice[0] for choice in ContactMessage.STATUS_CHOICES],
+            help='Only messages with this status',
+        )
+        parser.add_argument(
+            '--include-archived',
+            action='store_true',
+            help='Also export archived messages',
+        )
+    
+    def handle(self, *args, **options):
+        queryset = ContactMessage.objects.order_by('created_at', 'pk')
+        if options['status']:
+            queryset = queryset.filter(status=options['status'])
+        if not options['include_archived']:
+            queryset = queryset.filter(is_archived=False)
+        
+        lines = export_lines(queryset, options['format'])
+        if options['output'] == '-':
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        
+        with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+            output.writelines(lines)
+        self.stdout.write(self.style.SUCCESS(f"Exported the messages to {options['output']}."))
@@ -0,0 +1,24 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from main.portfolio_archive import export_archive
+
+class Command(BaseCommand):
+    help = 'Write all projects, renders and their images to a single archive (see main/portfolio_archive.py)'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'archive',
+            help='Output file (.tar, or .tar.gz/.tgz to compress), "-" for stdout',
+        )
+    
+    def handle(self, *args, **options):
+        path = options['archive']
+        if path == '-':
+            # stdout carries the archive, nothing else may be written to it
+            export_archive(sys.stdout.buffer, log=self.stderr.write)
+            return
+        with open(path, 'wb') as output:
+            projects, files = export_archive(output, path, log=self.stderr.write)
+        self.stdout.write(self.style.SUCCESS(f'Exported {projects} projects and {files} media files to {path}.'))
@@ -0,0 +1,58 @@
+import os
+import sys
+import tarfile
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.portfolio_archive import import_archive
+
+class Command(BaseCommand):
+    help = 'Load an export_portfolio archive, creating or updating projects by slug'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'archive',
+            help='Archive written by export_portfolio, "-" for stdin',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=min(8, os.cpu_count() or 1),
+            help='Threads storing images and warming renditions',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Rows per bulk insert/update',
+        )
+        parser.add_argument(
+            '--no-warm',
+            action='store_true',
+            help='Leave the renditions to be created on first request',
+        )
+    
+    def handle(self, *args, **options):
+        path = options['archive']
+        kwargs = {
+            'workers': max(options['workers'], 1),
+            'batch_size': options['batch_size'],
+            'warm': not options['no_warm'],
+            'log': lambda message: self.stdout.write(self.style.WARNING(message)),
+        }
+        try:
+            if path == '-':
+                counts = import_archive(sys.stdin.buffer, **kwargs)
+            else:
+                with open(path, 'rb') as archive:
+                    counts = import_archive(archive, **kwargs)
+        except (OSError, ValueError, tarfile.TarError) as e:
+            raise CommandError(e)
+        
+        self.stdout.write(self.style.SUCCESS(
+            f"Projects: {counts['projects created']} created, {counts['projects updated']} updated, "
+            f"{counts['projects unchanged']} unchanged. "
+            f"Renders: {counts['renders created']} created, {counts['renders updated']} updated, "
+            f"{counts['renders unchanged']} unchanged. "
+            f"Stored {counts['media']} media files, warmed {counts['renditions']} renditions."
+        ))
@@ -0,0 +1,77 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.apps import apps
+from django.db import DatabaseError
+from django.db.migrations.loader import MigrationLoader
+from importlib.util import find_spec
+from pathlib import Path
+import hashlib
+import time
+
+from main.models import DeploymentState
+
+FINGERPRINT_KEY = 'migration_fingerprint'
+
+def migration_fingerprint():
+    """
+    Hash of every migration file of every installed app.
+
+    Only reads the files (no imports, no DB access), so it is much cheaper
+    than building the migration graph and checking it against the database.
+    """
+    digest = hashlib.sha256()
+    for app_config in sorted(apps.get_app_configs(), key=lambda app: app.label):
+        module_name, _ = MigrationLoader.migrations_module(app_config.label)
+        if module_name is None:
+            continue
+        try:
+            spec = find_spec(module_name)
+        except ModuleNotFoundError:
+            continue
+        if spec is None or not spec.submodule_search_locations:
+            continue
+        for location in spec.submodule_search_locations:
+            for path in sorted(Path(location).glob('*.py')):
+                if path.name == '__init__.py':
+                    continue
+                digest.update(f'{app_config.label}/{path.name}'.encode())
+                digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+class Command(BaseCommand):
+    help = 'Run migrate only when the migration files changed since the last run'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Run migrate even if the stored fingerprint matches',
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        fingerprint = migration_fingerprint()
+
+        try:
+            stored = DeploymentState.objects.filter(key=FINGERPRINT_KEY).values_list('value', flat=True).first()
+        except DatabaseError:
+            # Fresh database without our tables yet
+            stored = None
+
+        if stored == fingerprint and not options['force']:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'Migrations unchanged ({fingerprint[:12]}), skipped migrate '
+                    f'in {(time.perf_counter() - start) * 1000:.0f}ms.'
+                )
+            )
+            return
+
+        call_command('migrate', interactive=False, verbosity=options['verbosity'])
+        DeploymentState.objects.update_or_create(key=FINGERPRINT_KEY, defaults={'value': fingerprint})
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Migrated to {fingerprint[:12]} in {(time.perf_counter() - start) * 1000:.0f}ms.'
+            )
+        )
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from main.related import rebuild_index
+
+class Command(BaseCommand):
+    help = 'Recompute the related-projects index (refreshes the recency part of every score)'
+    
+    def handle(self, *args, **options):
+        rows = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {rows} related projects.'))
@@ -0,0 +1,100 @@
+from django.core.exceptions import ValidationError
+from django.core.files.images import get_image_dimensions
+from django.core.management.base import BaseCommand
+
+from main.models import Profile, Project, ProjectRender
+from main.uploads import ContentAddressedImageField, is_content_addressed, normalize_image
+
+# (model, field name) pairs stored with content-addressed names
+MEDIA_FIELDS = [
+    (Profile, 'profile_image'),
+    (Profile, 'resume'),
+    (Project, 'featured_image'),
+    (ProjectRender, 'image'),
+]
+
+class Command(BaseCommand):
+    help = 'Move existing uploads to their content-addressed, sharded names (normalizing images)'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report what would be moved',
+        )
+        parser.add_argument(
+            '--keep-old',
+            action='store_true',
+            help='Leave the old files (and their renditions) in storage',
+        )
+    
+    def handle(self, *args, **options):
+        moved = 0
+        old_names = set()
+        
+        for model, field_name in MEDIA_FIELDS:
+            field = model._meta.get_field(field_name)
+            queryset = model.objects.exclude(**{f'{field_name}__isnull': True}).exclude(**{field_name: ''})
+            
+            is_image = isinstance(field, ContentAddressedImageField)
+            
+            for pk, name in queryset.values_list('pk', field_name).iterator(chunk_size=200):
+                # Content-addressed images may still predate upload normalization
+                if is_content_addressed(name) and not is_image:
+                    continue
+                
+                storage = field.storage
+                if not storage.exists(name):
+                    self.stdout.write(self.style.WARNING(f'{model.__name__} {pk}: {name} is missing, skipped'))
+                    continue
+                
+                updates = {}
+                with storage.open(name, 'rb') as content:
+                    if is_image:
+                        try:
+                            _, content = normalize_image(content, name)
+                        except ValidationError as e:
+                            self.stdout.write(self.style.WARNING(f'{model.__name__} {pk}: {name}: {e.messages[0]}'))
+                            continue
+                    
+                    new_name = storage.generate_filename(
+                        field.upload_to(None, name, content=content)
+                    )
+                    if new_name == name:
+                        continue
+                    if options['dry_run']:
+                        self.stdout.write(f'{model.__name__} {pk}: {name} -> {new_name}')
+                        moved += 1
+                        continue
+                    if not storage.exists(new_name):
+                        new_name = storage.save(new_name, content, max_length=field.max_length)
+                    
+                    if is_image and field.width_field and field.height_field:
+                        width, height = get_image_dimensions(content)
+                        updates.update({field.width_field: width, field.height_field: height})
+                
+                updates[field_name] = new_name
+                model.objects.filter(pk=pk).update(**updates)
+                old_names.add((model, field_name, name))
+                moved += 1
+                self.stdout.write(f'{model.__name__} {pk}: {name} -> {new_name}')
+        
+        if not options['dry_run'] and not options['keep_old']:
+            self.delete_old_files(old_names)
+        
+        verb = 'Would move' if options['dry_run'] else 'Moved'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {moved} files.'))
+        if moved and not options['dry_run']:
+            self.stdout.write('Run `python manage.py optimize_images` to regenerate the renditions.')
+    
+    def delete_old_files(self, old_names):
+        for model, field_name, name in old_names:
+            # Another row may still point at the same file
+            if model.objects.filter(**{field_name: name}).exists():
+                continue
+            
+            field = model._meta.get_field(field_name)
+            field_file = field.attr_class(model(), field, name)
+            if hasattr(field_file, 'delete_all_created_images'):
+                field_file.delete_all_created_images()
+            field_file.storage.delete(name)
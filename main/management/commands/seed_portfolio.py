@@ -0,0 +1,83 @@
+from django.core.management.base import BaseCommand
+from django.core.files.base import ContentFile
+from django.utils.text import slugify
+from datetime import date, timedelta
+from io import BytesIO
+import random
+
+from main.models import Profile, Project, ProjectRender, ContactMessage
+
+TECHNOLOGIES = [
+    'Python', 'Django', 'JavaScript', 'React', 'Vue', 'TypeScript', 'Tailwind',
+    'PostgreSQL', 'SQLite', 'Docker', 'AWS', 'Pandas', 'PyTorch', 'Flutter', 'Go',
+]
+
+class Command(BaseCommand):
+    help = 'Populate the database with sample portfolio data (for benchmarks and local testing)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--projects', type=int, default=30, help='Number of projects to create')
+        parser.add_argument('--renders', type=int, default=3, help='Renders per project')
+        parser.add_argument('--messages', type=int, default=50, help='Number of contact messages')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        image = self.sample_image()
+
+        if not Profile.objects.exists():
+            profile = Profile(
+                name='Sample Developer',
+                title='Full Stack Developer',
+                bio='Builds web applications with Python and JavaScript.',
+                email='developer@example.com',
+                location='Remote',
+            )
+            profile.profile_image.save('profile.png', ContentFile(image), save=False)
+            profile.save()
+
+        start = Project.objects.count()
+        project_types = [choice[0] for choice in Project.PROJECT_TYPES]
+        for i in range(start, start + options['projects']):
+            title = f'Sample Project {i + 1}'
+            project = Project(
+                title=title,
+                slug=slugify(title),
+                short_description=f'Short description for {title}.',
+                description=f'A longer description for {title}. ' * 5,
+                project_type=rng.choice(project_types),
+                technologies=', '.join(rng.sample(TECHNOLOGIES, rng.randint(2, 5))),
+                start_date=date.today() - timedelta(days=rng.randint(30, 900)),
+                display_order=rng.randint(0, 10),
+                is_featured=rng.random() < 0.3,
+            )
+            project.featured_image.save(f'{project.slug}.png', ContentFile(image), save=False)
+            project.save()
+
+            for j in range(options['renders']):
+                render = ProjectRender(project=project, title=f'Render {j + 1}', display_order=j)
+                render.image.save(f'{project.slug}-{j + 1}.png', ContentFile(image), save=False)
+                render.save()
+
+        for i in range(options['messages']):
+            ContactMessage.objects.create(
+                name=f'Visitor {i + 1}',
+                email=f'visitor{i + 1}@example.com',
+                subject='Project inquiry',
+                message='Hello, I would like to talk about a project.',
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {options['projects']} projects, "
+                f"{options['projects'] * options['renders']} renders and "
+                f"{options['messages']} messages."
+            )
+        )
+
+    def sample_image(self):
+        from PIL import Image
+
+        buffer = BytesIO()
+        Image.new('RGB', (1200, 800), (14, 165, 233)).save(buffer, format='PNG')
+        return buffer.getvalue()
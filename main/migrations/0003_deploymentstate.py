@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0002_profile_profile_image_height_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeploymentState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100, unique=True)),
+                ('value', models.CharField(max_length=255)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Deployment State',
+                'verbose_name_plural': 'Deployment State',
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:23
+
+from django.db import migrations
+import main.uploads
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0003_deploymentstate'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='profile',
+            name='profile_image',
+            field=main.uploads.ContentAddressedImageField(blank=True, height_field='profile_image_height', help_text='Main profile picture', null=True, upload_to=main.uploads.ContentAddressedUploadTo('profile'), width_field='profile_image_width'),
+        ),
+        migrations.AlterField(
+            model_name='profile',
+            name='resume',
+            field=main.uploads.ContentAddressedFileField(blank=True, null=True, upload_to=main.uploads.ContentAddressedUploadTo('resumes')),
+        ),
+        migrations.AlterField(
+            model_name='project',
+            name='featured_image',
+            field=main.uploads.ContentAddressedImageField(height_field='featured_image_height', help_text='Main project image', upload_to=main.uploads.ContentAddressedUploadTo('projects/featured'), width_field='featured_image_width'),
+        ),
+        migrations.AlterField(
+            model_name='projectrender',
+            name='image',
+            field=main.uploads.ContentAddressedImageField(height_field='image_height', help_text='Project screenshot or render', upload_to=main.uploads.ContentAddressedUploadTo('projects/renders'), width_field='image_width'),
+        ),
+    ]
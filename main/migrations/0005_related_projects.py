@@ -0,0 +1,72 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:37
+
+from datetime import date
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_related_index(apps, schema_editor):
+    # The scoring of main/related.py as it was when the index was added
+    Project = apps.get_model('main', 'Project')
+    RelatedProject = apps.get_model('main', 'RelatedProject')
+    today = date.today()
+
+    projects = {}
+    for pk, technologies, project_type, end_date in Project.objects.filter(is_published=True).values_list(
+        'id', 'technologies', 'project_type', 'end_date'
+    ):
+        technology_set = frozenset(
+            technology.strip().lower() for technology in (technologies or '').split(',') if technology.strip()
+        )
+        age = max((today - (end_date or today)).days, 0)
+        projects[pk] = (technology_set, project_type, 0.5 ** (age / 365))
+
+    rows = []
+    for pk, (technologies, project_type, _) in projects.items():
+        scored = []
+        for other_pk, (other_technologies, other_type, other_recency) in projects.items():
+            if other_pk == pk:
+                continue
+            overlap = 0.0
+            if technologies and other_technologies:
+                overlap = len(technologies & other_technologies) / len(technologies | other_technologies)
+            same_type = project_type == other_type
+            if overlap or same_type:
+                scored.append((0.6 * overlap + 0.25 * same_type + 0.15 * other_recency, other_pk))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        rows.extend(
+            RelatedProject(project_id=pk, related_id=related_id, score=score)
+            for score, related_id in scored[:6]
+        )
+    RelatedProject.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0004_content_addressed_uploads'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedProject',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_entries', to='main.project')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_to_entries', to='main.project')),
+            ],
+            options={
+                'verbose_name': 'Related Project',
+                'verbose_name_plural': 'Related Projects',
+                'ordering': ['project', '-score'],
+                'indexes': [models.Index(fields=['project', '-score'], name='related_project_score_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='relatedproject',
+            constraint=models.UniqueConstraint(fields=('project', 'related'), name='unique_related_project'),
+        ),
+        migrations.RunPython(build_related_index, migrations.RunPython.noop),
+    ]
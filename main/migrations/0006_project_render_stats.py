@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:39
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def backfill_render_stats(apps, schema_editor):
+    Project = apps.get_model('main', 'Project')
+    ProjectRender = apps.get_model('main', 'ProjectRender')
+    renders = ProjectRender.objects.filter(project=models.OuterRef('pk'))
+    Project.objects.update(
+        render_count=Coalesce(
+            models.Subquery(
+                renders.order_by().values('project').annotate(count=models.Count('pk')).values('count')
+            ),
+            0,
+        ),
+        cover_render=models.Subquery(renders.order_by('display_order', 'created_at').values('pk')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0005_related_projects'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='cover_render',
+            field=models.ForeignKey(blank=True, editable=False, help_text='First render in display order', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='main.projectrender'),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='render_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_render_stats, migrations.RunPython.noop),
+    ]
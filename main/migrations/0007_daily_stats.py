@@ -0,0 +1,46 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:41
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def backfill_daily_stats(apps, schema_editor):
+    DailyStat = apps.get_model('main', 'DailyStat')
+    counts = {}
+    for metric, model_name in (('projects', 'Project'), ('renders', 'ProjectRender'), ('messages', 'ContactMessage')):
+        rows = (
+            apps.get_model('main', model_name).objects
+            .annotate(day=TruncDate('created_at')).values('day').annotate(count=Count('pk')).order_by()
+        )
+        for row in rows:
+            counts.setdefault(row['day'], {})[metric] = row['count']
+    DailyStat.objects.bulk_create(
+        [DailyStat(date=day, **values) for day, values in sorted(counts.items())], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0006_project_render_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('projects', models.PositiveIntegerField(default=0)),
+                ('renders', models.PositiveIntegerField(default=0)),
+                ('messages', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Daily Stat',
+                'verbose_name_plural': 'Daily Stats',
+                'ordering': ['date'],
+            },
+        ),
+        migrations.RunPython(backfill_daily_stats, migrations.RunPython.noop),
+    ]
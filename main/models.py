@@ -1,9 +1,14 @@
 from django.db import models
-from versatileimagefield.fields import VersatileImageField, PPOIField
+from django.db.models.functions import Coalesce
+from versatileimagefield.fields import PPOIField
 from django.core.validators import URLValidator
 from django.core.exceptions import ValidationError
+from django.utils.functional import cached_property
 import os
 
+from .renditions import get_rendition
+from .uploads import ContentAddressedFileField, ContentAddressedImageField, ContentAddressedUploadTo
+
 def validate_github_url(value):
     """
     Validate that the URL is a valid GitHub URL
@@ -33,9 +38,9 @@ class Profile(models.Model):
     twitter = models.URLField(blank=True)
     personal_website = models.URLField(blank=True)
     
-    # Profile image with VersatileImageField
-    profile_image = VersatileImageField(
-        upload_to='profile/',
+    # Profile image with VersatileImageField, stored under its content hash
+    profile_image = ContentAddressedImageField(
+        upload_to=ContentAddressedUploadTo('profile'),
         blank=True,
         null=True,
         help_text='Main profile picture',
@@ -48,7 +53,7 @@ class Profile(models.Model):
     profile_image_height = models.PositiveIntegerField(blank=True, null=True)
     
     # Resume/CV
-    resume = models.FileField(upload_to='resumes/', blank=True, null=True)
+    resume = ContentAddressedFileField(upload_to=ContentAddressedUploadTo('resumes'), blank=True, null=True)
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -67,9 +72,9 @@ class Profile(models.Model):
             pass
         super().save(*args, **kwargs)
     
-    @property
+    @cached_property
     def profile_image_srcset(self):
-        """Generate srcset for responsive profile images"""
+        """Generate srcset for responsive profile images (kept with the cached Profile)"""
         if not self.profile_image:
             return ""
         
@@ -81,11 +86,11 @@ class Profile(models.Model):
         
         srcset = []
         for size, width in sizes:
-            try:
-                url = getattr(self.profile_image, size).url
-                srcset.append(f"{url} {width}")
-            except:
-                continue
+            rendition = get_rendition(self.profile_image, size)
+            if rendition:
+                # Actual rendition width, calculated from the stored dimensions
+                descriptor = f"{rendition.width}w" if rendition.width else width
+                srcset.append(f"{rendition.url} {descriptor}")
         
         return ", ".join(srcset)
 
@@ -113,9 +118,9 @@ class Project(models.Model):
     github_url = models.URLField(validators=[validate_github_url], blank=True)
     live_url = models.URLField(blank=True, help_text="Link to live demo or deployed application")
     
-    # Featured image with VersatileImageField
-    featured_image = VersatileImageField(
-        upload_to='projects/featured/',
+    # Featured image with VersatileImageField, stored under its content hash
+    featured_image = ContentAddressedImageField(
+        upload_to=ContentAddressedUploadTo('projects/featured'),
         help_text='Main project image',
         ppoi_field='featured_image_ppoi',
         width_field='featured_image_width',
@@ -134,6 +139,18 @@ class Project(models.Model):
     is_featured = models.BooleanField(default=False)
     is_published = models.BooleanField(default=True)
     
+    # Denormalized from the renders, kept up to date by main/signals.py
+    render_count = models.PositiveIntegerField(default=0, editable=False)
+    cover_render = models.ForeignKey(
+        'ProjectRender',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='+',
+        help_text='First render in display order',
+    )
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -142,9 +159,23 @@ class Project(models.Model):
         verbose_name = "Project"
         verbose_name_plural = "Projects"
     
+    # Only written by update_render_stats(), see save()
+    RENDER_STATS_FIELDS = ('render_count', 'cover_render')
+    
     def __str__(self):
         return self.title
     
+    def save(self, *args, **kwargs):
+        # A save from an instance loaded before its renders changed must not
+        # write the stale counters back, so updates leave them out
+        updating = not self._state.adding and not kwargs.get('force_insert')
+        if updating and not args and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.RENDER_STATS_FIELDS
+            ]
+        super().save(*args, **kwargs)
+    
     @property
     def is_ongoing(self):
         return self.end_date is None
@@ -168,11 +199,11 @@ class Project(models.Model):
         
         srcset = []
         for size, width in sizes:
-            try:
-                url = getattr(self.featured_image, size).url
-                srcset.append(f"{url} {width}")
-            except:
-                continue
+            rendition = get_rendition(self.featured_image, size)
+            if rendition:
+                # Actual rendition width, calculated from the stored dimensions
+                descriptor = f"{rendition.width}w" if rendition.width else width
+                srcset.append(f"{rendition.url} {descriptor}")
         
         return ", ".join(srcset)
     
@@ -188,9 +219,9 @@ class ProjectRender(models.Model):
     project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='renders')
     title = models.CharField(max_length=200, blank=True)
     
-    # Render image with VersatileImageField
-    image = VersatileImageField(
-        upload_to='projects/renders/',
+    # Render image with VersatileImageField, stored under its content hash
+    image = ContentAddressedImageField(
+        upload_to=ContentAddressedUploadTo('projects/renders'),
         help_text='Project screenshot or render',
         ppoi_field='image_ppoi',
         width_field='image_width',
@@ -228,11 +259,11 @@ class ProjectRender(models.Model):
         
         srcset = []
         for size, width in sizes:
-            try:
-                url = getattr(self.image, size).url
-                srcset.append(f"{url} {width}")
-            except:
-                continue
+            rendition = get_rendition(self.image, size)
+            if rendition:
+                # Actual rendition width, calculated from the stored dimensions
+                descriptor = f"{rendition.width}w" if rendition.width else width
+                srcset.append(f"{rendition.url} {descriptor}")
         
         return ", ".join(srcset)
     
@@ -241,6 +272,43 @@ class ProjectRender(models.Model):
         """Generate sizes attribute for responsive images"""
         return "(max-width: 640px) 100vw, (max-width: 1024px) 50vw, 25vw"
 
+def update_render_stats(project_ids):
+    """Recompute render_count and cover_render of these projects in a single UPDATE"""
+    renders = ProjectRender.objects.filter(project=models.OuterRef('pk'))
+    Project.objects.filter(pk__in=project_ids).update(
+        render_count=Coalesce(
+            models.Subquery(
+                renders.order_by().values('project').annotate(count=models.Count('pk')).values('count')
+            ),
+            0,
+        ),
+        cover_render=models.Subquery(renders.order_by('display_order', 'created_at').values('pk')[:1]),
+    )
+
+class RelatedProject(models.Model):
+    """
+    Precomputed "related projects" index (see main/related.py): the top
+    scoring published projects for each published project
+    """
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='related_entries')
+    related = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='related_to_entries')
+    score = models.FloatField()
+    
+    class Meta:
+        ordering = ['project', '-score']
+        constraints = [
+            models.UniqueConstraint(fields=['project', 'related'], name='unique_related_project'),
+        ]
+        indexes = [
+            # Detail page lookup: top N for one project
+            models.Index(fields=['project', '-score'], name='related_project_score_idx'),
+        ]
+        verbose_name = "Related Project"
+        verbose_name_plural = "Related Projects"
+    
+    def __str__(self):
+        return f"{self.project} -> {self.related} ({self.score:.2f})"
+
 class ContactMessage(models.Model):
     """
     Messages received through contact form
@@ -279,4 +347,39 @@ class ContactMessage(models.Model):
     
     def mark_as_replied(self):
         self.status = 'replied'
-        self.save()
\ No newline at end of file
+        self.save()
+
+class DailyStat(models.Model):
+    """
+    Per-day counts of created projects, renders and contact messages (see
+    main/stats.py), the source of the stats page charts
+    """
+    date = models.DateField(unique=True)
+    projects = models.PositiveIntegerField(default=0)
+    renders = models.PositiveIntegerField(default=0)
+    messages = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        ordering = ['date']
+        verbose_name = "Daily Stat"
+        verbose_name_plural = "Daily Stats"
+    
+    def __str__(self):
+        return f"{self.date}: {self.projects} projects, {self.renders} renders, {self.messages} messages"
+
+class DeploymentState(models.Model):
+    """
+    Key/value bookkeeping for deployment tasks (e.g. the migration graph
+    fingerprint used by the migrate_if_needed command)
+    """
+    key = models.CharField(max_length=100, unique=True)
+    value = models.CharField(max_length=255)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = "Deployment State"
+        verbose_name_plural = "Deployment State"
+    
+    def __str__(self):
+        return f"{self.key} = {self.value}"
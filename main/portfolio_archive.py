@@ -0,0 +1,338 @@
+"""
+Portfolio archives: projects, their renders and the media they use in a
+single tar file (export_portfolio / import_portfolio).
+
+Layout, in this order so both sides can stream it:
+
+    projects.jsonl          one project per line, its renders nested
+    media/<storage name>    every referenced image, once
+
+Export never holds more than one file in memory. Import reads the records,
+then hands each image to a thread pool as it comes off the stream: the
+workers normalize and store it under its content-addressed name (already
+stored files are not written again) and warm its renditions while the next
+ones are read. An image used both as a cover and as a render is stored once
+and warmed for both fields' rendition sets. The rows are then written with
+bulk_create/bulk_update in batches, matched on the project slug (and, for
+renders, the project and image); only rows whose values differ are updated,
+so importing the same archive twice leaves the database unchanged.
+
+The bulk writes skip the model signals, so import_archive() recomputes what
+they would have maintained: render_count/cover_render, the related-projects
+index, the search suggestion index version and today's DailyStat row.
+"""
+import json
+import posixpath
+import tarfile
+import tempfile
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from . import related, stats, typeahead
+from .models import Project, ProjectRender, update_render_stats
+from .renditions import warm_renditions
+from .uploads import store_image
+
+RECORDS_NAME = 'projects.jsonl'
+MEDIA_PREFIX = 'media/'
+
+PROJECT_FIELDS = [
+    'title', 'slug', 'description', 'short_description', 'project_type',
+    'technologies', 'github_url', 'live_url', 'featured_image', 'featured_image_ppoi',
+    'start_date', 'end_date', 'display_order', 'is_featured', 'is_published',
+]
+RENDER_FIELDS = ['title', 'image', 'image_ppoi', 'description', 'display_order']
+
+# Records above this are held on disk while the export is written
+SPOOL_SIZE = 8 * 1024 * 1024
+
+# Keeps SQLite under its bound-parameter limit in the slug__in lookups
+LOOKUP_BATCH = 500
+
+PROJECT_UPDATE_FIELDS = [*PROJECT_FIELDS, 'featured_image_width', 'featured_image_height']
+RENDER_UPDATE_FIELDS = [*RENDER_FIELDS, 'image_width', 'image_height']
+
+
+def tar_mode(path, writing):
+    if not writing:
+        return 'r|*'
+    return 'w|gz' if path.endswith(('.gz', '.tgz')) else 'w|'
+
+
+def record(instance, fields):
+    """The fields' database values (file names, '0.5x0.5' PPOIs)"""
+    values = {}
+    for name in fields:
+        field = instance._meta.get_field(name)
+        values[name] = field.get_prep_value(field.value_from_object(instance))
+    return values
+
+
+def add_file(archive, name, fileobj, size):
+    info = tarfile.TarInfo(name)
+    info.size = size
+    info.mtime = int(timezone.now().timestamp())
+    archive.addfile(info, fileobj)
+
+
+def export_archive(fileobj, path='', log=None):
+    """
+    Write every project and render, with their images, to `fileobj` as a
+    tar (gzipped when `path` ends in .gz/.tgz). Returns (projects, files).
+    """
+    storages = {
+        'featured_image': Project._meta.get_field('featured_image').storage,
+        'image': ProjectRender._meta.get_field('image').storage,
+    }
+    media = {}
+    projects = 0
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE) as records:
+        queryset = Project.objects.order_by('pk').prefetch_related('renders')
+        for project in queryset.iterator(chunk_size=LOOKUP_BATCH):
+            entry = record(project, PROJECT_FIELDS)
+            entry['renders'] = [record(render, RENDER_FIELDS) for render in project.renders.all()]
+            for item in [entry, *entry['renders']]:
+                for attr, storage in storages.items():
+                    if item.get(attr):
+                        media.setdefault(item[attr], storage)
+            records.write(json.dumps(entry, cls=DjangoJSONEncoder).encode() + b'\n')
+            projects += 1
+
+        size = records.tell()
+        records.seek(0)
+        with tarfile.open(fileobj=fileobj, mode=tar_mode(path, writing=True)) as archive:
+            add_file(archive, RECORDS_NAME, records, size)
+            files = 0
+            for name, storage in media.items():
+                if not storage.exists(name):
+                    if log:
+                        log(f'{name} is missing, skipped')
+                    continue
+                with storage.open(name, 'rb') as content:
+                    add_file(archive, MEDIA_PREFIX + name, content, storage.size(name))
+                files += 1
+    return projects, files
+
+
+def read_records(archive):
+    member = archive.next()
+    if member is None or member.name != RECORDS_NAME:
+        raise ValueError(f'Not a portfolio archive: it must start with {RECORDS_NAME}')
+    return [json.loads(line) for line in archive.extractfile(member) if line.strip()]
+
+
+def ingest(fields, name, data, warm):
+    """
+    Store one archived image the way an upload through the first of `fields`
+    would be and warm the renditions of each of them; runs in the worker
+    pool. Returns (archive name, stored name, width, height, renditions).
+    """
+    stored, width, height = store_image(fields[0], ContentFile(data, name=posixpath.basename(name)))
+    renditions = 0
+    if warm:
+        for field in fields:
+            instance = field.model(**{field.width_field: width, field.height_field: height})
+            renditions += warm_renditions(field.attr_class(instance, field, stored))
+    return name, stored, width, height, renditions
+
+
+def ingest_media(archive, wanted, workers, warm, counts, log):
+    """
+    Feed the archive's media members to the worker pool, at most two per
+    worker in flight. Returns {archive name: (stored name, width, height)};
+    files that can't be stored or decoded are logged and left out, so the
+    entries using them are skipped.
+    """
+    from PIL import Image
+
+    stored = {}
+
+    def collect(done):
+        for future in done:
+            try:
+                name, stored_name, width, height, renditions = future.result()
+            except ValidationError as e:
+                log(f'{future.archive_name}: {e.messages[0]}')
+                continue
+            except (OSError, SyntaxError, Image.DecompressionBombError) as e:
+                # A truncated or corrupt file only fails when it is decoded
+                log(f'{future.archive_name}: {e}')
+                continue
+            stored[name] = (stored_name, width, height)
+            counts['media'] += 1
+            counts['renditions'] += renditions
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for member in archive:
+            name = member.name[len(MEDIA_PREFIX):]
+            if not member.isfile() or not member.name.startswith(MEDIA_PREFIX) or name not in wanted:
+                continue
+            data = archive.extractfile(member).read()
+            future = pool.submit(ingest, wanted[name], name, data, warm)
+            future.archive_name = name
+            pending.add(future)
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+        collect(wait(pending).done)
+    return stored
+
+
+def field_values(model, entry, fields):
+    return {name: model._meta.get_field(name).to_python(entry.get(name)) for name in fields}
+
+
+def slug_ids(slugs):
+    slugs = list(slugs)
+    ids = {}
+    for i in range(0, len(slugs), LOOKUP_BATCH):
+        ids.update(Project.objects.filter(slug__in=slugs[i:i + LOOKUP_BATCH]).values_list('slug', 'pk'))
+    return ids
+
+
+def existing_projects(slugs):
+    slugs = list(slugs)
+    projects = {}
+    for i in range(0, len(slugs), LOOKUP_BATCH):
+        projects.update(
+            (project.slug, project) for project in Project.objects.filter(slug__in=slugs[i:i + LOOKUP_BATCH])
+        )
+    return projects
+
+
+def save_projects(entries, media, batch_size, counts, log):
+    """Create or update the projects; returns {slug: pk}"""
+    projects = {}
+    for entry in entries:
+        image = media.get(entry['featured_image'])
+        if image is None:
+            log(f"Project {entry['slug']}: featured image missing from the archive, skipped")
+            continue
+        try:
+            values = field_values(Project, entry, PROJECT_FIELDS)
+        except ValidationError as e:
+            log(f"Project {entry['slug']}: {e.messages[0]}, skipped")
+            continue
+        values['featured_image'], values['featured_image_width'], values['featured_image_height'] = image
+        projects[entry['slug']] = Project(**values)
+
+    existing = existing_projects(projects)
+    now = timezone.now()
+    updated = []
+    for slug, current in existing.items():
+        project = projects[slug]
+        if record(project, PROJECT_UPDATE_FIELDS) != record(current, PROJECT_UPDATE_FIELDS):
+            project.pk = current.pk
+            project.updated_at = now
+            updated.append(project)
+    Project.objects.bulk_update(updated, [*PROJECT_UPDATE_FIELDS, 'updated_at'], batch_size=batch_size)
+    Project.objects.bulk_create(
+        [project for slug, project in projects.items() if slug not in existing],
+        batch_size=batch_size,
+    )
+    counts['projects updated'] += len(updated)
+    counts['projects unchanged'] += len(existing) - len(updated)
+    counts['projects created'] += len(projects) - len(existing)
+    return slug_ids(projects)
+
+
+def occurrence_keys(pairs):
+    """
+    (project id, image, n) for the n-th render of a project showing that
+    image, so a screenshot used twice still matches on a second import
+    """
+    seen = Counter()
+    for pair in pairs:
+        seen[pair] += 1
+        yield (*pair, seen[pair])
+
+
+def save_renders(entries, project_ids, media, batch_size, counts, log):
+    """Create or update the renders of the imported projects, matched on their image"""
+    existing = {}
+    ids = list(project_ids.values())
+    for i in range(0, len(ids), LOOKUP_BATCH):
+        rows = list(
+            ProjectRender.objects.filter(project_id__in=ids[i:i + LOOKUP_BATCH])
+            .order_by('project_id', 'display_order', 'created_at', 'pk')
+        )
+        keys = occurrence_keys((render.project_id, render.image.name) for render in rows)
+        existing.update(zip(keys, rows))
+
+    renders = []
+    for entry in entries:
+        project_id = project_ids.get(entry['slug'])
+        if project_id is None:
+            continue
+        for render_entry in entry['renders']:
+            image = media.get(render_entry['image'])
+            if image is None:
+                log(f"Project {entry['slug']}: render {render_entry['image']} missing from the archive, skipped")
+                continue
+            try:
+                values = field_values(ProjectRender, render_entry, RENDER_FIELDS)
+            except ValidationError as e:
+                log(f"Project {entry['slug']}: render {render_entry['image']}: {e.messages[0]}, skipped")
+                continue
+            values['image'], values['image_width'], values['image_height'] = image
+            renders.append(ProjectRender(project_id=project_id, **values))
+
+    # Exported in display order, the same order the existing rows were read in
+    keys = occurrence_keys((render.project_id, render.image.name) for render in renders)
+    created, updated = [], []
+    for key, render in zip(keys, renders):
+        current = existing.get(key)
+        if current is None:
+            created.append(render)
+        elif record(render, RENDER_UPDATE_FIELDS) != record(current, RENDER_UPDATE_FIELDS):
+            render.pk = current.pk
+            updated.append(render)
+    ProjectRender.objects.bulk_update(updated, RENDER_UPDATE_FIELDS, batch_size=batch_size)
+    ProjectRender.objects.bulk_create(created, batch_size=batch_size)
+    counts['renders updated'] += len(updated)
+    counts['renders unchanged'] += len(renders) - len(created) - len(updated)
+    counts['renders created'] += len(created)
+
+
+def import_archive(fileobj, workers=4, batch_size=500, warm=True, log=print):
+    """
+    Load a portfolio archive (see the module docstring). Returns a Counter
+    of projects/renders created, updated and unchanged, media files stored
+    and renditions warmed; problems with single entries are passed to `log`.
+    """
+    counts = Counter()
+    with tarfile.open(fileobj=fileobj, mode=tar_mode('', writing=False)) as archive:
+        entries = read_records(archive)
+        # Archive name -> the fields using it, the one it is stored through
+        # (the cover's, when it is one) first
+        featured_field = Project._meta.get_field('featured_image')
+        render_field = ProjectRender._meta.get_field('image')
+        wanted = {}
+        for entry in entries:
+            fields = wanted.setdefault(entry['featured_image'], [])
+            if featured_field not in fields:
+                fields.insert(0, featured_field)
+            for render_entry in entry['renders']:
+                fields = wanted.setdefault(render_entry['image'], [])
+                if render_field not in fields:
+                    fields.append(render_field)
+        media = ingest_media(archive, wanted, workers, warm, counts, log)
+
+    with transaction.atomic():
+        project_ids = save_projects(entries, media, batch_size, counts, log)
+        save_renders(entries, project_ids, media, batch_size, counts, log)
+        ids = list(project_ids.values())
+        for i in range(0, len(ids), LOOKUP_BATCH):
+            update_render_stats(ids[i:i + LOOKUP_BATCH])
+    related.rebuild_index()
+    typeahead.bump_index_version()
+    today = timezone.localdate()
+    stats.backfill(today, today)
+    return counts
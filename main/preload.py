@@ -0,0 +1,61 @@
+"""
+Critical-resource preloads computed by the views.
+
+The pages used to list `<link rel="preload">` tags in their templates, which
+the browser only sees once the head of the HTML arrives. Views now build the
+same hints as `Link` header values (with imagesrcset/imagesizes matching what
+responsive_image renders) so they can go out as a 103 Early Hints response and
+as a header on the final response, before any of the body is generated.
+"""
+from django.templatetags.static import static
+
+from .renditions import get_rendition
+
+STYLESHEET = 'css/dist/styles.css'
+
+
+def quote(value):
+    return '"{}"'.format(value.replace('\\', '\\\\').replace('"', '\\"'))
+
+
+def format_link(url, destination, **params):
+    """A Link header value: <url>; rel=preload; as=image; imagesrcset="..." """
+    parts = [f'<{url}>', 'rel=preload', f'as={destination}']
+    for name, value in params.items():
+        if not value:
+            continue
+        value = str(value)
+        # Tokens go bare, anything else (srcsets, media queries) quoted
+        parts.append(f'{name}={value}' if value.isalnum() else f'{name}={quote(value)}')
+    return '; '.join(parts)
+
+
+def style_preload(path=STYLESHEET):
+    try:
+        url = static(path)
+    except ValueError:
+        # Missing from the staticfiles manifest (collectstatic not run)
+        return None
+    return format_link(url, 'style')
+
+
+def image_preload(image, rendition_key, responsive=True):
+    """
+    Preload for `{% responsive_image image rendition_key %}`: the rendition
+    as href plus the model's `<field>_srcset`/`<field>_sizes`, so the
+    browser fetches the same candidate the <img> will pick. Pass
+    responsive=False for plain `<img src>` tags.
+    """
+    if not image:
+        return None
+    rendition = get_rendition(image, rendition_key)
+    url = rendition.url if rendition else image.url
+    if not responsive:
+        return format_link(url, 'image')
+    instance = image.instance
+    return format_link(
+        url,
+        'image',
+        imagesrcset=getattr(instance, f'{image.field.name}_srcset', ''),
+        imagesizes=getattr(instance, f'{image.field.name}_sizes', ''),
+    )
@@ -0,0 +1,198 @@
+"""
+Related-projects index.
+
+The detail page used to show "same project_type, excluding self", which is
+an unindexed filter and gives nothing useful for projects with a rare type.
+Instead every published project gets its INDEX_SIZE most similar published
+projects stored in the RelatedProject table, scored by
+
+    TECHNOLOGY_WEIGHT * Jaccard similarity of the parsed technologies
+  + TYPE_WEIGHT       * same project_type
+  + RECENCY_WEIGHT    * recency of the candidate (half-life decay since it
+                        was last worked on; ongoing projects count as today)
+
+Projects with neither a technology nor the type in common are never related.
+The detail page reads its top N with one lookup on (project, -score).
+
+Saving or deleting a project (main/signals.py) only recomputes the lists that
+can change: its own, the ones it's already in, and the ones it now scores
+high enough to enter. It only reads the projects sharing a type or a
+technology with those (the ones that can score above 0) and their current
+rows, and only writes the rows whose score changed. Recency moves with the
+calendar, so the rebuild_related_projects command refreshes every score (e.g.
+daily from cron).
+"""
+from collections import namedtuple
+from datetime import date
+
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Project, RelatedProject
+
+TECHNOLOGY_WEIGHT = 0.6
+TYPE_WEIGHT = 0.25
+RECENCY_WEIGHT = 0.15
+RECENCY_HALF_LIFE_DAYS = 365
+
+# Entries kept per project; the detail page shows the first RELATED_PROJECTS_SHOWN
+INDEX_SIZE = 6
+RELATED_PROJECTS_SHOWN = 3
+
+Entry = namedtuple('Entry', ['id', 'technologies', 'project_type', 'last_active'])
+
+
+def technology_set(technologies):
+    """'Django, React ,django' -> {'django', 'react'}"""
+    return frozenset(
+        technology.strip().lower() for technology in (technologies or '').split(',') if technology.strip()
+    )
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def recency(entry, today):
+    age = max((today - (entry.last_active or today)).days, 0)
+    return 0.5 ** (age / RECENCY_HALF_LIFE_DAYS)
+
+
+def similarity(entry, candidate, today):
+    overlap = jaccard(entry.technologies, candidate.technologies)
+    same_type = entry.project_type == candidate.project_type
+    if not overlap and not same_type:
+        return 0.0
+    return (
+        TECHNOLOGY_WEIGHT * overlap
+        + TYPE_WEIGHT * same_type
+        + RECENCY_WEIGHT * recency(candidate, today)
+    )
+
+
+def load_entries(*filters):
+    """{id: Entry} for every published project (matching `filters`), from one query"""
+    rows = Project.objects.filter(*filters, is_published=True).values_list(
+        'id', 'technologies', 'project_type', 'end_date'
+    )
+    return {
+        pk: Entry(pk, technology_set(technologies), project_type, end_date)
+        for pk, technologies, project_type, end_date in rows
+    }
+
+
+def candidates_filter(entries):
+    """
+    Q of the projects that can score above 0 against any of `entries`: the
+    same project_type or one of their technologies. The technologies are
+    matched as substrings, similarity() sorts out the false positives.
+    """
+    query = Q(project_type__in={entry.project_type for entry in entries})
+    for technology in sorted(set().union(*(entry.technologies for entry in entries))):
+        query |= Q(technologies__icontains=technology)
+    return query
+
+
+def top_related(entry, entries, today):
+    """[(score, id)] of the INDEX_SIZE best candidates for `entry`, best first"""
+    scored = []
+    for candidate in entries.values():
+        if candidate.id == entry.id:
+            continue
+        score = similarity(entry, candidate, today)
+        if score > 0:
+            scored.append((score, candidate.id))
+    # Ties broken by id so rebuilds and incremental updates agree
+    scored.sort(key=lambda item: (-item[0], item[1]))
+    return scored[:INDEX_SIZE]
+
+
+def write_lists(project_ids, entries, today):
+    rows = []
+    for project_id in project_ids:
+        if project_id in entries:
+            rows.extend(
+                RelatedProject(project_id=project_id, related_id=related_id, score=score)
+                for score, related_id in top_related(entries[project_id], entries, today)
+            )
+    with transaction.atomic():
+        RelatedProject.objects.filter(project_id__in=project_ids).delete()
+        RelatedProject.objects.bulk_create(rows)
+    return len(rows)
+
+
+def rebuild_index(today=None):
+    """Recompute every list; returns the number of rows written"""
+    today = today or date.today()
+    entries = load_entries()
+    with transaction.atomic():
+        RelatedProject.objects.exclude(project_id__in=entries).delete()
+        return write_lists(list(entries), entries, today)
+
+
+def update_project(project_id, affected=(), today=None):
+    """
+    Bring the index up to date after `project_id` changed (or was
+    unpublished/deleted). `affected` adds lists known to need recomputing,
+    e.g. the ones that referenced a project before it was deleted. Returns
+    the number of rows written or deleted.
+    """
+    today = today or date.today()
+    changed = load_entries(Q(pk=project_id)).get(project_id)
+    candidates = load_entries(candidates_filter([changed])) if changed else {}
+
+    # The lists that may need recomputing: the given ones, the ones the
+    # project is in and the ones of the projects it could enter
+    lists = Q(project_id__in={project_id, *affected}) | Q(
+        project_id__in=RelatedProject.objects.filter(related_id=project_id).values('project_id')
+    )
+    if changed:
+        lists |= Q(project_id__in=Project.objects.filter(candidates_filter([changed])).values('pk'))
+    current = {}
+    for pk, owner_id, related_id, score in RelatedProject.objects.filter(lists).values_list(
+        'pk', 'project_id', 'related_id', 'score'
+    ):
+        current.setdefault(owner_id, {})[related_id] = (pk, score)
+
+    affected = {project_id, *affected}
+    affected.update(owner_id for owner_id, listed in current.items() if project_id in listed)
+    for owner in candidates.values():
+        if owner.id in affected:
+            continue
+        score = similarity(owner, changed, today)
+        if score <= 0:
+            continue
+        listed = current.get(owner.id, {})
+        # Same ordering as top_related: higher score, then lower id
+        if len(listed) < INDEX_SIZE or (score, -project_id) > min(
+            (listed_score, -listed_id) for listed_id, (_, listed_score) in listed.items()
+        ):
+            affected.add(owner.id)
+
+    owners = {pk: candidates[pk] for pk in affected if pk in candidates}
+    missing = affected - set(owners)
+    if missing:
+        owners.update(load_entries(Q(pk__in=missing)))
+    pool = load_entries(candidates_filter(owners.values())) if owners else {}
+
+    stale, updated, created = [], [], []
+    for owner_id in sorted(affected):
+        wanted = {}
+        if owner_id in owners:
+            wanted = {related_id: score for score, related_id in top_related(owners[owner_id], pool, today)}
+        listed = current.get(owner_id, {})
+        stale.extend(pk for related_id, (pk, _) in listed.items() if related_id not in wanted)
+        for related_id, score in wanted.items():
+            if related_id not in listed:
+                created.append(RelatedProject(project_id=owner_id, related_id=related_id, score=score))
+            elif listed[related_id][1] != score:
+                updated.append(RelatedProject(pk=listed[related_id][0], score=score))
+
+    with transaction.atomic():
+        if stale:
+            RelatedProject.objects.filter(pk__in=stale).delete()
+        RelatedProject.objects.bulk_update(updated, ['score'])
+        RelatedProject.objects.bulk_create(created)
+    return len(stale) + len(updated) + len(created)
@@ -0,0 +1,244 @@
+"""
+Request-scoped rendition resolver.
+
+Every `{% responsive_image %}`, `{% get_image_rendition %}` and model
+`*_srcset` property used to go through versatileimagefield on its own, so a
+single image on the home page was resolved four or five times, each time
+with a storage url(), a cache lookup and possibly an exists() call.
+
+Views register the objects they render (`prefetch_renditions`) without doing
+any I/O. The first lookup during template rendering then resolves every
+rendition of every registered image in one pass: one cache get_many for the
+versatileimagefield "already created" markers and one storage listing per
+__sized__ directory for the rest. Lookups are memoized for the rest of the
+request.
+
+rendition_resolver_middleware scopes the resolver to the request; outside a
+request (shell, management commands) each lookup gets a throwaway resolver.
+
+Rendition widths and heights are calculated from the original's stored
+width_field/height_field and the rendition spec (rendition_size), so no
+rendition or original is ever opened just to read its size.
+"""
+import math
+import posixpath
+from collections import namedtuple
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from django.db.models import Model
+from django.utils.decorators import sync_and_async_middleware
+from versatileimagefield.settings import VERSATILEIMAGEFIELD_CACHE_LENGTH, cache
+from versatileimagefield.utils import get_rendition_key_set, get_resized_path, get_url_from_image_key
+
+# Rendition key set (VERSATILEIMAGEFIELD_RENDITION_KEY_SETS) of each image field
+FIELD_KEY_SETS = {
+    ('main.profile', 'profile_image'): 'profile_image',
+    ('main.project', 'featured_image'): 'project_featured',
+    ('main.projectrender', 'image'): 'project_gallery',
+}
+
+Rendition = namedtuple('Rendition', ['name', 'url', 'width', 'height'])
+
+_current_resolver = ContextVar('rendition_resolver', default=None)
+
+
+def key_set_for(image):
+    field = image.field
+    return FIELD_KEY_SETS.get((field.model._meta.label_lower, field.name))
+
+
+def image_fields(instance):
+    label = instance._meta.label_lower
+    return [field_name for (model, field_name) in FIELD_KEY_SETS if model == label]
+
+
+def thumbnail_size(width, height, box_width, box_height):
+    """Size of Image.thumbnail((box_width, box_height)): fit inside the box, never upscale"""
+    if box_width >= width and box_height >= height:
+        return width, height
+
+    def round_aspect(number, key):
+        return max(min(math.floor(number), math.ceil(number), key=key), 1)
+
+    # Same rounding as Pillow, so the result matches the file byte for byte
+    aspect = width / height
+    if box_width / box_height >= aspect:
+        return round_aspect(box_height * aspect, key=lambda n: abs(aspect - n / box_height)), box_height
+    return box_width, round_aspect(
+        box_width / aspect, key=lambda n: 0 if n == 0 else abs(aspect - box_width / n)
+    )
+
+
+def crop_size(width, height, box_width, box_height):
+    """CroppedImage trims to the box's aspect ratio and resizes to exactly the box"""
+    return box_width, box_height
+
+
+RENDITION_SIZES = {
+    'thumbnail': thumbnail_size,
+    'crop': crop_size,
+}
+
+
+def stored_dimensions(image):
+    """The original's (width, height) from the model's width_field/height_field"""
+    field = image.field
+    if not getattr(field, 'width_field', None) or not getattr(field, 'height_field', None):
+        return None, None
+    return getattr(image.instance, field.width_field), getattr(image.instance, field.height_field)
+
+
+def rendition_size(spec, width, height):
+    """
+    (width, height) of the file versatileimagefield writes for `spec`
+    ('url', 'thumbnail__640x480', 'crop__300x300', ...) given the original's
+    dimensions, or (None, None) if it can't be known.
+    """
+    if spec == 'url':
+        return width, height
+    kind, size = spec.split('__')
+    box_width, box_height = [int(i) for i in size.split('x')]
+    sizer = RENDITION_SIZES.get(kind)
+    if sizer is None:
+        return None, None
+    if sizer is thumbnail_size and not (width and height):
+        return None, None
+    return sizer(width, height, box_width, box_height)
+
+
+class RenditionResolver:
+    def __init__(self):
+        self.pending = []
+        self.memo = {}
+
+    def memo_key(self, image):
+        return (image.field.model._meta.label_lower, image.field.name, image.name)
+
+    def add(self, *objects):
+        """Register model instances, or iterables of them, for the batched pass"""
+        self.pending.extend(objects)
+
+    def collect_pending(self):
+        images = []
+        pending, self.pending = self.pending, []
+        for obj in pending:
+            instances = [obj] if isinstance(obj, Model) else (obj or ())
+            for instance in instances:
+                for field_name in image_fields(instance):
+                    image = getattr(instance, field_name)
+                    if image and self.memo_key(image) not in self.memo:
+                        images.append(image)
+        return images
+
+    def renditions(self, image):
+        """{rendition key: Rendition} for every key in the image's key set"""
+        if not image:
+            return {}
+        key = self.memo_key(image)
+        if key not in self.memo:
+            self.resolve(self.collect_pending() + [image])
+        return self.memo.get(key, {})
+
+    def get(self, image, rendition_key):
+        return self.renditions(image).get(rendition_key)
+
+    def resolve(self, images):
+        planned = []
+        for image in images:
+            key = self.memo_key(image)
+            if key in self.memo:
+                continue
+            self.memo[key] = {}
+            key_set = key_set_for(image)
+            if key_set is None:
+                continue
+            original_size = stored_dimensions(image)
+            for rendition_key, spec in get_rendition_key_set(key_set):
+                if spec == 'url':
+                    self.memo[key][rendition_key] = Rendition(image.name, image.url, *original_size)
+                    continue
+                kind, size = spec.split('__')
+                sizer = getattr(image, kind)
+                width, height = [int(i) for i in size.split('x')]
+                path = get_resized_path(image.name, width, height, sizer.get_filename_key(), image.storage)
+                dimensions = rendition_size(spec, *original_size)
+                planned.append((key, rendition_key, image, sizer, size, path, dimensions))
+
+        if not planned:
+            return
+
+        urls = {path: image.storage.url(path) for _, _, image, _, _, path, _ in planned}
+        created = cache.get_many(list(urls.values()))
+
+        # One listing per directory for whatever the cache doesn't know about
+        listed = {}
+        for _, _, image, _, _, path, _ in planned:
+            directory = posixpath.dirname(path)
+            if urls[path] in created or (image.storage, directory) in listed:
+                continue
+            try:
+                _, files = image.storage.listdir(directory)
+            except (FileNotFoundError, NotADirectoryError):
+                files = []
+            listed[(image.storage, directory)] = set(files)
+
+        markers = {}
+        for key, rendition_key, image, sizer, size, path, dimensions in planned:
+            url = urls[path]
+            exists = url in created or posixpath.basename(path) in listed[(image.storage, posixpath.dirname(path))]
+            if not exists and sizer.create_on_demand:
+                url = sizer[size].url
+            elif exists:
+                markers[url] = 1
+            self.memo[key][rendition_key] = Rendition(path, url, *dimensions)
+        if markers:
+            cache.set_many(markers, VERSATILEIMAGEFIELD_CACHE_LENGTH)
+
+
+def get_resolver():
+    return _current_resolver.get() or RenditionResolver()
+
+
+def prefetch_renditions(*objects):
+    """Queue instances (or lists/querysets of them) for the current request's resolver"""
+    resolver = _current_resolver.get()
+    if resolver is not None:
+        resolver.add(*objects)
+
+
+def get_rendition(image, rendition_key):
+    return get_resolver().get(image, rendition_key)
+
+
+def rendition_url(image, rendition_key):
+    rendition = get_rendition(image, rendition_key)
+    return rendition.url if rendition else None
+
+
+def warm_renditions(image):
+    """Create every rendition in the image field's key set; returns how many"""
+    image.create_on_demand = True
+    size_keys = [size_key for _, size_key in get_rendition_key_set(key_set_for(image))]
+    for size_key in size_keys:
+        get_url_from_image_key(image, size_key)
+    return len(size_keys)
+
+
+@sync_and_async_middleware
+def rendition_resolver_middleware(get_response):
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            token = _current_resolver.set(RenditionResolver())
+            try:
+                return await get_response(request)
+            finally:
+                _current_resolver.reset(token)
+    else:
+        def middleware(request):
+            token = _current_resolver.set(RenditionResolver())
+            try:
+                return get_response(request)
+            finally:
+                _current_resolver.reset(token)
+    return middleware
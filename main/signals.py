@@ -0,0 +1,81 @@
+"""
+Model signal handlers, connected in MainConfig.ready()
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import related, stats, typeahead
+from .context_processors import bump_profile_version
+from .models import ContactMessage, Profile, Project, ProjectRender, RelatedProject, update_render_stats
+
+
+@receiver(post_save, sender=Project, dispatch_uid='related-projects-save')
+def update_related_projects(sender, instance, raw=False, **kwargs):
+    if raw:
+        # loaddata: run rebuild_related_projects afterwards
+        return
+    transaction.on_commit(lambda: related.update_project(instance.pk))
+
+
+@receiver(pre_delete, sender=Project, dispatch_uid='related-projects-pre-delete')
+def remember_related_lists(sender, instance, **kwargs):
+    # The cascade removes these rows, the lists they were in need refilling
+    instance._related_lists = list(
+        RelatedProject.objects.filter(related=instance).values_list('project_id', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Project, dispatch_uid='related-projects-delete')
+def remove_related_projects(sender, instance, **kwargs):
+    project_id, affected = instance.pk, getattr(instance, '_related_lists', ())
+    transaction.on_commit(lambda: related.update_project(project_id, affected))
+
+
+@receiver(pre_save, sender=ProjectRender, dispatch_uid='render-stats-pre-save')
+def remember_render_project(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding:
+        return
+    instance._previous_project_id = (
+        ProjectRender.objects.filter(pk=instance.pk).values_list('project_id', flat=True).first()
+    )
+
+
+@receiver(post_save, sender=ProjectRender, dispatch_uid='render-stats-save')
+@receiver(post_delete, sender=ProjectRender, dispatch_uid='render-stats-delete')
+def update_project_render_stats(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # Moving a render to another project changes both
+    project_ids = {instance.project_id, getattr(instance, '_previous_project_id', None)} - {None}
+    update_render_stats(project_ids)
+
+
+# Daily rollup column (main/stats.py) of each model
+STAT_METRICS = {
+    Project: 'projects',
+    ProjectRender: 'renders',
+    ContactMessage: 'messages',
+}
+
+
+@receiver(post_save, sender=Project, dispatch_uid='daily-stats-project')
+@receiver(post_save, sender=ProjectRender, dispatch_uid='daily-stats-render')
+@receiver(post_save, sender=ContactMessage, dispatch_uid='daily-stats-message')
+def record_daily_stat(sender, instance, created, raw=False, **kwargs):
+    # loaddata: run backfill_daily_stats afterwards
+    if created and not raw:
+        stats.record(STAT_METRICS[sender], instance.created_at)
+
+
+@receiver(post_save, sender=Profile, dispatch_uid='profile-cache-save')
+@receiver(post_delete, sender=Profile, dispatch_uid='profile-cache-delete')
+def invalidate_cached_profile(sender, instance, **kwargs):
+    # After the commit, so a worker reloading on the new version sees the change
+    transaction.on_commit(bump_profile_version)
+
+
+@receiver(post_save, sender=Project, dispatch_uid='typeahead-save')
+@receiver(post_delete, sender=Project, dispatch_uid='typeahead-delete')
+def invalidate_typeahead_index(sender, instance, **kwargs):
+    transaction.on_commit(typeahead.bump_index_version)
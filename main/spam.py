@@ -0,0 +1,240 @@
+"""
+Contact form spam pre-filter.
+
+ContactView runs check() on every POST before the form is built. Requests it
+flags are answered exactly like a successful submission (so bots learn
+nothing) without validating the form or touching the database:
+
+- honeypot: the hidden HONEYPOT_FIELD, invisible to people, was filled in
+- token: FORM_TOKEN_FIELD is missing or not signed by us
+- too_fast: the form came back less than CONTACT_MIN_FILL_SECONDS after it
+  was rendered
+- blocked_ip: the IP tripped one of these checks recently (client_ip(): only
+  hops added by the TRUSTED_PROXY_COUNT proxies are believed, a client can
+  put anything in X-Forwarded-For itself)
+- duplicate: the same message text was already received recently (the
+  only check that doesn't block the IP)
+
+An expired token (CONTACT_FORM_MAX_AGE) is not treated as spam: the form is
+shown again with a fresh one.
+
+The recently flagged IPs and received messages are kept as salted hashes in
+rotating Bloom filters: a fixed 512 KiB per process, no database, and
+entries expire after one to two CONTACT_FILTER_WINDOWs. At 20,000 entries
+per window a false positive (a new message taken for a duplicate) is about
+a one in a million chance. The filters are per worker process: a flood
+spread over several workers is caught by each of them separately.
+
+How many requests were shed, by reason and day, is counted in the
+SPAM_COUNTER_CACHE cache (shown on the contact message admin page).
+"""
+import hashlib
+import os
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import caches
+from django.utils import timezone
+
+HONEYPOT_FIELD = 'website'
+FORM_TOKEN_FIELD = 'form_token'
+
+TOKEN_SALT = 'main.spam.contact-form'
+
+# Reasons a request is dropped, in the order they are checked
+SHED_REASONS = ['honeypot', 'token', 'too_fast', 'blocked_ip', 'duplicate']
+EXPIRED = 'expired'
+COUNTED = [*SHED_REASONS, EXPIRED]
+
+COUNTER_DAYS = 7
+
+
+class BloomFilter:
+    """Fixed-size set of strings with no false negatives and rare false positives"""
+
+    def __init__(self, bits=2 ** 20, hashes=7):
+        self.bits = bits
+        self.hashes = hashes
+        self.array = bytearray(bits // 8)
+
+    def positions(self, item):
+        # Double hashing: h1 + i * h2 for i in range(hashes)
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'big')
+        h2 = int.from_bytes(digest[8:], 'big') | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def add(self, item):
+        for position in self.positions(item):
+            self.array[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        return all(self.array[position >> 3] & (1 << (position & 7)) for position in self.positions(item))
+
+
+class RotatingBloomFilter:
+    """
+    Two Bloom filter generations, swapped every `window` seconds, so an entry
+    is remembered for at least one window and at most two
+    """
+
+    def __init__(self, window, bits=2 ** 20, hashes=7):
+        self.window = window
+        self.bits = bits
+        self.hashes = hashes
+        self.lock = threading.Lock()
+        self.current = BloomFilter(bits, hashes)
+        self.previous = BloomFilter(bits, hashes)
+        self.rotated_at = time.monotonic()
+
+    def rotate(self):
+        if time.monotonic() - self.rotated_at < self.window:
+            return
+        with self.lock:
+            if time.monotonic() - self.rotated_at >= self.window:
+                self.previous, self.current = self.current, BloomFilter(self.bits, self.hashes)
+                self.rotated_at = time.monotonic()
+
+    def add(self, item):
+        self.rotate()
+        self.current.add(item)
+
+    def __contains__(self, item):
+        self.rotate()
+        return item in self.current or item in self.previous
+
+
+# Salted so the filters' contents say nothing about the IPs and messages
+_salt = os.urandom(16).hex()
+
+_blocked_ips = None
+_seen_messages = None
+
+
+def filters():
+    global _blocked_ips, _seen_messages
+    if _blocked_ips is None:
+        _blocked_ips = RotatingBloomFilter(settings.CONTACT_FILTER_WINDOW)
+        _seen_messages = RotatingBloomFilter(settings.CONTACT_FILTER_WINDOW)
+    return _blocked_ips, _seen_messages
+
+
+def reset():
+    """Forget every flagged IP and seen message (tests, settings changes)"""
+    global _blocked_ips, _seen_messages
+    _blocked_ips = _seen_messages = None
+
+
+def fingerprint(kind, value):
+    return hashlib.sha256(f'{_salt}:{kind}:{value}'.encode()).hexdigest()
+
+
+def client_ip(request):
+    """
+    The client's IP: REMOTE_ADDR, or behind TRUSTED_PROXY_COUNT proxies the
+    X-Forwarded-For entry added by the outermost one. Entries further left
+    come from the client and are ignored.
+    """
+    proxies = settings.TRUSTED_PROXY_COUNT
+    if proxies:
+        hops = [hop.strip() for hop in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if hop.strip()]
+        if len(hops) >= proxies:
+            return hops[-proxies]
+    return request.META.get('REMOTE_ADDR')
+
+
+def message_fingerprint(message):
+    # Case and whitespace changes don't make a message new
+    return fingerprint('message', ' '.join(message.lower().split()))
+
+
+def issue_token():
+    """Signed render time for FORM_TOKEN_FIELD"""
+    return signing.dumps(int(time.time()), salt=TOKEN_SALT)
+
+
+def form_context():
+    """Template context for a page showing the contact form (contact.html)"""
+    return {'form_token': issue_token(), 'honeypot_field': HONEYPOT_FIELD}
+
+
+def check(data, ip):
+    """
+    The reason to drop a submission (one of SHED_REASONS), EXPIRED, or None
+    when it should go on to form validation
+    """
+    blocked_ips, seen_messages = filters()
+    ip_key = fingerprint('ip', ip) if ip else None
+
+    reason = None
+    if data.get(HONEYPOT_FIELD):
+        reason = 'honeypot'
+    else:
+        try:
+            issued = signing.loads(
+                data.get(FORM_TOKEN_FIELD, ''), salt=TOKEN_SALT, max_age=settings.CONTACT_FORM_MAX_AGE
+            )
+        except signing.SignatureExpired:
+            return EXPIRED
+        except signing.BadSignature:
+            reason = 'token'
+        else:
+            if time.time() - issued < settings.CONTACT_MIN_FILL_SECONDS:
+                reason = 'too_fast'
+    if reason:
+        if ip_key:
+            blocked_ips.add(ip_key)
+        return reason
+
+    if ip_key and ip_key in blocked_ips:
+        return 'blocked_ip'
+    if message_fingerprint(data.get('message', '')) in seen_messages:
+        # Not held against the IP: it is as likely a double-clicked submit
+        return 'duplicate'
+    return None
+
+
+def remember(message):
+    """Record a message that was saved, so repeats of it are dropped"""
+    filters()[1].add(message_fingerprint(message))
+
+
+def counter_cache():
+    return caches[getattr(settings, 'SPAM_COUNTER_CACHE', 'default')]
+
+
+def counter_key(day, reason):
+    return f'main:contact-shed:{day.isoformat()}:{reason}'
+
+
+def count(reason):
+    key = counter_key(timezone.localdate(), reason)
+    cache = counter_cache()
+    timeout = (COUNTER_DAYS + 1) * 24 * 60 * 60
+    # Approximate across processes with the file cache, which is enough here
+    if not cache.add(key, 1, timeout=timeout):
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Expired in between
+            cache.set(key, 1, timeout=timeout)
+
+
+def shed_counts(days=COUNTER_DAYS):
+    """{'today': {reason: n}, 'week': {reason: n}} of the last `days` days"""
+    today = timezone.localdate()
+    keys = {
+        counter_key(today - timedelta(days=offset), reason): (offset, reason)
+        for offset in range(days)
+        for reason in COUNTED
+    }
+    counts = {'today': dict.fromkeys(COUNTED, 0), 'week': dict.fromkeys(COUNTED, 0)}
+    for key, value in counter_cache().get_many(keys).items():
+        offset, reason = keys[key]
+        counts['week'][reason] += value
+        if offset == 0:
+            counts['today'][reason] += value
+    return counts
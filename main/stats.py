@@ -0,0 +1,176 @@
+"""
+Daily rollup of created projects, renders and contact messages.
+
+The stats page charts used to run TruncMonth GROUP BYs over the raw tables
+on every page view, and only got the months that had data. DailyStat keeps
+one row per day instead:
+
+- record() bumps a counter when a row is inserted (main/signals.py, bulk
+  inserts call it themselves)
+- backfill() recomputes a date range from the raw tables (the
+  backfill_daily_stats command)
+- series() buckets a date range by day, week (starting Monday) or month,
+  with the empty buckets filled in, for the /stats/series.json endpoint
+
+Deletions aren't subtracted: the charts show what was created when.
+"""
+from collections import Counter
+from datetime import date, timedelta
+
+from django.apps import apps as django_apps
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+# DailyStat column -> the model whose inserts it counts
+METRICS = {
+    'projects': 'main.Project',
+    'renders': 'main.ProjectRender',
+    'messages': 'main.ContactMessage',
+}
+
+LABEL_FORMATS = {
+    'day': '%Y-%m-%d',
+    'week': '%Y-%m-%d',
+    'month': '%b %Y',
+}
+
+DEFAULT_PERIODS = 12
+
+# Longest series the endpoint serves (e.g. ~2.7 years of days)
+MAX_BUCKETS = 1000
+
+
+def local_date(value):
+    return timezone.localdate(value) if timezone.is_aware(value) else value.date()
+
+
+def record(metric, created_at, count=1):
+    """Count `count` (default one) `metric` inserts on the (local) day of `created_at`"""
+    DailyStat = django_apps.get_model('main', 'DailyStat')
+    day = local_date(created_at)
+    with transaction.atomic():
+        if DailyStat.objects.filter(date=day).update(**{metric: F(metric) + count}):
+            return
+        _, created = DailyStat.objects.get_or_create(date=day, defaults={metric: count})
+        if not created:
+            # Another insert created the row in the meantime
+            DailyStat.objects.filter(date=day).update(**{metric: F(metric) + count})
+
+
+def backfill(start=None, end=None):
+    """
+    Recompute the DailyStat rows between start and end (inclusive, both
+    optional) from the raw tables. Returns the number of days with data.
+    """
+    DailyStat = django_apps.get_model('main', 'DailyStat')
+    counts = {}
+    for metric, label in METRICS.items():
+        queryset = django_apps.get_model(label).objects.all()
+        if start:
+            queryset = queryset.filter(created_at__date__gte=start)
+        if end:
+            queryset = queryset.filter(created_at__date__lte=end)
+        rows = queryset.annotate(day=TruncDate('created_at')).values('day').annotate(count=Count('pk')).order_by()
+        for row in rows:
+            counts.setdefault(row['day'], {})[metric] = row['count']
+
+    existing = DailyStat.objects.all()
+    if start:
+        existing = existing.filter(date__gte=start)
+    if end:
+        existing = existing.filter(date__lte=end)
+    with transaction.atomic():
+        existing.delete()
+        DailyStat.objects.bulk_create(
+            [DailyStat(date=day, **values) for day, values in sorted(counts.items())],
+            batch_size=500,
+        )
+    return len(counts)
+
+
+def bucket_start(day, granularity):
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(bucket, granularity):
+    if granularity == 'week':
+        return bucket + timedelta(days=7)
+    if granularity == 'month':
+        return (bucket.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return bucket + timedelta(days=1)
+
+
+def previous_bucket(bucket, granularity):
+    if granularity == 'week':
+        return bucket - timedelta(days=7)
+    if granularity == 'month':
+        return (bucket - timedelta(days=1)).replace(day=1)
+    return bucket - timedelta(days=1)
+
+
+def bucket_count(start, end, granularity):
+    start, end = bucket_start(start, granularity), bucket_start(end, granularity)
+    if granularity == 'week':
+        return (end - start).days // 7 + 1
+    if granularity == 'month':
+        return (end.year - start.year) * 12 + end.month - start.month + 1
+    return (end - start).days + 1
+
+
+def parse_series_params(query, today=None):
+    """
+    Validate the endpoint's query string: metric, granularity and either
+    start (YYYY-MM-DD) or periods, plus an optional end (default today).
+    Raises ValueError with a message fit for the client.
+    """
+    metric = query.get('metric', 'projects')
+    if metric not in METRICS:
+        raise ValueError(f"metric must be one of: {', '.join(METRICS)}")
+    granularity = query.get('granularity', 'month')
+    if granularity not in LABEL_FORMATS:
+        raise ValueError(f"granularity must be one of: {', '.join(LABEL_FORMATS)}")
+
+    try:
+        end = date.fromisoformat(query['end']) if query.get('end') else (today or timezone.localdate())
+        start = date.fromisoformat(query['start']) if query.get('start') else None
+        periods = int(query.get('periods', DEFAULT_PERIODS))
+    except ValueError:
+        raise ValueError('start and end must be YYYY-MM-DD dates, periods a number')
+
+    if start is None:
+        if not 0 < periods <= MAX_BUCKETS:
+            raise ValueError(f'periods must be between 1 and {MAX_BUCKETS}')
+        start = bucket_start(end, granularity)
+        for _ in range(periods - 1):
+            start = previous_bucket(start, granularity)
+    if start > end:
+        raise ValueError('start must not be after end')
+    if bucket_count(start, end, granularity) > MAX_BUCKETS:
+        raise ValueError(f'at most {MAX_BUCKETS} {granularity}s per request')
+    return {'metric': metric, 'start': start, 'end': end, 'granularity': granularity}
+
+
+def series(metric, start, end, granularity='month'):
+    """
+    {'labels': [...], 'data': [...]} for Chart.js with one entry per bucket
+    from the bucket containing `start` to the one containing `end`
+    """
+    DailyStat = django_apps.get_model('main', 'DailyStat')
+    first = bucket_start(start, granularity)
+    totals = Counter()
+    for day, count in DailyStat.objects.filter(date__range=(first, end)).values_list('date', metric):
+        totals[bucket_start(day, granularity)] += count
+
+    labels, data = [], []
+    bucket = first
+    while bucket <= end:
+        labels.append(bucket.strftime(LABEL_FORMATS[granularity]))
+        data.append(totals[bucket])
+        bucket = next_bucket(bucket, granularity)
+    return {'labels': labels, 'data': data}
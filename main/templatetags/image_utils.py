@@ -1,6 +1,9 @@
 from django import template
 from django.utils.safestring import mark_safe
 
+from main.image_resize import resized_url
+from main.renditions import get_rendition, rendition_url, stored_dimensions
+
 register = template.Library()
 
 @register.simple_tag
@@ -14,10 +17,22 @@ def get_image_rendition(image, rendition_key):
         return ""
     
     try:
-        return getattr(image, rendition_key).url
-    except (AttributeError, Exception):
+        return rendition_url(image, rendition_key) or image.url
+    except Exception:
         return image.url if image else ""
 
+@register.simple_tag
+def resized_image_url(image, width=0, height=0, mode='fit', image_format=None, quality=None):
+    """
+    Signed URL of the image resized on demand, for sizes that aren't in the
+    rendition key sets (a 2x variant for a srcset, an odd crop).
+    
+    Usage: {% resized_image_url project.featured_image 1280 960 'fit' 'webp' as hidpi_url %}
+    """
+    if not image:
+        return ""
+    return resized_url(image, width, height, mode, image_format, quality)
+
 @register.simple_tag
 def responsive_image(image, rendition_key, alt_text="", class_name="", lazy_loading=True, **kwargs):
     """
@@ -30,24 +45,24 @@ def responsive_image(image, rendition_key, alt_text="", class_name="", lazy_load
         return ""
     
     try:
-        # Get the specific rendition
-        rendition = getattr(image, rendition_key)
-        url = rendition.url
-        width = getattr(rendition, 'width', '')
-        height = getattr(rendition, 'height', '')
+        # Get the specific rendition (resolved with the rest of the page's images)
+        rendition = get_rendition(image, rendition_key)
+        url = rendition.url if rendition else image.url
+        # Calculated from the stored original dimensions, no file is opened
+        width, height = (rendition.width, rendition.height) if rendition else stored_dimensions(image)
         
         # Generate srcset if available (from model properties)
         srcset = ""
         sizes = ""
         
-        # Try to get srcset from model properties
-        srcset_property = f"{rendition_key}_srcset"
-        sizes_property = f"{rendition_key}_sizes"
+        # e.g. Project.featured_image_srcset / featured_image_sizes
+        srcset_property = f"{image.field.name}_srcset"
+        sizes_property = f"{image.field.name}_sizes"
         
-        if hasattr(image, srcset_property):
-            srcset = getattr(image, srcset_property, "")
-        if hasattr(image, sizes_property):
-            sizes = getattr(image, sizes_property, "")
+        if hasattr(image.instance, srcset_property):
+            srcset = getattr(image.instance, srcset_property, "")
+        if hasattr(image.instance, sizes_property):
+            sizes = getattr(image.instance, sizes_property, "")
         
         # Build image tag
         img_attrs = {
@@ -63,13 +78,10 @@ def responsive_image(image, rendition_key, alt_text="", class_name="", lazy_load
 
         # Prefer a small placeholder for the initial src when lazy-loading
         placeholder = ''
-        try:
-            # try a very small rendition if available
-            small_rend = getattr(image, 'small', None)
-            if small_rend:
-                placeholder = small_rend.url
-        except Exception:
-            placeholder = ''
+        # try a very small rendition if available
+        small_rend = get_rendition(image, 'small')
+        if small_rend:
+            placeholder = small_rend.url
 
         # If lazy_loading is requested, emit `data-src` and a tiny placeholder `src` so
         # the IntersectionObserver in the base template can swap `data-src` -> `src`.
@@ -129,18 +141,14 @@ def picture_element(image, alt_text="", class_name="", lazy_loading=True):
     try:
         # Generate different formats and sizes
         sources = []
+        renditions = [get_rendition(image, size) for size in ['small', 'medium', 'large']]
+        renditions = [rendition for rendition in renditions if rendition and rendition.width]
         
         # WebP source (modern format)
         webp_srcset = []
-        for size in ['small', 'medium', 'large']:
-            try:
-                rendition = getattr(image, size, None)
-                if rendition:
-                    webp_url = rendition.url.rsplit('.', 1)[0] + '.webp'
-                    width = getattr(rendition, 'width', '')
-                    webp_srcset.append(f"{webp_url} {width}w")
-            except:
-                continue
+        for rendition in renditions:
+            webp_url = rendition.url.rsplit('.', 1)[0] + '.webp'
+            webp_srcset.append(f"{webp_url} {rendition.width}w")
         
         if webp_srcset:
             sources.append(
@@ -149,14 +157,8 @@ def picture_element(image, alt_text="", class_name="", lazy_loading=True):
         
         # Fallback JPEG/PNG source
         jpeg_srcset = []
-        for size in ['small', 'medium', 'large']:
-            try:
-                rendition = getattr(image, size, None)
-                if rendition:
-                    width = getattr(rendition, 'width', '')
-                    jpeg_srcset.append(f"{rendition.url} {width}w")
-            except:
-                continue
+        for rendition in renditions:
+            jpeg_srcset.append(f"{rendition.url} {rendition.width}w")
         
         if jpeg_srcset:
             sources.append(
@@ -180,12 +182,10 @@ def get_image_dimensions(image, rendition_key):
     if not image:
         return (0, 0)
     
-    try:
-        rendition = getattr(image, rendition_key)
-        width = getattr(rendition, 'width', 0)
-        height = getattr(rendition, 'height', 0)
-        return (width, height)
-    except:
-        width = getattr(image, 'width', 0)
-        height = getattr(image, 'height', 0)
-        return (width, height)
\ No newline at end of file
+    # Computed from the stored dimensions and the rendition spec (no file reads)
+    rendition = get_rendition(image, rendition_key)
+    if rendition:
+        width, height = rendition.width, rendition.height
+    else:
+        width, height = stored_dimensions(image)
+    return (width or 0, height or 0)
\ No newline at end of file
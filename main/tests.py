@@ -1,3 +1,1559 @@
-from django.test import TestCase
+import csv
+import gzip
+import html
+import importlib.util
+import io
+import json
+import logging
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+import types
+import unittest
+from datetime import date, datetime, timezone as dt_timezone
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection
+from django.http import Http404, HttpResponse
+from asgiref.sync import async_to_sync, sync_to_async
+from django.template import engines
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path, resolve
+from django.utils.text import slugify
+
+from main import async_views, image_resize, message_export, spam, typeahead
+from main.context_processors import get_profile
+from main.management.commands.migrate_if_needed import FINGERPRINT_KEY, migration_fingerprint
+from main.message_export import export_lines
+from main.models import ContactMessage, DailyStat, DeploymentState, Profile, Project, ProjectRender, RelatedProject
+from main.portfolio_archive import MEDIA_PREFIX, export_archive, import_archive
+from main.preload import format_link
+from main.related import rebuild_index, update_project
+from main.stats import backfill, parse_series_params, series
+from main.renditions import RenditionResolver, rendition_size
+from main.uploads import IMMUTABLE_CACHE_CONTROL, is_content_addressed
+from main.views import ProjectDetailView, RenderListView
+from sitecore import db_router, startup
+from sitecore.db_router import PIN_COOKIE, ReplicaRouter, replica_routing_middleware
+from sitecore.early_hints import EARLY_HINT, EarlyHintsMiddleware, send_early_hints
+from sitecore.sqlite_tuning import apply_pragmas, tune_databases
+from sitecore.media import file_etag, serve_media
+from sitecore.storage_backends import HAS_S3, CachedFileSystemStorage
+
+try:
+    from moto.server import ThreadedMotoServer
+except ImportError:
+    ThreadedMotoServer = None
+
+try:
+    import jinja2
+except ImportError:
+    jinja2 = None
+
+
+class MediaRootMixin:
+    """
+    An empty MEDIA_ROOT for each test, removed afterwards. media_root_settings
+    maps other path settings to directories inside it.
+    """
+    media_root_settings = {}
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, **{
+            name: os.path.join(self.media_root, path) for name, path in self.media_root_settings.items()
+        })
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+@override_settings(MEDIA_METADATA_CACHE='default')
+class CachedFileSystemStorageTests(MediaRootMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.storage = CachedFileSystemStorage(location=self.media_root, base_url='/media/')
+
+    def test_exists_lists_directory_once(self):
+        for name in ('a.jpg', 'b.jpg', 'c.jpg'):
+            self.storage.save(f'renders/{name}', ContentFile(b'data'))
+        cache.clear()
+
+        with mock.patch.object(self.storage, 'listdir', wraps=self.storage.listdir) as listdir:
+            self.assertTrue(self.storage.exists('renders/a.jpg'))
+            self.assertTrue(self.storage.exists('renders/b.jpg'))
+            self.assertFalse(self.storage.exists('renders/missing.jpg'))
+        listdir.assert_called_once_with('renders')
+
+    def test_culled_keys_dont_hide_files(self):
+        names = [self.storage.save(f'renders/{i}.jpg', ContentFile(b'data')) for i in range(40)]
+        # Culls a third of its keys whenever it grows past ten
+        self.storage.metadata_cache = LocMemCache('culled', {'OPTIONS': {'MAX_ENTRIES': 10}})
+        for name in names:
+            self.storage.size(name)
+            self.storage.url(name)
+        self.assertTrue(all(self.storage.exists(name) for name in names))
+
+    def test_save_and_delete_update_cache(self):
+        self.assertFalse(self.storage.exists('profile/me.jpg'))
+        name = self.storage.save('profile/me.jpg', ContentFile(b'1234'))
+        self.assertTrue(self.storage.exists(name))
+        self.assertEqual(self.storage.size(name), 4)
+
+        self.storage.delete(name)
+        self.assertFalse(self.storage.exists(name))
+
+    def test_upload_rewrites_file_deleted_by_another_worker(self):
+        first, second = Project().featured_image, Project().featured_image
+        first.storage = second.storage = self.storage
+        first.save('a.png', ContentFile(png_bytes()), save=False)
+        # Deleted behind this storage's back, its cache still says it's there
+        os.remove(os.path.join(self.media_root, first.name))
+        self.assertTrue(self.storage.exists(first.name))
+
+        second.save('b.png', ContentFile(png_bytes()), save=False)
+        self.assertEqual(second.name, first.name)
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, first.name)))
+
+
+def png_bytes(color='white', size=(40, 30)):
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class ContentAddressedUploadTests(MediaRootMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+
+    def test_name_is_sharded_content_hash(self):
+        project = Project()
+        project.featured_image.save('My Screenshot.PNG', ContentFile(png_bytes()), save=False)
+
+        name = project.featured_image.name
+        self.assertTrue(name.startswith('projects/featured/'))
+        self.assertTrue(name.endswith('.png'))
+        self.assertTrue(is_content_addressed(name))
+        self.assertEqual(project.featured_image_width, 40)
+
+    def test_identical_uploads_share_one_file(self):
+        first, second, other = Project(), Project(), Project()
+        first.featured_image.save('a.png', ContentFile(png_bytes()), save=False)
+        with mock.patch.object(first.featured_image.storage, '_save') as storage_save:
+            second.featured_image.save('b.png', ContentFile(png_bytes()), save=False)
+        storage_save.assert_not_called()
+        other.featured_image.save('a.png', ContentFile(png_bytes('black')), save=False)
+
+        self.assertEqual(first.featured_image.name, second.featured_image.name)
+        self.assertNotEqual(first.featured_image.name, other.featured_image.name)
+
+
+@override_settings(IMAGE_UPLOAD_MAX_EDGE=100, IMAGE_UPLOAD_MAX_PIXELS=500 * 500)
+class ImageNormalizationTests(MediaRootMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+
+    def camera_jpeg(self, size=(400, 300), orientation=6):
+        from PIL import Image
+
+        image = Image.new('RGB', size, 'red')
+        exif = image.getexif()
+        exif[0x0112] = orientation
+        exif[0x010F] = 'Camera Maker'
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG', exif=exif)
+        return buffer.getvalue()
+
+    def test_rotates_downscales_and_strips_metadata(self):
+        from PIL import Image
+
+        render = ProjectRender()
+        render.image.save('IMG_0001.JPG', ContentFile(self.camera_jpeg()), save=False)
+
+        # 400x300 rotated a quarter turn, then capped at 100px
+        self.assertEqual((render.image_width, render.image_height), (75, 100))
+        with render.image.storage.open(render.image.name) as f, Image.open(f) as stored:
+            self.assertEqual(stored.size, (75, 100))
+            self.assertNotIn('exif', stored.info)
+
+    def test_small_clean_images_are_stored_untouched(self):
+        data = png_bytes(size=(80, 60))
+        render = ProjectRender()
+        render.image.save('small.png', ContentFile(data), save=False)
+
+        with render.image.storage.open(render.image.name) as f:
+            self.assertEqual(f.read(), data)
+
+    def test_rejects_decompression_bombs(self):
+        render = ProjectRender()
+        with self.assertRaises(ValidationError):
+            render.image.save('huge.png', ContentFile(png_bytes(size=(600, 500))), save=False)
+        self.assertEqual(os.listdir(self.media_root), [])
+
+
+class RenditionResolverTests(MediaRootMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+        self.projects = []
+        for color in ('red', 'blue'):
+            project = Project()
+            project.featured_image.save(f'{color}.png', ContentFile(png_bytes(color)), save=False)
+            self.projects.append(project)
+
+    def test_batched_pass_and_memo(self):
+        # First pass creates the renditions
+        resolver = RenditionResolver()
+        resolver.add(self.projects)
+        first = resolver.get(self.projects[0].featured_image, 'medium')
+        self.assertIn('__sized__/projects/featured/', first.url)
+        cache.clear()
+
+        storage = self.projects[0].featured_image.storage
+        resolver = RenditionResolver()
+        resolver.add(self.projects)
+        with mock.patch.object(storage, 'listdir', wraps=storage.listdir) as listdir, \
+                mock.patch.object(storage, 'exists') as exists:
+            self.assertEqual(resolver.get(self.projects[0].featured_image, 'medium'), first)
+            for project in self.projects:
+                for key in ('thumbnail', 'small', 'medium', 'large', 'hero'):
+                    self.assertIsNotNone(resolver.get(project.featured_image, key))
+            self.assertTrue(self.projects[1].featured_image_srcset)
+
+        # One listing per image directory, nothing checked file by file
+        self.assertEqual(listdir.call_count, 2)
+        exists.assert_not_called()
+
+
+class RenditionSizeTests(MediaRootMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_calculated_sizes_match_generated_files(self):
+        from PIL import Image
+
+        for size in ((1200, 800), (333, 1000), (1601, 899), (50, 40)):
+            with self.subTest(size=size):
+                profile, project = Profile(), Project()
+                data = ContentFile(png_bytes(size=size))
+                project.featured_image.save('a.png', data, save=False)
+                profile.profile_image.save('a.png', data, save=False)
+
+                for image in (project.featured_image, profile.profile_image):
+                    for rendition in RenditionResolver().renditions(image).values():
+                        with image.storage.open(rendition.name) as f, Image.open(f) as generated:
+                            self.assertEqual((rendition.width, rendition.height), generated.size, rendition.name)
+
+    def test_dimensions_without_file_access(self):
+        project = Project()
+        project.featured_image.save('a.png', ContentFile(png_bytes(size=(1000, 400))), save=False)
+        resolver = RenditionResolver()
+        resolver.renditions(project.featured_image)
+
+        with mock.patch.object(project.featured_image.storage, 'open', side_effect=AssertionError('file read')):
+            self.assertEqual(resolver.get(project.featured_image, 'medium')[2:], (640, 256))
+            self.assertEqual(rendition_size('crop__300x300', 1000, 400), (300, 300))
+            self.assertEqual(rendition_size('thumbnail__100x75', 50, 40), (50, 40))
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class PreloadTests(MediaRootMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_format_link(self):
+        self.assertEqual(
+            format_link('/a.png', 'image', imagesrcset='/a.png 320w, /b.png 640w', imagesizes='', fetchpriority='high'),
+            '</a.png>; rel=preload; as=image; imagesrcset="/a.png 320w, /b.png 640w"; fetchpriority=high',
+        )
+
+    def test_project_detail_links(self):
+        project = Project()
+        project.featured_image.save('hero.png', ContentFile(png_bytes('red', (1200, 900))), save=False)
+        render = ProjectRender(project=project)
+        render.image.save('render.png', ContentFile(png_bytes('blue')), save=False)
+
+        project.cover_render = render
+
+        links = ProjectDetailView().get_preload_links({'project': project})
+        self.assertEqual(links[0], '</static/css/dist/styles.css>; rel=preload; as=style')
+        medium = project.featured_image.thumbnail['640x480'].url
+        self.assertEqual(links[1], format_link(
+            medium, 'image',
+            imagesrcset=project.featured_image_srcset,
+            imagesizes=project.featured_image_sizes,
+        ))
+        self.assertIn(f'{medium} 640w', links[1])
+        self.assertEqual(links[2], f'<{render.image.url}>; rel=preload; as=image')
+
+
+@override_settings(
+    STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+    PROFILE_VERSION_CACHE='default',
+)
+class ResizedImageTests(MediaRootMixin, TestCase):
+    media_root_settings = {'IMAGE_RESIZE_CACHE_DIR': 'resized'}
+
+    def setUp(self):
+        super().setUp()
+        self.name = default_storage.save('projects/featured/hero.png', ContentFile(png_bytes('red', (400, 300))))
+
+    def fetch(self, url):
+        return self.client.get(url, HTTP_HOST='localhost')
+
+    def open_response(self, response):
+        from PIL import Image
+
+        return Image.open(io.BytesIO(b''.join(response.streaming_content)))
+
+    def test_resized_on_first_request_then_served_from_cache(self):
+        url = image_resize.resized_url(self.name, 200, image_format='webp')
+        with mock.patch.object(image_resize, 'encode', wraps=image_resize.encode) as encode:
+            response = self.fetch(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Content-Type'], 'image/webp')
+            self.assertEqual(response['Cache-Control'], IMMUTABLE_CACHE_CONTROL)
+            with self.open_response(response) as image:
+                self.assertEqual((image.format, image.size), ('WEBP', (200, 150)))
+
+            response = self.fetch(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(encode.call_count, 1)
+
+        response = self.fetch(image_resize.resized_url(self.name, 100, 100, 'crop', 'jpg', quality=70))
+        with self.open_response(response) as image:
+            self.assertEqual((image.format, image.size), ('JPEG', (100, 100)))
+
+        # Never upscaled
+        response = self.fetch(image_resize.resized_url(self.name, 0, 600))
+        with self.open_response(response) as image:
+            self.assertEqual((image.format, image.size), ('PNG', (400, 300)))
+
+    def test_hits_keep_the_validators(self):
+        spec = image_resize.format_spec(200, image_format='png')
+        url = image_resize.resized_url(self.name, 200)
+        path = image_resize.cache_dir() / image_resize.get_resized(self.name, spec)
+        # Written and last used an hour ago: the hit refreshes it
+        hour_ago = time.time() - 3600
+        os.utime(path, (hour_ago, hour_ago))
+        etag = file_etag(path.stat())
+
+        response = self.fetch(url)
+        self.assertGreater(path.stat().st_atime, hour_ago + 60)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(self.client.get(url, HTTP_HOST='localhost', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_only_signed_urls_are_served(self):
+        url = image_resize.resized_url(self.name, 200)
+        self.assertEqual(self.fetch(url.replace('200x0', '201x0')).status_code, 404)
+        self.assertEqual(self.fetch(url.replace('hero.png', 'other.png')).status_code, 404)
+        self.assertEqual(self.fetch(image_resize.resized_url('missing.png', 200)).status_code, 404)
+        for arguments in [(0, 0), (100, 0, 'crop'), (10000, 0), (100, 100, 'fit', 'gif'), (100, 100, 'fit', 'png', 0)]:
+            with self.assertRaises(image_resize.ResizeError):
+                image_resize.resized_url(self.name, *arguments)
+
+    def test_concurrent_requests_encode_once(self):
+        import threading
+
+        encode = image_resize.encode
+
+        def slow_encode(*args):
+            time.sleep(0.05)
+            return encode(*args)
+
+        spec = image_resize.format_spec(120, 90)
+        with mock.patch.object(image_resize, 'encode', side_effect=slow_encode) as mocked:
+            threads = [threading.Thread(target=image_resize.get_resized, args=(self.name, spec)) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(mocked.call_count, 1)
+        self.assertEqual(image_resize._flights, {})
+
+    def test_least_recently_used_are_evicted(self):
+        specs = [image_resize.format_spec(width) for width in (100, 110, 120, 130)]
+        paths = []
+        for age, spec in zip([40, 10, 30, 20], specs):
+            path = image_resize.cache_dir() / image_resize.get_resized(self.name, spec)
+            os.utime(path, (time.time() - age, time.time() - age))
+            paths.append(path)
+        size = paths[0].stat().st_size
+
+        # Room for two, the oldest two go
+        image_resize.evict(max_bytes=size * 2.5)
+        self.assertEqual([path.exists() for path in paths], [False, True, False, True])
+
+
+@override_settings(TYPEAHEAD_VERSION_CACHE='default')
+class RelatedProjectsTests(TestCase):
+    def create_project(self, slug, project_type, technologies, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Project.objects.create(
+                title=slug, slug=slug, description='', short_description='',
+                project_type=project_type, technologies=technologies,
+                featured_image='projects/featured/x.png', featured_image_width=640, featured_image_height=480,
+                start_date=date(2024, 1, 1),
+                **kwargs
+            )
+
+    def index(self):
+        return list(RelatedProject.objects.order_by('project_id', '-score', 'related_id').values_list(
+            'project_id', 'related_id', 'score'
+        ))
+
+    def related(self, project):
+        return [p.slug for p in ProjectDetailView().get_related_projects(project)]
+
+    def setUp(self):
+        self.shop = self.create_project('shop', 'web', 'Django, React, PostgreSQL')
+        self.blog = self.create_project('blog', 'web', 'Hugo')
+        self.api = self.create_project('api', 'other', 'Django, PostgreSQL')
+        self.game = self.create_project('game', 'desktop', 'C++, SDL')
+        self.dashboard = self.create_project('dashboard', 'data', 'react, Django, Pandas')
+
+    def test_scores_technology_overlap(self):
+        # The rare-type project still gets relevant suggestions...
+        self.assertEqual(self.related(self.api), ['shop', 'dashboard'])
+        # ...and overlap outranks a bare type match
+        self.assertEqual(self.related(self.shop), ['api', 'dashboard', 'blog'])
+        self.assertEqual(self.related(self.game), [])
+
+    def test_single_query(self):
+        with self.assertNumQueries(1):
+            self.related(self.shop)
+
+    def test_incremental_updates_match_rebuild(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.game.technologies = 'Django, React'
+            self.game.save()
+            self.blog.is_published = False
+            self.blog.save()
+            self.api.delete()
+        self.create_project('cli', 'other', 'PostgreSQL')
+
+        incremental = self.index()
+        rebuild_index()
+        self.assertEqual(incremental, self.index())
+        self.assertNotIn('blog', self.related(self.shop))
+
+    def test_updates_only_changed_rows(self):
+        rows = set(RelatedProject.objects.values_list('pk', 'project_id', 'related_id', 'score'))
+        self.assertEqual(update_project(self.shop.pk), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.game.technologies = 'C++, SDL, Vulkan'
+            self.game.save()
+        self.assertEqual(set(RelatedProject.objects.values_list('pk', 'project_id', 'related_id', 'score')), rows)
+
+        # blog gains api and dashboard and rescores shop, enters the lists of
+        # api and dashboard and rescores in shop's; the other rows stay as they are
+        self.blog.technologies = 'Hugo, Django'
+        self.blog.save()
+        rows = set(RelatedProject.objects.exclude(related=self.blog).exclude(project=self.blog).values_list('pk', 'score'))
+        self.assertEqual(update_project(self.blog.pk), 6)
+        self.assertLessEqual(rows, set(RelatedProject.objects.values_list('pk', 'score')))
+        incremental = self.index()
+        rebuild_index()
+        self.assertEqual(incremental, self.index())
+
+
+@override_settings(
+    STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+    PROFILE_VERSION_CACHE='default',
+    TYPEAHEAD_VERSION_CACHE='default',
+)
+class ProjectDetailTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+        self.projects = []
+        for slug in ('shop', 'api', 'dashboard'):
+            project = Project(
+                title=slug, slug=slug, description='', short_description='',
+                technologies='Django, React', start_date=date(2024, 1, 1),
+            )
+            project.featured_image.save(f'{slug}.png', ContentFile(png_bytes('red')), save=False)
+            with self.captureOnCommitCallbacks(execute=True):
+                project.save()
+            self.projects.append(project)
+
+    def add_render(self, project, display_order, color='blue'):
+        render = ProjectRender(project=project, display_order=display_order)
+        render.image.save(f'{color}.png', ContentFile(png_bytes(color)), save=False)
+        render.save()
+        return render
+
+    def test_render_stats(self):
+        shop, api = self.projects[:2]
+        second = self.add_render(shop, 2)
+        first = self.add_render(shop, 1, 'green')
+        shop.refresh_from_db()
+        self.assertEqual((shop.render_count, shop.cover_render), (2, first))
+
+        # A save from a stale instance doesn't keep old counters, and doesn't
+        # recompute them either
+        stale = Project.objects.get(pk=shop.pk)
+        self.add_render(shop, 3)
+        with CaptureQueriesContext(connection) as queries:
+            stale.title = 'Renamed'
+            stale.save()
+        self.assertFalse([query for query in queries if 'render_count' in query['sql']])
+        shop.refresh_from_db()
+        self.assertEqual((shop.title, shop.render_count), ('Renamed', 3))
+        shop.renders.get(display_order=3).delete()
+
+        api.save()
+        first.project = api
+        first.save()
+        shop.refresh_from_db()
+        api.refresh_from_db()
+        self.assertEqual((shop.render_count, shop.cover_render), (1, second))
+        self.assertEqual((api.render_count, api.cover_render), (1, first))
+
+        second.delete()
+        shop.refresh_from_db()
+        self.assertEqual((shop.render_count, shop.cover_render), (0, None))
+
+    def test_query_count(self):
+        shop = self.projects[0]
+        for i in range(3):
+            self.add_render(shop, i)
+
+        # The project with its cover render, the ordered renders, the related
+        # projects; the Profile in base.html comes from the per-process cache
+        get_profile()
+        with self.assertNumQueries(3):
+            response = self.client.get(f'/projects/{shop.slug}/', HTTP_HOST='localhost')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['renders']), 3)
+        self.assertEqual(len(response.context['related_projects']), 2)
+
+
+def page_markup(page):
+    """A page's HTML with whitespace, entity spelling and form tokens normalized"""
+    page = re.sub(r' value="[^"]*"', '', html.unescape(page))
+    return re.sub(r'\s+', ' ', re.sub(r'>\s+', '>', re.sub(r'\s+<', '<', page))).strip()
+
+
+@override_settings(
+    STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+    PROFILE_VERSION_CACHE='default',
+    TYPEAHEAD_VERSION_CACHE='default',
+)
+@unittest.skipUnless(jinja2, 'Jinja2 is required')
+class Jinja2TemplateTests(MediaRootMixin, TestCase):
+    media_root_settings = {'JINJA2_BYTECODE_DIR': 'jinja2'}
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.bytecode_dir = settings.JINJA2_BYTECODE_DIR
+
+        with self.captureOnCommitCallbacks(execute=True):
+            profile = Profile(name='Ada Lovelace', title='Engineer', bio="Builds things that don't break.")
+            profile.profile_image.save('ada.png', ContentFile(png_bytes('green')), save=False)
+            profile.save()
+            for slug, technologies in (('shop', 'Django, React'), ('api', 'Django, Go')):
+                project = Project(
+                    title=slug, slug=slug, description='First.\n\nSecond & last.', short_description='',
+                    technologies=technologies, start_date=date(2024, 1, 1), is_featured=True,
+                )
+                project.featured_image.save(f'{slug}.png', ContentFile(png_bytes('red')), save=False)
+                project.save()
+                render = ProjectRender(project=project, title=f'{slug} render')
+                render.image.save(f'{slug}-render.png', ContentFile(png_bytes('blue')), save=False)
+                render.save()
+
+    def test_pages_match_the_django_templates(self):
+        jinja2_templates = [settings.JINJA2_ENGINE, *settings.TEMPLATES]
+        for path in ('/', '/projects/shop/', '/renders/', '/renders/?page=2', '/stats/'):
+            pages = []
+            for templates in (jinja2_templates, settings.TEMPLATES):
+                # One render per page, so the pagination links are shown
+                with override_settings(TEMPLATES=templates), mock.patch.object(RenderListView, 'paginate_by', 1):
+                    response = self.client.get(path, HTTP_HOST='localhost')
+                self.assertEqual(response.status_code, 200)
+                pages.append(page_markup(response.content.decode()))
+            self.assertEqual(pages[0], pages[1], path)
+
+        with override_settings(TEMPLATES=jinja2_templates):
+            self.assertIsInstance(engines.all()[0].get_template('main/home.html').template, jinja2.Template)
+        # Compiled templates are written to the bytecode cache
+        self.assertTrue(os.listdir(self.bytecode_dir))
+
+
+def async_urlconf():
+    """The site's URLs as main/urls.py routes them under ASYNC_VIEWS"""
+    spec = importlib.util.find_spec('main.urls')
+    module = importlib.util.module_from_spec(spec)
+    with override_settings(ASYNC_VIEWS=True):
+        spec.loader.exec_module(module)
+    urlconf = types.ModuleType('async_urls')
+    urlconf.urlpatterns = [path('', include(module))]
+    urlconf.handler404 = 'main.views.custom_404'
+    urlconf.handler500 = 'main.views.custom_500'
+    return urlconf
+
+
+@override_settings(
+    STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+    PROFILE_VERSION_CACHE='default',
+    TYPEAHEAD_VERSION_CACHE='default',
+)
+class AsyncViewTests(MediaRootMixin, TestCase):
+    """The async views render the same pages as the sync ones"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            Profile.objects.create(name='Ada Lovelace', title='Engineer', bio='', email='ada@example.com')
+            for slug, project_type, technologies, featured in [
+                ('shop', 'web', 'Django, React', True),
+                ('api', 'other', 'Django, PostgreSQL', False),
+                ('game', 'desktop', 'C++', False),
+            ]:
+                project = Project(
+                    title=slug.title(), slug=slug, description=f'The {slug}.', short_description='',
+                    project_type=project_type, technologies=technologies, is_featured=featured,
+                    start_date=date(2024, 1, 1),
+                )
+                project.featured_image.save(f'{slug}.png', ContentFile(png_bytes(size=(800, 600))))
+        self.urlconf = async_urlconf()
+
+    def get_both(self, url):
+        sync_response = self.client.get(url, HTTP_HOST='localhost')
+        with override_settings(ROOT_URLCONF=self.urlconf):
+            async_response = async_to_sync(self.async_client.get)(url, HTTP_HOST='localhost')
+        self.assertEqual(async_response.status_code, sync_response.status_code, url)
+        return sync_response, async_response
+
+    def assertSamePage(self, url):
+        sync_response, async_response = self.get_both(url)
+        self.assertEqual(async_response.status_code, 200, url)
+        self.assertEqual(
+            page_markup(async_response.content.decode()), page_markup(sync_response.content.decode()), url
+        )
+        return async_response
+
+    def test_pages(self):
+        with override_settings(ROOT_URLCONF=self.urlconf):
+            match = resolve('/stats/', urlconf=self.urlconf)
+        self.assertIs(match.func.view_class, async_views.StatsView)
+
+        home = self.assertSamePage('/')
+        self.assertContains(home, 'Ada Lovelace')
+        self.assertContains(home, '/projects/shop/')
+        self.assertSamePage('/stats/')
+        self.assertSamePage('/projects/shop/')
+
+    def test_project_list_filters(self):
+        for url in ['/projects/', '/projects/?type=web', '/projects/?q=django', '/projects/?q=django&type=other']:
+            self.assertSamePage(url)
+        response = self.assertSamePage('/projects/?q=django&type=other')
+        self.assertContains(response, 'alt="Api"')
+        self.assertNotContains(response, 'alt="Shop"')
+
+    def test_not_found(self):
+        for url in ['/projects/missing/', '/projects/?page=7']:
+            _, response = self.get_both(url)
+            self.assertEqual(response.status_code, 404, url)
+
+
+@override_settings(
+    STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+    PROFILE_VERSION_CACHE='default',
+)
+class ProfileCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.profile = Profile.objects.create(
+                name='Ada Lovelace', title='Engineer', bio='', email='ada@example.com',
+            )
+
+    def test_steady_state_needs_no_queries(self):
+        self.assertEqual(get_profile(), self.profile)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_profile().name, 'Ada Lovelace')
+
+        # Every page has it, not only the views that used to query it; the
+        # one query is the (empty) gallery's count
+        with self.assertNumQueries(1):
+            response = self.client.get('/renders/', HTTP_HOST='localhost')
+        self.assertContains(response, 'Ada Lovelace')
+
+    def test_save_and_delete_invalidate(self):
+        get_profile()
+        self.profile.name = 'Ada King'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.profile.save()
+        self.assertEqual(get_profile().name, 'Ada King')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.profile.delete()
+        self.assertIsNone(get_profile())
+
+
+@override_settings(PROFILE_VERSION_CACHE='default', TYPEAHEAD_VERSION_CACHE='default')
+class PortfolioArchiveTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+        for slug, color in (('shop', 'red'), ('api', 'green')):
+            project = Project(
+                title=slug, slug=slug, description='', short_description='',
+                technologies='Django', start_date=date(2024, 1, 1), end_date=date(2024, 6, 1),
+            )
+            project.featured_image.save('cover.png', ContentFile(png_bytes(color)), save=False)
+            project.save()
+            # The same screenshot twice
+            for order in (1, 2):
+                render = ProjectRender(project=project, display_order=order)
+                render.image.save('shot.png', ContentFile(png_bytes('blue')), save=False)
+                render.save()
+
+    def export(self):
+        archive = io.BytesIO()
+        self.assertEqual(export_archive(archive), (2, 3))
+        archive.seek(0)
+        return archive
+
+    def test_round_trip_is_idempotent(self):
+        archive = self.export()
+        Project.objects.all().delete()
+
+        counts = import_archive(archive, workers=2, warm=False, log=self.fail)
+        self.assertEqual(
+            (counts['projects created'], counts['renders created'], counts['media']), (2, 4, 3)
+        )
+        shop = Project.objects.get(slug='shop')
+        self.assertEqual((shop.end_date, shop.featured_image_width), (date(2024, 6, 1), 40))
+        # What the skipped signals maintain
+        self.assertEqual((shop.render_count, shop.cover_render.display_order), (2, 1))
+        self.assertTrue(RelatedProject.objects.filter(project=shop).exists())
+
+        archive.seek(0)
+        shop.title = 'Edited'
+        shop.save()
+        api_updated_at = Project.objects.get(slug='api').updated_at
+        counts = import_archive(archive, workers=2, warm=False, log=self.fail)
+        self.assertEqual(
+            (counts['projects updated'], counts['projects unchanged'], counts['renders updated'],
+             counts['renders unchanged'], counts['projects created'], counts['renders created']),
+            (1, 1, 0, 4, 0, 0),
+        )
+        self.assertEqual(Project.objects.get(slug='shop').title, 'shop')
+        # Only the rows that differed were written
+        self.assertEqual(Project.objects.get(slug='api').updated_at, api_updated_at)
+        self.assertEqual(ProjectRender.objects.count(), 4)
+
+    def test_shared_images_are_warmed_for_every_field(self):
+        shop = Project.objects.get(slug='shop')
+        ProjectRender.objects.create(project=shop, image=shop.featured_image.name, display_order=3)
+        archive = self.export()
+        Project.objects.all().delete()
+
+        with mock.patch('main.portfolio_archive.warm_renditions', return_value=1) as warm:
+            import_archive(archive, workers=2, log=self.fail)
+        warmed = [(image.field.model, image.name) for image, in (call.args for call in warm.call_args_list)]
+        shop = Project.objects.get(slug='shop')
+        self.assertIn((Project, shop.featured_image.name), warmed)
+        self.assertIn((ProjectRender, shop.featured_image.name), warmed)
+        self.assertEqual(shop.renders.get(display_order=3).image.name, shop.featured_image.name)
+
+    def test_corrupt_images_skip_their_entries(self):
+        source = self.export()
+        archive = io.BytesIO()
+        shop_cover = Project.objects.get(slug='shop').featured_image.name
+        with tarfile.open(fileobj=source, mode='r|') as tar_in, tarfile.open(fileobj=archive, mode='w') as tar_out:
+            for member in tar_in:
+                data = tar_in.extractfile(member).read()
+                if member.name == MEDIA_PREFIX + shop_cover:
+                    # A valid header, so it is only found out when decoded
+                    data = data[:len(data) // 2]
+                member.size = len(data)
+                tar_out.addfile(member, io.BytesIO(data))
+        archive.seek(0)
+        Project.objects.all().delete()
+
+        logged = []
+        counts = import_archive(archive, workers=2, log=logged.append)
+        self.assertEqual((counts['projects created'], counts['renders created'], counts['media']), (1, 2, 2))
+        self.assertEqual(list(Project.objects.values_list('slug', flat=True)), ['api'])
+        self.assertTrue(logged[0].startswith(f'{shop_cover}: '))
+        self.assertEqual(logged[1], 'Project shop: featured image missing from the archive, skipped')
+
+    def test_rejects_other_archives(self):
+        archive = io.BytesIO()
+        with tarfile.open(fileobj=archive, mode='w') as tar:
+            tar.addfile(tarfile.TarInfo('other.txt'))
+        archive.seek(0)
+        with self.assertRaises(ValueError):
+            import_archive(archive, log=self.fail)
+
+
+class RenderUploadTests(MediaRootMixin, TestCase):
+    media_root_settings = {'RENDER_UPLOAD_DIR': 'uploads'}
+
+    def setUp(self):
+        super().setUp()
+        from django.contrib.auth.models import User
+
+        cache.clear()
+
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        self.project = Project.objects.create(
+            title='shop', slug='shop', description='', short_description='', technologies='Django',
+            featured_image='projects/featured/x.png', featured_image_width=640, featured_image_height=480,
+            start_date=date(2024, 1, 1),
+        )
+        self.url = f'/admin/main/project/{self.project.pk}/renders/upload/'
+
+    def post_json(self, url, data):
+        return self.client.post(url, data, content_type='application/json', HTTP_HOST='localhost')
+
+    def put_chunk(self, url, data, offset):
+        return self.client.put(
+            url, data, content_type='application/octet-stream', HTTP_UPLOAD_OFFSET=str(offset), HTTP_HOST='localhost'
+        )
+
+    def upload(self, content, key):
+        start = {'key': key, 'name': f'{key}.png', 'size': len(content)}
+        response = self.post_json(self.url + 'start/', start)
+        chunk_url, offset = response.json()['url'], response.json()['offset']
+        self.assertEqual(offset, 0)
+
+        with mock.patch('main.chunked_uploads.UPLOAD_CHUNK_SIZE', 100):
+            self.assertEqual(self.put_chunk(chunk_url, content[:100], 0).json(), {'offset': 100})
+            # A repeated chunk is refused with the offset to continue from
+            response = self.put_chunk(chunk_url, content[:100], 0)
+            self.assertEqual((response.status_code, response.json()['offset']), (409, 100))
+            # Resuming (e.g. after a reload) continues where it stopped
+            self.assertEqual(self.post_json(self.url + 'start/', start).json()['offset'], 100)
+            offset = 100
+            while offset < len(content):
+                response = self.put_chunk(chunk_url, content[offset:offset + 100], offset)
+                offset = response.json()['offset']
+        return response.json()['token']
+
+    def test_chunked_upload_creates_renders(self):
+        tokens = [self.upload(png_bytes(color, (200, 100)), color) for color in ('red', 'green')]
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'uploads')), [])
+
+        with mock.patch('main.background.submit') as submit, self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.post_json(self.url + 'complete/', {'tokens': tokens})
+        self.assertEqual(response.json()['created'], 2)
+        inserts = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('INSERT INTO "main_projectrender"')]
+        self.assertEqual(len(inserts), 1)
+
+        renders = list(self.project.renders.all())
+        self.assertEqual([(r.image_width, r.display_order) for r in renders], [(200, 0), (200, 1)])
+        self.assertTrue(renders[0].image.storage.exists(renders[0].image.name))
+        self.assertEqual(
+            Project.objects.values_list('render_count', 'cover_render').get(pk=self.project.pk), (2, renders[0].pk)
+        )
+        self.assertEqual(DailyStat.objects.get().renders, 2)
+        # Renditions are left to the background worker
+        job, render_ids = submit.call_args.args
+        self.assertEqual(sorted(render_ids), [r.pk for r in renders])
+
+    def test_rejects_tampered_tokens_and_non_images(self):
+        for tokens in (['forged'], [1], 'forged', {'a': 'b'}):
+            response = self.post_json(self.url + 'complete/', {'tokens': tokens})
+            self.assertEqual(response.status_code, 400)
+
+        start = {'key': 'notes', 'name': 'notes.png', 'size': 5}
+        chunk_url = self.post_json(self.url + 'start/', start).json()['url']
+        response = self.put_chunk(chunk_url, b'hello', 0)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ProjectRender.objects.exists())
+
+
+@override_settings(SPAM_COUNTER_CACHE='default', PROFILE_VERSION_CACHE='default', CONTACT_MIN_FILL_SECONDS=0)
+class ContactSpamFilterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        spam.reset()
+        self.addCleanup(spam.reset)
+
+    def submit(self, ip='203.0.113.5', **data):
+        headers = {key: data.pop(key) for key in list(data) if key.startswith('HTTP_')}
+        fields = {
+            'form_token': spam.issue_token(), 'name': 'Visitor', 'email': 'visitor@example.com',
+            'subject': 'Hello', 'message': 'I would like to talk about a project.',
+        }
+        fields.update(data)
+        return self.client.post('/contact/', fields, REMOTE_ADDR=ip, HTTP_HOST='localhost', **headers)
+
+    def test_drops_spam_before_the_database(self):
+        for data in ({'website': 'http://spam.example'}, {'form_token': 'forged'}, {'form_token': ''}):
+            with self.assertNumQueries(0):
+                response = self.submit(ip='198.51.100.7', **data)
+            # Looks like a success to the sender
+            self.assertRedirects(response, '/', fetch_redirect_response=False)
+        # The IP that tripped the checks is dropped for a while
+        with self.assertNumQueries(0):
+            self.submit(ip='198.51.100.7')
+        self.assertFalse(ContactMessage.objects.exists())
+
+        with override_settings(CONTACT_MIN_FILL_SECONDS=3), self.assertNumQueries(0):
+            self.submit(ip='198.51.100.8')
+
+        counts = spam.shed_counts()['today']
+        self.assertEqual(
+            [counts[reason] for reason in spam.SHED_REASONS], [1, 2, 1, 1, 0]
+        )
+
+    def test_duplicates_and_expired_forms(self):
+        self.submit()
+        self.assertEqual(ContactMessage.objects.count(), 1)
+        # The same text again, whatever the case and spacing
+        with self.assertNumQueries(0):
+            self.submit(ip='203.0.113.6', message='  i would like to talk ABOUT a project. ')
+        self.assertEqual(ContactMessage.objects.count(), 1)
+        self.assertEqual(spam.shed_counts()['today']['duplicate'], 1)
+        # A double-clicked submit doesn't block the sender
+        self.submit(ip='203.0.113.6', message='Something else entirely.')
+        self.assertEqual(ContactMessage.objects.count(), 2)
+
+        with override_settings(CONTACT_FORM_MAX_AGE=-1):
+            response = self.submit(ip='203.0.113.9', message='Another message about a project.')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(ContactMessage.objects.count(), 2)
+
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_home_page_form_is_accepted(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Profile.objects.create(name='Ada Lovelace', title='Engineer', bio='', email='ada@example.com')
+        page = self.client.get('/', HTTP_HOST='localhost').content.decode()
+        form_token = re.search(r'name="form_token" value="([^"]+)"', page).group(1)
+        self.submit(form_token=form_token)
+        self.assertEqual(ContactMessage.objects.count(), 1)
+
+    def test_forwarded_for_is_only_trusted_from_proxies(self):
+        for _ in range(2):
+            self.submit(ip='10.0.0.1', HTTP_X_FORWARDED_FOR='1.2.3.4', form_token='forged')
+        # A rotated header doesn't get past the block, and nobody else was blocked
+        self.submit(ip='10.0.0.1', HTTP_X_FORWARDED_FOR='5.6.7.8')
+        self.submit(ip='10.0.0.2', message='From someone else entirely.')
+        self.assertEqual(ContactMessage.objects.get().ip_address, '10.0.0.2')
+
+        with override_settings(TRUSTED_PROXY_COUNT=1):
+            self.submit(ip='10.0.0.3', HTTP_X_FORWARDED_FOR='10.0.0.2, 198.51.100.1', form_token='forged')
+            self.submit(ip='10.0.0.3', HTTP_X_FORWARDED_FOR='10.0.0.1, 198.51.100.2', message='Via the proxy.')
+        self.assertEqual(ContactMessage.objects.latest('pk').ip_address, '198.51.100.2')
+        self.assertEqual(spam.shed_counts()['today']['blocked_ip'], 1)
+
+    @override_settings(TRUSTED_PROXY_COUNT=1)
+    def test_blocking_a_client_spares_the_others_behind_the_proxy(self):
+        self.submit(ip='10.0.0.3', HTTP_X_FORWARDED_FOR='198.51.100.1', website='http://spam.example')
+        self.submit(ip='10.0.0.3', HTTP_X_FORWARDED_FOR='198.51.100.1', message='Blocked.')
+        self.submit(ip='10.0.0.3', HTTP_X_FORWARDED_FOR='198.51.100.2')
+        self.assertEqual(ContactMessage.objects.get().ip_address, '198.51.100.2')
+
+    def test_bloom_filter(self):
+        bloom = spam.BloomFilter(bits=1024, hashes=3)
+        items = [f'item-{i}' for i in range(50)]
+        for item in items:
+            bloom.add(item)
+        self.assertTrue(all(item in bloom for item in items))
+        self.assertLess(sum(f'other-{i}' in bloom for i in range(1000)), 50)
+
+        rotating = spam.RotatingBloomFilter(window=60)
+        rotating.add('old')
+        with mock.patch('main.spam.time.monotonic', return_value=time.monotonic() + 61):
+            self.assertIn('old', rotating)
+        with mock.patch('main.spam.time.monotonic', return_value=time.monotonic() + 122):
+            self.assertNotIn('old', rotating)
+
+
+@override_settings(TYPEAHEAD_VERSION_CACHE='default')
+class TypeaheadTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def create_project(self, title, technologies, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Project.objects.create(
+                title=title, slug=slugify(title), description='', short_description='',
+                technologies=technologies, start_date=date(2024, 1, 1),
+                featured_image='projects/featured/x.png', featured_image_width=640, featured_image_height=480,
+                **kwargs
+            )
+
+    def suggest(self, query):
+        response = self.client.get('/projects/suggest.json', {'q': query}, HTTP_HOST='localhost')
+        self.assertEqual(response.status_code, 200)
+        return [(item['label'], item['kind'], item['url']) for item in response.json()['suggestions']]
+
+    def test_suggestions(self):
+        self.create_project('Café Finder', 'Django, React', project_type='mobile')
+        self.create_project('Django Shop', 'Django', is_featured=True)
+        self.create_project('Hidden', 'Django', is_published=False)
+
+        self.assertEqual(self.suggest('dja'), [
+            ('Django Shop', 'project', '/projects/django-shop/'),
+            ('Django', 'technology', '/projects/?q=Django'),
+        ])
+        # Any word, without accents; matches on the first word come first
+        self.assertEqual(self.suggest(' cafe'), [('Café Finder', 'project', '/projects/cafe-finder/')])
+        # Types by number of projects
+        self.assertEqual(
+            [label for label, _, _ in self.suggest('app')], ['Web Application', 'Mobile App']
+        )
+        self.assertEqual(self.suggest(''), [])
+
+        # Served from the index and cacheable
+        with self.assertNumQueries(0):
+            response = self.client.get('/projects/suggest.json?q=s', HTTP_HOST='localhost')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=60')
+
+    def test_rebuilt_after_changes(self):
+        shop = self.create_project('Shop', 'Django')
+        self.assertEqual(len(self.suggest('shop')), 1)
+        self.create_project('Shopping List', 'Vue')
+        self.assertEqual([label for label, _, _ in self.suggest('shop')], ['Shop', 'Shopping List'])
+        with self.captureOnCommitCallbacks(execute=True):
+            shop.delete()
+        self.assertEqual([label for label, _, _ in self.suggest('shop')], ['Shopping List'])
+
+    def test_crowded_prefixes_are_ranked_in_advance(self):
+        index = typeahead.PrefixIndex(
+            typeahead.Suggestion(f'Sample {word} {i}', 'project', f'/{i}/')
+            for i in range(300) for word in ('Project', 'Portfolio')
+        )
+        self.assertIn('sample p', index.precomputed)
+        for prefix in ('s', 'sample p', 'sample po', 'portfolio', 'project 2', '29'):
+            self.assertEqual(index.lookup(prefix), index.ranked(*index.key_range(prefix)))
+            self.assertEqual(len(index.lookup(prefix)), typeahead.SUGGESTION_LIMIT)
+        self.assertEqual(index.lookup('sample portfolio 1')[0].label, 'Sample Portfolio 1')
+
+
+class MessageExportTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        self.first = ContactMessage.objects.create(
+            name='Ada', email='ada@example.com', subject='=HYPERLINK("x")', message='Line one\nline two',
+        )
+        ContactMessage.objects.create(
+            name='Bob', email='bob@example.com', subject='Hi', message='Hello', status='read',
+        )
+
+    def export(self, action, **filters):
+        # "Select all": the page's rows are sent, the filtered queryset is used
+        data = {'action': action, 'select_across': '1', 'index': '0', '_selected_action': [self.first.pk]}
+        query = '&'.join(f'{key}={value}' for key, value in filters.items())
+        return self.client.post(f'/admin/main/contactmessage/?{query}', data, HTTP_HOST='localhost')
+
+    def test_admin_csv_export_streams_filtered_messages(self):
+        response = self.export('export_csv', status__exact='new')
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment;', response['Content-Disposition'])
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(rows[0][:3], ['id', 'created_at', 'name'])
+        self.assertEqual(len(rows), 2)
+        # Multi-line cells survive, formulas are defused
+        self.assertEqual((rows[1][4], rows[1][5]), ("'=HYPERLINK(\"x\")", 'Line one\nline two'))
+
+    def test_jsonl_export_reads_in_chunks(self):
+        response = self.export('export_jsonl')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(sorted(json.loads(line)['name'] for line in lines), ['Ada', 'Bob'])
+
+        # One query per chunk, whatever the number of rows
+        with self.assertNumQueries(1):
+            self.assertEqual(len(list(export_lines(ContactMessage.objects.all(), 'jsonl', chunk_size=1))), 2)
+
+    def test_async_export_under_asgi(self):
+        ContactMessage.objects.create(name='Cy', email='cy@example.com', subject='s', message='m')
+        with override_settings(SERVER_MODE='asgi'):
+            response = self.export('export_jsonl')
+        self.assertTrue(response.is_async)
+
+        async def consume(lines):
+            return [line async for line in lines]
+
+        lines = message_export.export_lines(ContactMessage.objects.order_by('pk'), 'jsonl', chunk_size=2)
+        with mock.patch.object(message_export, 'export_lines', return_value=lines), \
+                mock.patch.object(message_export, 'islice', wraps=message_export.islice) as islice:
+            exported = async_to_sync(consume)(
+                message_export.async_export_lines(ContactMessage.objects.none(), 'jsonl', chunk_size=2)
+            )
+        self.assertEqual([json.loads(line)['name'] for line in exported], ['Ada', 'Bob', 'Cy'])
+        # Two rows at a time, then the empty chunk that ends it
+        self.assertEqual(islice.call_count, 3)
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command('export_contact_messages', '--format', 'jsonl', '--status', 'read', stdout=out)
+        self.assertEqual([json.loads(line)['name'] for line in out.getvalue().splitlines()], ['Bob'])
+
+
+class DailyStatsTests(TestCase):
+    def create_message(self):
+        return ContactMessage.objects.create(name='a', email='a@example.com', subject='s', message='m')
+
+    def test_recorded_on_insert_and_backfill(self):
+        for _ in range(3):
+            message = self.create_message()
+        message.save()
+        recorded = list(DailyStat.objects.values_list('date', 'messages'))
+        self.assertEqual(recorded, [(message.created_at.date(), 3)])
+
+        DailyStat.objects.all().delete()
+        ContactMessage.objects.filter(pk=message.pk).update(created_at=datetime(2024, 2, 10, tzinfo=dt_timezone.utc))
+        self.assertEqual(backfill(), 2)
+        self.assertEqual(DailyStat.objects.get(date=date(2024, 2, 10)).messages, 1)
+        self.assertEqual(DailyStat.objects.get(date=message.created_at.date()).messages, 2)
+
+    def test_series_gap_filling(self):
+        DailyStat.objects.create(date=date(2024, 1, 31), projects=2)
+        DailyStat.objects.create(date=date(2024, 3, 1), projects=1)
+        DailyStat.objects.create(date=date(2024, 3, 4), projects=5)
+
+        params = parse_series_params({'granularity': 'month', 'periods': '4'}, today=date(2024, 3, 20))
+        self.assertEqual(series(**params), {
+            'labels': ['Dec 2023', 'Jan 2024', 'Feb 2024', 'Mar 2024'],
+            'data': [0, 2, 0, 6],
+        })
+        # Weeks start on Monday; 2024-03-04 is one
+        self.assertEqual(
+            series('projects', date(2024, 2, 28), date(2024, 3, 10), 'week'),
+            {'labels': ['2024-02-26', '2024-03-04'], 'data': [1, 5]},
+        )
+        self.assertEqual(
+            series('projects', date(2024, 1, 30), date(2024, 2, 1), 'day')['data'], [0, 2, 0],
+        )
+
+    def test_endpoint(self):
+        self.create_message()
+        url = '/stats/series.json?metric=messages&granularity=day&periods=7'
+        response = self.client.get(url, HTTP_HOST='localhost')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data'], [0] * 6 + [1])
+        self.assertIn('max-age=300', response['Cache-Control'])
+
+        response = self.client.get(url, HTTP_HOST='localhost', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        for query in ('metric=users', 'granularity=year', 'start=2024-13-01', 'granularity=day&start=2000-01-01'):
+            response = self.client.get(f'/stats/series.json?{query}', HTTP_HOST='localhost')
+            self.assertEqual(response.status_code, 400, query)
+
+
+@override_settings(DATABASE_REPLICAS=['replica1', 'replica2'], REPLICA_HEALTH_CHECK_INTERVAL=30)
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        db_router._health.clear()
+        self.addCleanup(db_router._health.clear)
+        patcher = mock.patch.object(db_router, 'check_replica', return_value=True)
+        self.check_replica = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def request(self, method='get', path='/', write=False, **extra):
+        """Read (optionally write, then read) during a request, returning the aliases and the response"""
+        aliases = []
+
+        def view(request):
+            aliases.append(self.router.db_for_read(Project))
+            if write:
+                self.router.db_for_write(ContactMessage)
+                aliases.append(self.router.db_for_read(Project))
+            return HttpResponse()
+
+        request = getattr(RequestFactory(), method)(path, **extra)
+        return aliases, replica_routing_middleware(view)(request)
+
+    def test_public_reads_use_replicas(self):
+        aliases, response = self.request()
+        self.assertIn(aliases[0], ['replica1', 'replica2'])
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+        # Outside a request (commands, shell) everything stays on the primary
+        self.assertEqual(self.router.db_for_read(Project), 'default')
+
+    def test_pinned_after_write(self):
+        aliases, response = self.request(write=True)
+        self.assertEqual(aliases[1], 'default')
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], 5)
+
+        self.assertEqual(self.request(HTTP_COOKIE=f'{PIN_COOKIE}=1')[0], ['default'])
+        self.assertEqual(self.request('post')[0], ['default'])
+        self.assertEqual(self.request(path='/admin/main/project/')[0], ['default'])
+
+    def test_health_checks(self):
+        self.check_replica.side_effect = lambda alias: alias == 'replica2'
+        for _ in range(5):
+            self.assertEqual(self.request()[0], ['replica2'])
+        # Checked once per interval
+        self.assertEqual(self.check_replica.call_count, 2)
+
+        self.check_replica.side_effect = None
+        self.check_replica.return_value = False
+        with mock.patch.object(db_router.time, 'monotonic', return_value=time.monotonic() + 60):
+            self.assertEqual(self.request()[0], ['default'])
+
+
+class SQLiteTuningTests(SimpleTestCase):
+    def test_pragmas_on_new_connections(self):
+        from django.db.backends.sqlite3.base import DatabaseWrapper
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        databases = tune_databases({'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(directory, 'tuned.sqlite3'),
+        }})
+        self.assertIsNone(databases['default']['CONN_MAX_AGE'])
+
+        wrapper = DatabaseWrapper(
+            {**databases['default'], 'OPTIONS': {}, 'TIME_ZONE': None, 'AUTOCOMMIT': True}, alias='tuned'
+        )
+        self.addCleanup(wrapper.close)
+        wrapper.ensure_connection()
+        apply_pragmas(None, wrapper)
+        with wrapper.cursor() as cursor:
+            values = {}
+            for name in ('journal_mode', 'synchronous', 'temp_store', 'busy_timeout', 'cache_size'):
+                cursor.execute(f'PRAGMA {name}')
+                values[name] = cursor.fetchone()[0]
+        # synchronous NORMAL = 1, temp_store MEMORY = 2
+        self.assertEqual(values, {
+            'journal_mode': 'wal', 'synchronous': 1, 'temp_store': 2, 'busy_timeout': 5000, 'cache_size': -64000,
+        })
+
+
+class EarlyHintsTests(SimpleTestCase):
+    def run_app(self, view, extensions):
+        """Run a fake Django app through EarlyHintsMiddleware, returning the sent messages"""
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        async def app(scope, receive, send):
+            await view()
+            await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+            await send({'type': 'http.response.body', 'body': b''})
+
+        scope = {'type': 'http', 'extensions': extensions}
+        return sent, EarlyHintsMiddleware(app)(scope, None, send)
+
+    async def test_sync_view(self):
+        view = sync_to_async(lambda: send_early_hints(['</a.css>; rel=preload; as=style']))
+        sent, app = self.run_app(view, {EARLY_HINT: {}})
+        await app
+        self.assertEqual(
+            [message['type'] for message in sent],
+            [EARLY_HINT, 'http.response.start', 'http.response.body'],
+        )
+        self.assertEqual(sent[0]['links'], [b'</a.css>; rel=preload; as=style'])
+
+    async def test_async_view(self):
+        async def view():
+            send_early_hints(['</a.css>; rel=preload; as=style'])
+            send_early_hints(['</b.css>; rel=preload; as=style'])
+
+        sent, app = self.run_app(view, {EARLY_HINT: {}})
+        await app
+        # Sent once, before the response starts
+        self.assertEqual([message['type'] for message in sent][:2], [EARLY_HINT, 'http.response.start'])
+        self.assertEqual(len(sent), 3)
+
+    async def test_unsupported_server(self):
+        view = sync_to_async(lambda: send_early_hints(['</a.css>; rel=preload; as=style']))
+        sent, app = self.run_app(view, {})
+        await app
+        self.assertEqual(sent[0]['type'], 'http.response.start')
+
+
+class MediaServingTests(MediaRootMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.data = bytes(range(256)) * 40
+        self.write('resumes/cv.pdf', self.data)
+        self.write('__sized__/projects/renders/x-thumbnail-100x75.png', b'png')
+
+    def write(self, name, data):
+        path = os.path.join(self.media_root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_full_response_headers(self):
+        response = self.client.get('/media/resumes/cv.pdf')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.data)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=3600')
+
+        rendition = self.client.get('/media/__sized__/projects/renders/x-thumbnail-100x75.png')
+        self.assertEqual(rendition['Cache-Control'], IMMUTABLE_CACHE_CONTROL)
+
+    def test_range_requests(self):
+        response = self.client.get('/media/resumes/cv.pdf', HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.data)}')
+        self.assertEqual(b''.join(response.streaming_content), self.data[100:200])
+
+        response = self.client.get('/media/resumes/cv.pdf', HTTP_RANGE='bytes=-10')
+        self.assertEqual(b''.join(response.streaming_content), self.data[-10:])
+
+        response = self.client.get('/media/resumes/cv.pdf', HTTP_RANGE=f'bytes={len(self.data)}-')
+        self.assertEqual(response.status_code, 416)
+
+        response = self.client.get('/media/resumes/cv.pdf', HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_conditional_get(self):
+        etag = self.client.get('/media/resumes/cv.pdf')['ETag']
+        response = self.client.get('/media/resumes/cv.pdf', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_precompressed_variant(self):
+        self.write('resumes/cv.pdf.gz', gzip.compress(self.data))
+
+        response = self.client.get('/media/resumes/cv.pdf', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), self.data)
+
+        response = self.client.get('/media/resumes/cv.pdf')
+        self.assertNotIn('Content-Encoding', response)
+
+        # Refused with q=0, the best q wins otherwise
+        self.write('resumes/cv.pdf.br', b'br')
+        for accept_encoding, expected in [
+            ('br;q=0, gzip', 'gzip'), ('gzip;q=0, deflate', None), ('gzip, br', 'br'),
+            ('gzip;q=1.0, br;q=0.5', 'gzip'), ('*', 'br'), ('*, br;q=0', 'gzip'),
+        ]:
+            response = self.client.get('/media/resumes/cv.pdf', HTTP_ACCEPT_ENCODING=accept_encoding)
+            self.assertEqual(response.get('Content-Encoding'), expected, accept_encoding)
+
+    @override_settings(SERVER_MODE='asgi')
+    def test_async_streaming_under_asgi(self):
+        async def read(response):
+            return b''.join([chunk async for chunk in response.streaming_content])
+
+        with mock.patch('sitecore.media.CHUNK_SIZE', 1000):
+            response = self.client.get('/media/resumes/cv.pdf')
+            self.assertTrue(response.is_async)
+            self.assertEqual(response['Content-Length'], str(len(self.data)))
+            self.assertEqual(response['Content-Disposition'], 'inline; filename="cv.pdf"')
+            self.assertEqual(async_to_sync(read)(response), self.data)
+
+            response = self.client.get('/media/resumes/cv.pdf', HTTP_RANGE='bytes=100-2199')
+            self.assertTrue(response.is_async)
+            self.assertEqual(async_to_sync(read)(response), self.data[100:2200])
+
+        response = self.client.head('/media/resumes/cv.pdf')
+        self.assertEqual(response['Content-Length'], str(len(self.data)))
+
+    def test_missing_and_traversal(self):
+        request = RequestFactory().get('/media/')
+        for path in ('resumes/missing.pdf', 'resumes', '../settings.py'):
+            with self.assertRaises(Http404):
+                serve_media(request, path)
+
+
+@override_settings(MEDIA_METADATA_CACHE='default')
+@unittest.skipUnless(HAS_S3 and ThreadedMotoServer, 'boto3, django-storages and moto[server] are required')
+class CachedS3StorageTests(SimpleTestCase):
+    """Runs the S3 backends against moto's local S3-compatible server"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        cls.server = ThreadedMotoServer(port=0, verbose=False)
+        cls.server.start()
+        host, port = cls.server.get_host_and_port()
+        cls.endpoint_url = f'http://{host}:{port}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        from sitecore.storage_backends import PublicMediaStorage
+
+        cache.clear()
+        self.storage = PublicMediaStorage(
+            bucket_name='portfolio-test',
+            endpoint_url=self.endpoint_url,
+            access_key='testing',
+            secret_key='testing',
+            region_name='us-east-1',
+            default_acl=None,
+        )
+        self.storage.connection.create_bucket(Bucket='portfolio-test')
+
+    def test_listing_provides_exists_and_size(self):
+        self.storage.save('projects/renders/a.jpg', ContentFile(b'12345'))
+        self.storage.save('projects/renders/b.jpg', ContentFile(b'123'))
+        cache.clear()
+
+        client = self.storage.connection.meta.client
+        with mock.patch.object(client, 'head_object', side_effect=AssertionError('unexpected HEAD')):
+            self.assertTrue(self.storage.exists('projects/renders/a.jpg'))
+            self.assertFalse(self.storage.exists('projects/renders/c.jpg'))
+            self.assertEqual(self.storage.size('projects/renders/b.jpg'), 3)
+
+    def test_content_addressed_objects_are_immutable(self):
+        name = self.storage.save('projects/renders/' + 'ab/cd/' + 'abcd' * 16 + '.png', ContentFile(b'data'))
+        legacy = self.storage.save('projects/renders/legacy.png', ContentFile(b'data'))
+
+        client = self.storage.connection.meta.client
+        head = client.head_object(Bucket='portfolio-test', Key=f'media/{name}')
+        self.assertEqual(head.get('CacheControl'), IMMUTABLE_CACHE_CONTROL)
+        head = client.head_object(Bucket='portfolio-test', Key=f'media/{legacy}')
+        self.assertIsNone(head.get('CacheControl'))
+
+    def test_delete_invalidates(self):
+        name = self.storage.save('profile/me.jpg', ContentFile(b'data'))
+        self.assertTrue(self.storage.exists(name))
+        self.storage.delete(name)
+        self.assertFalse(self.storage.exists(name))
+
+
+class StartupTests(SimpleTestCase):
+    def test_timed_imports_are_marked(self):
+        module_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, module_dir)
+        with open(os.path.join(module_dir, 'slow_startup_module.py'), 'w') as f:
+            f.write('import time\ntime.sleep(0.01)\n')
+        sys.path.insert(0, module_dir)
+        self.addCleanup(sys.path.remove, module_dir)
+        self.addCleanup(sys.modules.pop, 'slow_startup_module', None)
+        self.addCleanup(setattr, startup, 'marks', startup.marks)
+        startup.marks = []
+
+        timer = startup.ImportTimer({'slow_startup_module': 'Slow module'})
+        with mock.patch.object(sys, 'meta_path', [timer, *sys.meta_path]):
+            importlib.import_module('slow_startup_module')
+            # Removed once everything it watches was imported
+            self.assertNotIn(timer, sys.meta_path)
+        (started, start), (imported, end) = startup.marks
+        self.assertEqual((started, imported), ('Slow module import started', 'Slow module imported'))
+        self.assertGreaterEqual(end - start, 0.01)
+
+
+class MigrateIfNeededTests(TransactionTestCase):
+    def migrate_if_needed(self, migrate=None):
+        with mock.patch('main.management.commands.migrate_if_needed.call_command', side_effect=migrate) as call:
+            call_command('migrate_if_needed', stdout=io.StringIO())
+        return call
+
+    def test_unchanged_fingerprint_skips_migrate(self):
+        DeploymentState.objects.create(key=FINGERPRINT_KEY, value=migration_fingerprint())
+        self.migrate_if_needed().assert_not_called()
+
+    def test_changed_fingerprint_migrates(self):
+        DeploymentState.objects.create(key=FINGERPRINT_KEY, value='before')
+        self.migrate_if_needed().assert_called_once_with('migrate', interactive=False, verbosity=1)
+        self.assertEqual(DeploymentState.objects.get(key=FINGERPRINT_KEY).value, migration_fingerprint())
+
+    def test_first_deploy_without_the_table(self):
+        with connection.schema_editor() as editor:
+            editor.delete_model(DeploymentState)
+
+        def migrate(*args, **kwargs):
+            with connection.schema_editor() as editor:
+                editor.create_model(DeploymentState)
+
+        self.migrate_if_needed(migrate).assert_called_once()
+        self.assertEqual(DeploymentState.objects.get(key=FINGERPRINT_KEY).value, migration_fingerprint())
+
+
+# Runs in a fresh process: the test database is in memory, and Django never
+# really closes an in-memory SQLite connection
+WARM_UP_SCRIPT = """
+import json, logging, django
+django.setup()
+from django.core.management import call_command
+from django.db import connections
+call_command('migrate', verbosity=0)
+connections.close_all()
+
+problems = []
+class Collect(logging.Handler):
+    def emit(self, record):
+        problems.append(record.getMessage())
+logging.getLogger('sitecore.warmup').addHandler(Collect(logging.WARNING))
+
+from sitecore.warmup import warm_up
+steps = [name for name, _ in warm_up()]
+print(json.dumps({
+    'steps': steps,
+    'problems': problems,
+    'open': [alias for alias in connections if connections[alias].connection is not None],
+}))
+"""
+
+
+class WarmUpTests(SimpleTestCase):
+    def test_empty_database(self):
+        work = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, work)
+        env = {
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': 'sitecore.settings',
+            'PYTHONPATH': str(settings.BASE_DIR),
+            'SQLITE_PATH': os.path.join(work, 'db.sqlite3'),
+            'MEDIA_ROOT': os.path.join(work, 'media'),
+            'SHARED_CACHE_DIR': os.path.join(work, 'cache'),
+            'MEDIA_METADATA_CACHE_DIR': os.path.join(work, 'media-metadata'),
+            # No collected static files for the manifest storage to find
+            'DEBUG': 'true',
+        }
+        env.pop('DATABASE_URL', None)
+        result = subprocess.run(
+            [sys.executable, '-c', WARM_UP_SCRIPT], env=env, cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        )
+        report = json.loads(result.stdout.splitlines()[-1])
+        self.assertEqual(len(report['steps']), 5)
+        self.assertEqual(report['problems'], [])
+        # Nothing for the forked workers to inherit
+        self.assertEqual(report['open'], [])
+
+    @mock.patch.dict(os.environ, {'MIGRATE_ON_BOOT': 'true'})
+    def test_migrations_checked_before_forking(self):
+        from sitecore import gunicorn_conf
+
+        with mock.patch('django.core.management.call_command') as call, \
+                mock.patch('django.db.connections.close_all') as close_all:
+            gunicorn_conf.on_starting(server=None)
+        call.assert_called_once_with('migrate_if_needed')
+        close_all.assert_called_once()
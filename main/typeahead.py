@@ -0,0 +1,179 @@
+"""
+Search suggestions for the project list (ProjectSuggestView).
+
+Each worker process keeps a PrefixIndex over the published projects' titles,
+their technologies and the project types in memory, so a lookup never queries
+the database: it is a binary search in a sorted array of keys, one key per
+word of each suggestion ("Machine Learning" is found by "mach" and "lea").
+Prefixes with many matches ("p", "pro") have their best SUGGESTION_LIMIT
+suggestions ranked when the index is built, so a lookup scans at most
+SCAN_LIMIT keys however many projects there are.
+
+Workers find out about changes the way they do for the Profile
+(context_processors.py): a Project save or delete bumps a version key in the
+TYPEAHEAD_VERSION_CACHE cache (main/signals.py) and a worker whose index was
+built under another version rebuilds it on its next lookup.
+"""
+import bisect
+import heapq
+import time
+import unicodedata
+from collections import Counter, namedtuple
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+from django.urls import reverse
+from django.utils.http import urlencode
+
+INDEX_VERSION_KEY = 'main:typeahead-version'
+
+SUGGESTION_LIMIT = 8
+
+# Prefixes matching more keys than this have their suggestions ranked in advance
+SCAN_LIMIT = 64
+
+Suggestion = namedtuple('Suggestion', ['label', 'kind', 'url'])
+
+# (version, PrefixIndex); replaced as a whole so threads never see half of it
+_index = (None, None)
+
+
+def normalize(text):
+    """Lowercase without accents, so 'Cafe' finds 'Café'"""
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def word_starts(text):
+    return [i for i, c in enumerate(text) if c.isalnum() and (i == 0 or not text[i - 1].isalnum())]
+
+
+class PrefixIndex:
+    """
+    Suggestions, best first, found by a prefix of any of their words. A match
+    on the first word ranks above a match further in.
+    """
+
+    def __init__(self, suggestions):
+        """`suggestions`: Suggestion objects, best first"""
+        self.suggestions = list(suggestions)
+        entries = []
+        for rank, suggestion in enumerate(self.suggestions):
+            label = normalize(suggestion.label)
+            for start in word_starts(label):
+                entries.append((label[start:], start > 0, rank))
+        entries.sort()
+        self.keys = [key for key, _, _ in entries]
+        # Lower is better: a first-word match, then the suggestion's rank
+        self.scores = [(later_word, rank) for _, later_word, rank in entries]
+        self.precomputed = {}
+        self.precompute()
+
+    def key_range(self, prefix, start=0, end=None):
+        """The slice of self.keys starting with `prefix`"""
+        end = len(self.keys) if end is None else end
+        start = bisect.bisect_left(self.keys, prefix, start, end)
+        return start, bisect.bisect_left(self.keys, prefix + '\U0010ffff', start, end)
+
+    def ranked(self, start, end):
+        best = {}
+        for later_word, rank in self.scores[start:end]:
+            best[rank] = min(later_word, best.get(rank, True))
+        top = heapq.nsmallest(SUGGESTION_LIMIT, ((later_word, rank) for rank, later_word in best.items()))
+        return [self.suggestions[rank] for _, rank in top]
+
+    def precompute(self):
+        """
+        Rank the matches of every prefix with more than SCAN_LIMIT keys, so no
+        lookup scans more than that. Only the children of such a prefix can
+        have that many too, so the walk stays within the crowded ranges.
+        """
+        pending = [('', 0, len(self.keys))]
+        while pending:
+            prefix, start, end = pending.pop()
+            i = start
+            while i < end:
+                if len(self.keys[i]) == len(prefix):
+                    i += 1
+                    continue
+                child = self.keys[i][:len(prefix) + 1]
+                _, child_end = self.key_range(child, i, end)
+                if child_end - i > SCAN_LIMIT:
+                    self.precomputed[child] = self.ranked(i, child_end)
+                    pending.append((child, i, child_end))
+                i = child_end
+
+    def lookup(self, query, limit=SUGGESTION_LIMIT):
+        prefix = normalize(query.strip())
+        if not prefix:
+            return []
+        if prefix in self.precomputed:
+            return self.precomputed[prefix][:limit]
+        return self.ranked(*self.key_range(prefix))[:limit]
+
+
+def build_index():
+    Project = apps.get_model('main', 'Project')
+    projects = list(
+        Project.objects.filter(is_published=True)
+        .order_by('-is_featured', '-display_order', 'title')
+        .values_list('title', 'slug', 'technologies', 'project_type')
+    )
+    technologies = Counter()
+    types = Counter()
+    for _, _, project_technologies, project_type in projects:
+        # Counted once per project, whatever the spelling of the separators
+        technologies.update({tech.strip(): 1 for tech in project_technologies.split(',') if tech.strip()})
+        types[project_type] += 1
+
+    list_url = reverse('project_list')
+    type_names = dict(Project.PROJECT_TYPES)
+    suggestions = [
+        Suggestion(title, 'project', reverse('project_detail', args=[slug]))
+        for title, slug, _, _ in projects
+    ]
+    # Most used first, then alphabetical
+    suggestions += [
+        Suggestion(tech, 'technology', f"{list_url}?{urlencode({'q': tech})}")
+        for tech, _ in sorted(technologies.items(), key=lambda item: (-item[1], item[0].casefold()))
+    ]
+    suggestions += [
+        Suggestion(type_names.get(project_type, project_type), 'type', f"{list_url}?{urlencode({'type': project_type})}")
+        for project_type, _ in types.most_common()
+    ]
+    return PrefixIndex(suggestions)
+
+
+def version_cache():
+    return caches[getattr(settings, 'TYPEAHEAD_VERSION_CACHE', 'default')]
+
+
+def index_version():
+    cache = version_cache()
+    version = cache.get(INDEX_VERSION_KEY)
+    if version is None:
+        # First worker after a cache flush; add() keeps a concurrent bump
+        cache.add(INDEX_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(INDEX_VERSION_KEY)
+    return version
+
+
+def bump_index_version():
+    """Make every worker rebuild its index on its next lookup"""
+    version_cache().set(INDEX_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def get_index():
+    global _index
+    version = index_version()
+    cached_version, index = _index
+    if cached_version != version:
+        index = build_index()
+        _index = (version, index)
+    return index
+
+
+def suggest(query, limit=SUGGESTION_LIMIT):
+    """Up to `limit` Suggestions for what has been typed so far"""
+    return get_index().lookup(query, limit)
@@ -0,0 +1,254 @@
+"""
+Content-addressed, sharded upload naming.
+
+Uploaded files are stored under the SHA-256 of their content, sharded into two
+levels of subdirectories:
+
+    projects/featured/3f/a2/3fa2...c9.png
+
+Identical uploads map to the same name, so the second one is not written
+again (and its renditions under __sized__/ are shared). Because a name can
+never point at different content, every media URL can be served with
+far-future immutable caching.
+
+Images are normalized before they are hashed (see normalize_image): EXIF
+orientation is applied, metadata is stripped and the longest edge is capped
+at IMAGE_UPLOAD_MAX_EDGE, so renditions never have to decode camera-sized
+originals.
+"""
+import hashlib
+import io
+import os
+import posixpath
+import re
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.images import get_image_dimensions
+from django.db import models
+from django.db.models.fields.files import FieldFile
+from django.utils.deconstruct import deconstructible
+from versatileimagefield.fields import VersatileImageField
+from versatileimagefield.files import VersatileImageFieldFile
+
+SHARD_LEVELS = 2
+SHARD_WIDTH = 2
+
+CONTENT_ADDRESSED_RE = re.compile(
+    r'(^|/)' + r'[0-9a-f]{%d}/' % SHARD_WIDTH * SHARD_LEVELS + r'[0-9a-f]{64}(\.|-|$)'
+)
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Formats that are re-encoded on upload; anything else (GIF, SVG, ...) is
+# only checked against IMAGE_UPLOAD_MAX_PIXELS
+NORMALIZED_FORMATS = {'JPEG', 'PNG', 'WEBP'}
+
+# image.info keys that carry metadata we don't want to publish (GPS, camera)
+METADATA_KEYS = ('exif', 'xmp', 'XML:com.adobe.xmp', 'comment')
+
+EXIF_ORIENTATION = 0x0112
+
+
+def content_hash(content):
+    """SHA-256 hex digest of a file-like object, read in chunks"""
+    digest = hashlib.sha256()
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    if hasattr(content, 'chunks'):
+        chunks = content.chunks()
+    else:
+        chunks = iter(lambda: content.read(64 * 1024), b'')
+    for chunk in chunks:
+        digest.update(chunk)
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    return digest.hexdigest()
+
+
+def open_image(content):
+    """
+    Open an upload with Pillow, reading only the header, and refuse images
+    with more than IMAGE_UPLOAD_MAX_PIXELS pixels before anything is decoded.
+    """
+    from PIL import Image
+
+    content.seek(0)
+    try:
+        image = Image.open(content)
+    except Image.DecompressionBombError:
+        raise ValidationError('Image is too large.', code='image_too_large')
+    except (OSError, SyntaxError):
+        raise ValidationError('Upload a valid image.', code='invalid_image')
+
+    if image.width * image.height > settings.IMAGE_UPLOAD_MAX_PIXELS:
+        image.close()
+        raise ValidationError(
+            f'Image is too large ({image.width}x{image.height} pixels).',
+            code='image_too_large',
+        )
+    return image
+
+
+def validate_image_pixels(value):
+    """Model validator: reject decompression bombs when the form is cleaned"""
+    if value and not getattr(value, '_committed', True):
+        open_image(value.file).close()
+
+
+def normalize_image(content, name):
+    """
+    Return (name, content) for an image upload, re-encoded when it needs to
+    be rotated, downscaled or stripped of metadata; other uploads are
+    returned unchanged.
+    """
+    from PIL import Image, ImageOps
+
+    max_edge = settings.IMAGE_UPLOAD_MAX_EDGE
+    with open_image(content) as image:
+        image_format = image.format
+        if image_format not in NORMALIZED_FORMATS:
+            content.seek(0)
+            return name, content
+
+        orientation = image.getexif().get(EXIF_ORIENTATION, 1)
+        too_large = max(image.size) > max_edge
+        has_metadata = any(key in image.info for key in METADATA_KEYS)
+        if not too_large and orientation == 1 and not has_metadata:
+            content.seek(0)
+            return name, content
+
+        icc_profile = image.info.get('icc_profile')
+        if image_format == 'JPEG' and too_large:
+            # Let libjpeg decode at 1/2, 1/4 or 1/8 scale instead of full size
+            image.draft('RGB', (max_edge, max_edge))
+        normalized = ImageOps.exif_transpose(image)
+        if too_large and normalized.mode == 'P':
+            # Palette images can only be resized with nearest-neighbour
+            normalized = normalized.convert('RGBA')
+        normalized.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+        options = {'optimize': True}
+        if icc_profile:
+            # Keep the colour profile, it's the only metadata that affects rendering
+            options['icc_profile'] = icc_profile
+        if image_format == 'JPEG':
+            if normalized.mode not in ('RGB', 'L'):
+                # e.g. CMYK, whose ICC profile no longer applies after converting
+                normalized = normalized.convert('RGB')
+                options.pop('icc_profile', None)
+            options.update(quality=settings.IMAGE_UPLOAD_QUALITY, progressive=True)
+        elif image_format == 'WEBP':
+            options.update(quality=settings.IMAGE_UPLOAD_QUALITY, method=6)
+
+        output = io.BytesIO()
+        normalized.save(output, image_format, **options)
+
+    return name, ContentFile(output.getvalue(), name=name)
+
+
+def content_addressed_name(prefix, digest, ext):
+    shards = [digest[i * SHARD_WIDTH:(i + 1) * SHARD_WIDTH] for i in range(SHARD_LEVELS)]
+    return posixpath.join(prefix, *shards, digest + ext.lower())
+
+
+def is_content_addressed(name):
+    """True for content-addressed originals and the renditions derived from them"""
+    return bool(CONTENT_ADDRESSED_RE.search(name))
+
+
+def is_stored(storage, name):
+    """
+    Whether `name` is in the storage, skipping the metadata cache of the
+    storage_backends storages: an entry cached before a delete elsewhere
+    would have the write skipped and the row pointed at a missing file
+    """
+    return getattr(storage, 'exists_uncached', storage.exists)(name)
+
+
+def store_image(field, content):
+    """
+    Store an image outside a model save, the way an upload through the
+    ContentAddressedImageField `field` would be: normalized, named by content
+    and not written again when already stored. `content` is read in chunks
+    unless it has to be re-encoded. Returns (name, width, height).
+    """
+    _, content = normalize_image(content, content.name)
+    storage = field.storage
+    name = storage.generate_filename(field.upload_to(None, content.name, content=content))
+    if not is_stored(storage, name):
+        name = storage.save(name, content, max_length=field.max_length)
+    width, height = get_image_dimensions(content)
+    return name, width, height
+
+
+@deconstructible
+class ContentAddressedUploadTo:
+    """
+    upload_to strategy naming files by content hash under `prefix`.
+
+    Used together with the ContentAddressed*Field classes below, which hand
+    the file content to it (Django's own upload_to callables only receive the
+    instance and the original filename).
+    """
+
+    def __init__(self, prefix):
+        self.prefix = prefix.strip('/')
+
+    def __call__(self, instance, filename, content=None):
+        if content is None:
+            # Form uploads: the pending file is attached to the instance
+            for field in instance._meta.fields:
+                if getattr(field, 'upload_to', None) == self:
+                    content = getattr(instance, field.attname).file
+                    break
+        ext = os.path.splitext(filename)[1]
+        return content_addressed_name(self.prefix, content_hash(content), ext)
+
+    def __eq__(self, other):
+        return isinstance(other, ContentAddressedUploadTo) and self.prefix == other.prefix
+
+
+class ContentAddressedFieldFileMixin:
+    """Names the file by content and skips the write when it's already stored"""
+
+    def save(self, name, content, save=True):
+        upload_to = self.field.upload_to
+        if not isinstance(upload_to, ContentAddressedUploadTo):
+            return super().save(name, content, save)
+
+        name = self.storage.generate_filename(upload_to(self.instance, name, content=content))
+        if is_stored(self.storage, name):
+            # Duplicate upload, reuse the stored file
+            self.name = name
+        else:
+            self.name = self.storage.save(name, content, max_length=self.field.max_length)
+        setattr(self.instance, self.field.attname, self.name)
+        self._committed = True
+
+        if save:
+            self.instance.save()
+    save.alters_data = True
+
+
+class ContentAddressedImageFieldFile(ContentAddressedFieldFileMixin, VersatileImageFieldFile):
+    def save(self, name, content, save=True):
+        name, content = normalize_image(content, name)
+        super().save(name, content, save)
+    save.alters_data = True
+
+
+class ContentAddressedFileFieldFile(ContentAddressedFieldFileMixin, FieldFile):
+    pass
+
+
+class ContentAddressedImageField(VersatileImageField):
+    """VersatileImageField storing normalized uploads under their content hash"""
+    attr_class = ContentAddressedImageFieldFile
+    default_validators = [validate_image_pixels]
+
+
+class ContentAddressedFileField(models.FileField):
+    """FileField storing uploads under their content hash"""
+    attr_class = ContentAddressedFileFieldFile
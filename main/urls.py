@@ -1,20 +1,32 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+# Under ASGI the read-heavy pages use their async counterparts
+if settings.ASYNC_VIEWS:
+    from . import async_views as read_views
+else:
+    read_views = views
+
 urlpatterns = [
     # Home
-    path('', views.HomeView.as_view(), name='home'),
+    path('', read_views.HomeView.as_view(), name='home'),
     
     # Projects
-    path('projects/', views.ProjectListView.as_view(), name='project_list'),
-    path('projects/<slug:slug>/', views.ProjectDetailView.as_view(), name='project_detail'),
+    path('projects/', read_views.ProjectListView.as_view(), name='project_list'),
+    path('projects/suggest.json', views.ProjectSuggestView.as_view(), name='project_suggest'),
+    path('projects/<slug:slug>/', read_views.ProjectDetailView.as_view(), name='project_detail'),
     
     # Renders
     path('renders/', views.RenderListView.as_view(), name='render_list'),
     
+    # Resized images (signed URLs from image_resize.resized_url)
+    path('images/<str:signature>/<str:spec>/<path:name>', views.ResizedImageView.as_view(), name='resized_image'),
+    
     # Contact
     path('contact/', views.ContactView.as_view(), name='contact'),
     
     # Stats
-    path('stats/', views.StatsView.as_view(), name='stats'),
+    path('stats/', read_views.StatsView.as_view(), name='stats'),
+    path('stats/series.json', views.StatsSeriesView.as_view(), name='stats_series'),
 ]
\ No newline at end of file
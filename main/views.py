@@ -1,34 +1,81 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.views.generic import ListView, DetailView, TemplateView, FormView
+from django.views.generic import ListView, DetailView, TemplateView, FormView, View
 from django.views.generic.edit import CreateView
-from django.db.models import Count, Q
+from django.db.models import Count, Prefetch, Q
 from django.contrib import messages
+from django.http import Http404, JsonResponse
 from django.urls import reverse_lazy
-from django.utils import timezone
-from datetime import timedelta
-from .models import Profile, Project, ProjectRender, ContactMessage
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+import hashlib
+from sitecore.early_hints import send_early_hints
+from sitecore.media import serve_media
+from .models import Project, ProjectRender, ContactMessage
 from .forms import ContactForm
+from . import image_resize, spam, stats, typeahead
+from .context_processors import get_profile
+from .preload import image_preload, style_preload
+from .related import RELATED_PROJECTS_SHOWN
+from .renditions import prefetch_renditions
+from .uploads import IMMUTABLE_CACHE_CONTROL
 
-class HomeView(TemplateView):
+class RenditionPrefetchMixin:
+    """Resolve the images of these context entries in one batched rendition lookup"""
+    prefetch_rendition_context = ()
+    
+    def render_to_response(self, context, **response_kwargs):
+        prefetch_renditions(*(context.get(name) for name in self.prefetch_rendition_context))
+        return super().render_to_response(context, **response_kwargs)
+
+class PreloadMixin:
+    """Announce the page's critical resources before the template is rendered"""
+    
+    def get_preload_links(self, context):
+        """Link header values for the resources above the fold"""
+        return [style_preload()]
+    
+    def render_to_response(self, context, **response_kwargs):
+        links = [link for link in self.get_preload_links(context) if link]
+        # 103 Early Hints where the ASGI server supports them, the body isn't rendered yet
+        send_early_hints(links)
+        response = super().render_to_response(context, **response_kwargs)
+        if links:
+            response['Link'] = ', '.join(filter(None, [response.get('Link')] + links))
+        return response
+
+class HomeView(RenditionPrefetchMixin, PreloadMixin, TemplateView):
     """Homepage with featured projects and profile"""
     template_name = 'main/home.html'
+    prefetch_rendition_context = ('profile', 'projects', 'featured_projects')
     
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        try:
-            context['profile'] = Profile.objects.first()
-        except Profile.DoesNotExist:
-            context['profile'] = None
-        
-        # Get published projects ordered by display priority
-        context['projects'] = Project.objects.filter(
+    def get_preload_links(self, context):
+        links = super().get_preload_links(context)
+        profile = context.get('profile')
+        if profile:
+            # Hero image
+            links.append(image_preload(profile.profile_image, 'large_square_crop'))
+        return links
+    
+    def get_projects(self):
+        """Published projects ordered by display priority"""
+        return Project.objects.filter(
             is_published=True
         ).order_by('-display_order', '-is_featured', '-created_at')[:6]
-        
-        context['featured_projects'] = Project.objects.filter(
+    
+    def get_featured_projects(self):
+        return Project.objects.filter(
             is_published=True, 
             is_featured=True
         ).order_by('-display_order', '-created_at')
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['profile'] = get_profile()
+        # main/contact.html is included at the bottom of the page
+        context.update(spam.form_context())
+        
+        context['projects'] = self.get_projects()
+        context['featured_projects'] = self.get_featured_projects()
         
         return context
 
@@ -65,39 +112,66 @@ class ProjectListView(ListView):
         context['search_query'] = self.request.GET.get('q', '')
         
         # Count projects by type for filters
-        context['project_counts'] = {
-            project_type[0]: Project.objects.filter(
-                is_published=True, 
-                project_type=project_type[0]
-            ).count()
-            for project_type in Project.PROJECT_TYPES
-        }
+        context['project_counts'] = self.get_project_counts()
         
         return context
+    
+    def get_project_counts_queryset(self):
+        return Project.objects.filter(
+            is_published=True
+        ).values('project_type').annotate(count=Count('id')).order_by()
+    
+    def get_project_counts(self, rows=None):
+        """Published project counts keyed by every project type"""
+        if rows is None:
+            rows = self.get_project_counts_queryset()
+        counts = {project_type[0]: 0 for project_type in Project.PROJECT_TYPES}
+        counts.update({row['project_type']: row['count'] for row in rows})
+        return counts
 
-class ProjectDetailView(DetailView):
+class ProjectDetailView(RenditionPrefetchMixin, PreloadMixin, DetailView):
     """Project detail page with renders"""
     model = Project
     template_name = 'main/projects/project_detail.html'
     context_object_name = 'project'
+    prefetch_rendition_context = ('project', 'renders', 'related_projects')
     
     def get_queryset(self):
-        return Project.objects.filter(is_published=True)
+        # The ordered renders come with the project, in one extra query
+        return Project.objects.filter(is_published=True).select_related('cover_render').prefetch_related(
+            Prefetch('renders', queryset=ProjectRender.objects.order_by('display_order', 'created_at'))
+        )
     
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        project = self.get_object()
-        
-        # Get project renders ordered by display order
-        context['renders'] = project.renders.all().order_by('display_order')
-        
-        # Get related projects (same type, excluding current)
-        context['related_projects'] = Project.objects.filter(
+    def get_renders(self, project):
+        """Project renders ordered by display order (prefetched by get_queryset)"""
+        return project.renders.all()
+    
+    def get_related_projects(self, project):
+        """Most similar projects, from the precomputed index (main/related.py)"""
+        return Project.objects.filter(
+            related_to_entries__project=project,
             is_published=True,
-            project_type=project.project_type
-        ).exclude(id=project.id).order_by('-is_featured', '-display_order')[:3]
-        
-        return context
+        ).order_by('-related_to_entries__score')[:RELATED_PROJECTS_SHOWN]
+    
+    def get_preload_links(self, context):
+        links = super().get_preload_links(context)
+        project = context['project']
+        links.append(image_preload(project.featured_image, 'medium'))
+        if project.cover_render:
+            # main/renders/grid.html shows the original with a plain <img src>
+            links.append(image_preload(project.cover_render.image, 'full_size', responsive=False))
+        return links
+    
+    def get_context_data(self, **kwargs):
+        # self.object was loaded by get(), with its renders
+        project = self.object
+        if 'related_projects' not in kwargs:
+            kwargs['related_projects'] = self.get_related_projects(project)
+        return super().get_context_data(
+            renders=self.get_renders(project),
+            technologies=project.get_technologies_list(),
+            **kwargs
+        )
 
 class RenderListView(ListView):
     """Grid view of all project renders"""
@@ -116,6 +190,20 @@ class ContactView(FormView):
     template_name = 'main/contact.html'
     form_class = ContactForm
     success_url = reverse_lazy('home')
+    success_message = 'Thank you for your message! I will get back to you soon.'
+    
+    def post(self, request, *args, **kwargs):
+        # Obvious spam is dropped before form validation and the database
+        verdict = spam.check(request.POST, self.get_client_ip())
+        if verdict is None:
+            return super().post(request, *args, **kwargs)
+        spam.count(verdict)
+        if verdict == spam.EXPIRED:
+            messages.warning(request, 'The form had expired, please send it again.')
+            return self.render_to_response(self.get_context_data(form=self.get_form()))
+        # Same answer as a real submission, so bots can't tell
+        messages.success(request, self.success_message)
+        return redirect(self.get_success_url())
     
     def form_valid(self, form):
         # Get client IP and user agent
@@ -127,27 +215,18 @@ class ContactView(FormView):
         contact_message.ip_address = ip_address
         contact_message.user_agent = user_agent
         contact_message.save()
+        spam.remember(contact_message.message)
         
-        messages.success(
-            self.request, 
-            'Thank you for your message! I will get back to you soon.'
-        )
+        messages.success(self.request, self.success_message)
         return super().form_valid(form)
     
     def get_client_ip(self):
-        x_forwarded_for = self.request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = self.request.META.get('REMOTE_ADDR')
-        return ip
+        return spam.client_ip(self.request)
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        try:
-            context['profile'] = Profile.objects.first()
-        except Profile.DoesNotExist:
-            context['profile'] = None
+        context['profile'] = get_profile()
+        context.update(spam.form_context())
         return context
 
 class StatsView(TemplateView):
@@ -158,10 +237,8 @@ class StatsView(TemplateView):
         context = super().get_context_data(**kwargs)
         
         # Basic counts
-        context['total_projects'] = Project.objects.filter(is_published=True).count()
-        context['total_renders'] = ProjectRender.objects.filter(project__is_published=True).count()
-        context['total_contact_messages'] = ContactMessage.objects.count()
-        context['featured_projects_count'] = Project.objects.filter(is_published=True, is_featured=True).count()
+        for key, queryset in self.get_count_querysets().items():
+            context[key] = queryset.count()
         
         # Projects by type
         context['projects_by_type'] = self.get_projects_by_type()
@@ -169,103 +246,85 @@ class StatsView(TemplateView):
         # Technology usage
         context['technology_usage'] = self.get_technology_usage()
         
-        # Monthly project creation stats
-        context['monthly_project_stats'] = self.get_monthly_project_stats()
-        
-        # Contact message trends
-        context['message_trends'] = self.get_message_trends()
-        
         # Recent activity
-        context['recent_projects'] = Project.objects.filter(
-            is_published=True
-        ).order_by('-created_at')[:5]
-        
-        context['recent_messages'] = ContactMessage.objects.all().order_by('-created_at')[:5]
+        context.update(self.get_recent_querysets())
         
         return context
     
-    def get_projects_by_type(self):
-        """Get project counts by type for pie chart"""
-        projects_by_type = Project.objects.filter(
+    def get_count_querysets(self):
+        return {
+            'total_projects': Project.objects.filter(is_published=True),
+            'total_renders': ProjectRender.objects.filter(project__is_published=True),
+            'total_contact_messages': ContactMessage.objects.all(),
+            'featured_projects_count': Project.objects.filter(is_published=True, is_featured=True),
+        }
+    
+    def get_recent_querysets(self):
+        return {
+            'recent_projects': Project.objects.filter(
+                is_published=True
+            ).order_by('-created_at')[:5],
+            'recent_messages': ContactMessage.objects.all().order_by('-created_at')[:5],
+        }
+    
+    def get_projects_by_type_queryset(self):
+        return Project.objects.filter(
             is_published=True
         ).values('project_type').annotate(count=Count('id'))
+    
+    def get_projects_by_type(self, rows=None):
+        """Get project counts by type for pie chart"""
+        if rows is None:
+            rows = self.get_projects_by_type_queryset()
         
         return {
             item['project_type']: item['count'] 
-            for item in projects_by_type
+            for item in rows
         }
     
-    def get_technology_usage(self):
+    def get_technologies_queryset(self):
+        return Project.objects.filter(is_published=True).values_list('technologies', flat=True)
+    
+    def get_technology_usage(self, technologies=None):
         """Analyze technology usage across projects"""
-        all_technologies = []
-        projects = Project.objects.filter(is_published=True)
+        if technologies is None:
+            technologies = self.get_technologies_queryset()
         
-        for project in projects:
-            tech_list = project.get_technologies_list()
-            all_technologies.extend(tech_list)
+        all_technologies = []
+        for value in technologies:
+            all_technologies.extend(tech.strip() for tech in value.split(','))
         
         # Count technology usage
         from collections import Counter
         tech_counter = Counter(all_technologies)
         
         return dict(tech_counter.most_common(10))  # Top 10 technologies
+
+class StatsSeriesView(View):
+    """
+    Chart series from the daily rollup (main/stats.py), e.g.
+    /stats/series.json?metric=messages&granularity=week&periods=26
+    """
+    max_age = 300
     
-    def get_monthly_project_stats(self):
-        """Get project creation stats for the last 12 months"""
-        from django.db.models.functions import TruncMonth
-        from django.db.models import Count
-        from datetime import datetime, timedelta
-        
-        one_year_ago = timezone.now() - timedelta(days=365)
-        
-        monthly_stats = Project.objects.filter(
-            created_at__gte=one_year_ago
-        ).annotate(
-            month=TruncMonth('created_at')
-        ).values('month').annotate(
-            count=Count('id')
-        ).order_by('month')
-        
-        # Format for Chart.js
-        months = []
-        counts = []
-        
-        for stat in monthly_stats:
-            months.append(stat['month'].strftime('%b %Y'))
-            counts.append(stat['count'])
-        
-        return {
-            'labels': months,
-            'data': counts
-        }
-    
-    def get_message_trends(self):
-        """Get contact message trends for the last 6 months"""
-        from django.db.models.functions import TruncMonth
-        from django.db.models import Count
-        
-        six_months_ago = timezone.now() - timedelta(days=180)
-        
-        message_trends = ContactMessage.objects.filter(
-            created_at__gte=six_months_ago
-        ).annotate(
-            month=TruncMonth('created_at')
-        ).values('month').annotate(
-            count=Count('id')
-        ).order_by('month')
-        
-        # Format for Chart.js
-        months = []
-        counts = []
-        
-        for trend in message_trends:
-            months.append(trend['month'].strftime('%b %Y'))
-            counts.append(trend['count'])
-        
-        return {
-            'labels': months,
-            'data': counts
-        }
+    def get(self, request, *args, **kwargs):
+        try:
+            params = stats.parse_series_params(request.GET)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        
+        response = JsonResponse({
+            'metric': params['metric'],
+            'granularity': params['granularity'],
+            'start': params['start'].isoformat(),
+            'end': params['end'].isoformat(),
+            **stats.series(**params),
+        })
+        etag = quote_etag(hashlib.md5(response.content).hexdigest())
+        response = get_conditional_response(request, etag=etag, response=response)
+        response['ETag'] = etag
+        patch_cache_control(response, public=True, max_age=self.max_age)
+        return response
 
 # Legacy function-based views for backward compatibility
 def home(request):
@@ -280,4 +339,42 @@ def custom_404(request, exception):
     return render(request, 'main/404.html', status=404)
 
 def custom_500(request):
-    return render(request, 'main/500.html', status=500)
\ No newline at end of file
+    return render(request, 'main/500.html', status=500)
+
+class ProjectSuggestView(View):
+    """
+    Search suggestions as the visitor types, from the in-memory index
+    (main/typeahead.py), e.g. /projects/suggest.json?q=dja
+    """
+    max_age = 60
+    max_query_length = 100
+    
+    def get(self, request, *args, **kwargs):
+        query = request.GET.get('q', '')[:self.max_query_length]
+        response = JsonResponse({
+            'query': query,
+            'suggestions': [suggestion._asdict() for suggestion in typeahead.suggest(query)],
+        })
+        # Short, so new projects show up soon; repeated prefixes come from caches
+        patch_cache_control(response, public=True, max_age=self.max_age)
+        return response
+
+class ResizedImageView(View):
+    """
+    An image resized to the signed spec in the URL (main/image_resize.py),
+    encoded on the first request and served from the disk cache after that
+    """
+    http_method_names = ['get', 'head']
+    
+    def get(self, request, signature, spec, name):
+        if not image_resize.check_signature(signature, spec, name):
+            raise Http404('Invalid signature')
+        try:
+            relative = image_resize.get_resized(name, spec)
+        except (image_resize.ResizeError, OSError):
+            # Not there or not an image
+            raise Http404('Image not found')
+        response = serve_media(request, relative, document_root=image_resize.cache_dir())
+        # The URL names the file and everything done to it
+        response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        return response
@@ -0,0 +1,37 @@
+"""Helpers shared by the benchmark and check scripts in this directory.
+
+They are run as `python scripts/<name>.py`, which puts this directory on
+sys.path, so they import from here with `from _harness import ...`.
+"""
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def manage(env, *args, quiet=False):
+    """Run manage.py in the project with `env`; `quiet` also hides its warnings"""
+    subprocess.run([sys.executable, 'manage.py', *args], cwd=ROOT, env=env, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL if quiet else None)
+
+
+def wait_until_ready(url, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=2).read()
+            return
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.2)
+    raise RuntimeError(f'Server did not come up at {url}')
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""Compare concurrent-request throughput of the sync (WSGI) and async (ASGI) setups.
+
+Usage: python scripts/bench_async.py [--requests 400] [--concurrency 20] [--workers 1]
+
+Creates a throwaway SQLite database and media directory, seeds them with
+`manage.py seed_portfolio`, then starts gunicorn once with sync workers and
+once with uvicorn workers (the same way scripts/start.sh does) and fires the
+same mix of home / project list / project detail / stats requests at each.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from _harness import ROOT, free_port, manage, wait_until_ready
+
+MODES = {
+    'wsgi': ['sitecore.wsgi:application'],
+    'asgi': ['sitecore.asgi:application', '--worker-class', 'uvicorn.workers.UvicornWorker'],
+}
+
+
+def fetch(url):
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=60) as response:
+            response.read()
+            ok = response.status == 200
+    except urllib.error.URLError:
+        ok = False
+    return time.perf_counter() - start, ok
+
+
+def run_mode(mode, env, paths, args):
+    port = free_port()
+    base = f'http://127.0.0.1:{port}'
+    server = subprocess.Popen(
+        ['gunicorn', *MODES[mode], '--bind', f'127.0.0.1:{port}', '--workers', str(args.workers)],
+        cwd=ROOT, env=dict(env, SERVER_MODE=mode),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_until_ready(base + '/')
+        urls = [base + paths[i % len(paths)] for i in range(args.requests)]
+        # Warm every page once so both modes start from the same state
+        for path in paths:
+            fetch(base + path)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            results = list(pool.map(fetch, urls))
+        elapsed = time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait()
+
+    latencies = sorted(latency for latency, _ in results)
+    return {
+        'mode': mode,
+        'rps': len(results) / elapsed,
+        'mean': statistics.mean(latencies) * 1000,
+        'p95': latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        'errors': sum(1 for _, ok in results if not ok),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--projects', type=int, default=30)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            SQLITE_PATH=os.path.join(tmp, 'bench.sqlite3'),
+            MEDIA_ROOT=os.path.join(tmp, 'media'),
+            ALLOWED_HOSTS='127.0.0.1,localhost',
+        )
+        print('Seeding benchmark database...')
+        manage(env, 'migrate', '--noinput')
+        manage(env, 'seed_portfolio', '--projects', str(args.projects), '--messages', '20')
+
+        paths = ['/', '/projects/', '/projects/?page=2', '/stats/'] + [
+            f'/projects/sample-project-{i}/' for i in range(1, min(args.projects, 8) + 1)
+        ]
+
+        print(f'{args.requests} requests, concurrency {args.concurrency}, {args.workers} worker(s)\n')
+        print(f"{'mode':<6} {'req/s':>9} {'mean ms':>9} {'p95 ms':>9} {'errors':>7}")
+        for mode in MODES:
+            result = run_mode(mode, env, paths, args)
+            print(f"{result['mode']:<6} {result['rps']:>9.1f} {result['mean']:>9.1f} "
+                  f"{result['p95']:>9.1f} {result['errors']:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""Compare mixed read/write throughput with stock and tuned SQLite (SQLITE_TUNING).
+
+Usage: python scripts/bench_sqlite.py [--seconds 15] [--readers 16] [--writers 4] [--workers 4]
+
+For each configuration, creates a throwaway SQLite database seeded with
+`manage.py seed_portfolio`, starts gunicorn with several sync worker
+processes (separate processes contend for the database file the way a
+deployment does) and, for a fixed time, runs reader threads requesting
+ProjectListView pages next to writer threads submitting ContactView forms.
+Reports requests/s, p50/p95 latency and errors ("database is locked" ends up
+as a 500) for each kind of traffic.
+"""
+import argparse
+import http.cookiejar
+import os
+import re
+import subprocess
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from _harness import ROOT, free_port, manage, wait_until_ready
+
+CONFIGURATIONS = {
+    'stock': {'SQLITE_TUNING': 'false'},
+    'tuned': {'SQLITE_TUNING': 'true'},
+}
+
+LIST_PATHS = ['/projects/', '/projects/?page=2', '/projects/?type=web', '/projects/?q=Django']
+
+CSRF_RE = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+FORM_TOKEN_RE = re.compile(r'name="form_token" value="([^"]+)"')
+
+
+def timed(opener, request):
+    start = time.perf_counter()
+    try:
+        with opener.open(request, timeout=60) as response:
+            response.read()
+            ok = response.status == 200
+    except urllib.error.URLError:
+        ok = False
+    return time.perf_counter() - start, ok
+
+
+def reader(base, deadline, results):
+    opener = urllib.request.build_opener()
+    i = 0
+    while time.monotonic() < deadline:
+        results.append(timed(opener, base + LIST_PATHS[i % len(LIST_PATHS)]))
+        i += 1
+
+
+def writer(base, deadline, results):
+    # Each writer is a visitor with its own CSRF cookie
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+    with opener.open(base + '/contact/', timeout=60) as response:
+        page = response.read().decode()
+    token, form_token = CSRF_RE.search(page).group(1), FORM_TOKEN_RE.search(page).group(1)
+    i = 0
+    while time.monotonic() < deadline:
+        data = urllib.parse.urlencode({
+            'csrfmiddlewaretoken': token,
+            'form_token': form_token,
+            'name': 'Benchmark',
+            'email': 'bench@example.com',
+            'subject': f'Message {i}',
+            # Unique, or the spam pre-filter drops it as a duplicate
+            'message': f'Mixed read/write benchmark, message {threading.get_ident()}-{i}.',
+        }).encode()
+        # A successful submission redirects to the home page
+        request = urllib.request.Request(base + '/contact/', data=data, headers={'Referer': base + '/contact/'})
+        results.append(timed(opener, request))
+        i += 1
+
+
+def summarize(results, seconds):
+    latencies = sorted(latency for latency, _ in results) or [0]
+    return {
+        'rps': len(results) / seconds,
+        'p50': latencies[len(latencies) // 2] * 1000,
+        'p95': latencies[max(int(len(latencies) * 0.95) - 1, 0)] * 1000,
+        'errors': sum(1 for _, ok in results if not ok),
+    }
+
+
+def run_configuration(name, env, args):
+    port = free_port()
+    base = f'http://127.0.0.1:{port}'
+    server = subprocess.Popen(
+        ['gunicorn', 'sitecore.wsgi:application', '--bind', f'127.0.0.1:{port}',
+         '--workers', str(args.workers)],
+        cwd=ROOT, env=dict(env, **CONFIGURATIONS[name]),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_until_ready(base + '/projects/')
+        reads, writes = [], []
+        deadline = time.monotonic() + args.seconds
+        threads = [threading.Thread(target=reader, args=(base, deadline, reads)) for _ in range(args.readers)]
+        threads += [threading.Thread(target=writer, args=(base, deadline, writes)) for _ in range(args.writers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        server.terminate()
+        server.wait()
+    return summarize(reads, args.seconds), summarize(writes, args.seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=15)
+    parser.add_argument('--readers', type=int, default=16)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--projects', type=int, default=60)
+    args = parser.parse_args()
+
+    print(f'{args.seconds:g}s per run, {args.readers} readers + {args.writers} writers, '
+          f'{args.workers} gunicorn workers\n')
+    print(f"{'config':<7} {'traffic':<7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7}")
+    for name in CONFIGURATIONS:
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(
+                os.environ,
+                SQLITE_PATH=os.path.join(tmp, 'bench.sqlite3'),
+                MEDIA_ROOT=os.path.join(tmp, 'media'),
+                ALLOWED_HOSTS='127.0.0.1,localhost',
+                # Writers submit as soon as they have the form
+                CONTACT_MIN_FILL_SECONDS='0',
+            )
+            manage(env, 'migrate', '--noinput')
+            manage(env, 'seed_portfolio', '--projects', str(args.projects), '--messages', '20')
+            for traffic, result in zip(('read', 'write'), run_configuration(name, env, args)):
+                print(f"{name:<7} {traffic:<7} {result['rps']:>8.1f} {result['p50']:>8.1f} "
+                      f"{result['p95']:>8.1f} {result['errors']:>7}")
+
+
+if __name__ == '__main__':
+    main()
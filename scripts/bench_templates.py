@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""Compare render times of the public pages with the Django and Jinja2 templates.
+
+Usage: python scripts/bench_templates.py [--projects 30] [--iterations 200]
+
+Seeds a throwaway SQLite database with `manage.py seed_portfolio`, then, in
+this process, builds each page's context through its view once (querysets are
+evaluated up front, so no database time is measured) and renders it
+--iterations times with each engine, each render in a fresh rendition resolver
+the way a request gets one. Also reports how long a fresh engine (a new worker)
+takes to load the page's templates: the Django engine parses the sources, the
+Jinja2 one reads the bytecode written by the first load.
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from _harness import ROOT, manage
+
+PAGES = [
+    ('home', '/'),
+    ('project detail', '/projects/sample-project-1/'),
+    ('renders', '/renders/'),
+    ('stats', '/stats/'),
+]
+
+
+def page_context(path):
+    """(request, template names, context, view class) of the page, queries already run"""
+    from django.db.models import QuerySet
+    from django.test import RequestFactory
+    from django.urls import resolve
+
+    request = RequestFactory().get(path, HTTP_HOST='localhost')
+    match = resolve(path)
+    response = match.func(request, *match.args, **match.kwargs)
+    context = {
+        key: list(value) if isinstance(value, QuerySet) else value
+        for key, value in response.context_data.items()
+    }
+    return request, response.template_name, context, match.func.view_class
+
+
+def timed_renders(template, request, context, view_class, iterations):
+    from main.renditions import prefetch_renditions, rendition_resolver_middleware
+
+    names = getattr(view_class, 'prefetch_rendition_context', ())
+
+    def render(request):
+        prefetch_renditions(*(context.get(name) for name in names))
+        return template.render(context, request)
+
+    render = rendition_resolver_middleware(render)
+    size = len(render(request))
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        render(request)
+        timings.append(time.perf_counter() - start)
+    return timings, size
+
+
+def fresh_load(params, template_names):
+    """Seconds for a new engine to load the templates (what a new worker pays)"""
+    from django.utils.module_loading import import_string
+
+    params = dict(params)
+    backend = import_string(params.pop('BACKEND'))
+    start = time.perf_counter()
+    engine = backend(params)
+    engine.get_template(template_names[0])  # extends/includes are loaded on first render
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--projects', type=int, default=30)
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    work = Path(tempfile.mkdtemp(prefix='bench-templates-'))
+    env = {
+        **os.environ,
+        'SQLITE_PATH': str(work / 'bench.sqlite3'),
+        'MEDIA_ROOT': str(work / 'media'),
+        'SHARED_CACHE_DIR': str(work / 'cache'),
+        'MEDIA_METADATA_CACHE_DIR': str(work / 'media-metadata'),
+        'JINJA2_TEMPLATES': 'true',
+        'JINJA2_BYTECODE_DIR': str(work / 'jinja2'),
+        # Production template settings: cached loaders, no debug info
+        'DEBUG': 'false',
+    }
+    try:
+        print('Seeding benchmark database...')
+        manage(env, 'migrate', '--noinput', quiet=True)
+        manage(env, 'seed_portfolio', '--projects', str(args.projects), '--messages', '20', quiet=True)
+
+        os.environ.update(env, DJANGO_SETTINGS_MODULE='sitecore.settings')
+        sys.path.insert(0, str(ROOT))
+        import django
+        django.setup()
+        from django.conf import settings
+        from django.template import engines
+
+        # No collectstatic for a throwaway run
+        settings.STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
+        configs = engines.templates
+
+        print(f'{args.iterations} renders per page and engine\n')
+        print(f"{'page':<15} {'engine':<7} {'mean ms':>8} {'p50 ms':>8} {'p95 ms':>8} "
+              f"{'load ms':>8} {'KiB':>6} {'speedup':>8}")
+        for label, path in PAGES:
+            request, template_names, context, view_class = page_context(path)
+            means = {}
+            for alias in ('django', 'jinja2'):
+                template = engines[alias].get_template(template_names[0])
+                timings, size = timed_renders(template, request, context, view_class, args.iterations)
+                timings.sort()
+                means[alias] = statistics.mean(timings)
+                load = fresh_load(configs[alias], template_names)
+                speedup = f"{means['django'] / means[alias]:.2f}x" if alias == 'jinja2' else ''
+                print(f'{label:<15} {alias:<7} {means[alias] * 1000:>8.2f} '
+                      f'{timings[len(timings) // 2] * 1000:>8.2f} '
+                      f'{timings[max(int(len(timings) * 0.95) - 1, 0)] * 1000:>8.2f} '
+                      f'{load * 1000:>8.2f} {size / 1024:>6.1f} {speedup:>8}')
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
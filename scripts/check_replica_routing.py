@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""Exercise sitecore/db_router.py end to end with two local SQLite files.
+
+Usage: python scripts/check_replica_routing.py
+
+Seeds a throwaway primary database, copies it to a second file standing in
+for a replica (SQLITE_REPLICA_PATHS), then marks one project's title in the
+replica only, so every response shows which database served it:
+
+1. a public GET reads the replica
+2. a contact form POST writes to the primary and sets the pin cookie
+3. the follow-up GET with that cookie reads the primary
+4. with the replica unreachable, reads fall back to the primary
+"""
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+from pathlib import Path
+
+from _harness import ROOT, manage
+
+REPLICA_MARK = '[replica]'
+
+
+def main():
+    work = Path(tempfile.mkdtemp(prefix='replicas-'))
+    primary, replica = work / 'primary.sqlite3', work / 'replica.sqlite3'
+    env = {**os.environ, 'SQLITE_PATH': str(primary), 'MEDIA_ROOT': str(work / 'media')}
+    try:
+        manage(env, 'migrate', quiet=True)
+        manage(env, 'seed_portfolio', '--projects', '3', '--renders', '1', '--messages', '0', quiet=True)
+
+        # "Replication": the stand-in starts as a copy, then diverges visibly
+        shutil.copyfile(primary, replica)
+        with sqlite3.connect(replica) as db:
+            slug, = db.execute('SELECT slug FROM main_project ORDER BY id LIMIT 1').fetchone()
+            db.execute('UPDATE main_project SET title = title || ? WHERE slug = ?', (f' {REPLICA_MARK}', slug))
+
+        os.environ.update(
+            env, SQLITE_REPLICA_PATHS=str(replica), DJANGO_SETTINGS_MODULE='sitecore.settings',
+            CONTACT_MIN_FILL_SECONDS='0',
+        )
+        sys.path.insert(0, str(ROOT))
+        import django
+        django.setup()
+        from django.conf import settings
+        from django.test import Client
+
+        from sitecore import db_router
+
+        print(f'Replicas: {settings.DATABASE_REPLICAS}')
+        client = Client(HTTP_HOST='localhost')
+        detail = f'/projects/{slug}/'
+
+        def served_by(response):
+            return 'replica' if REPLICA_MARK in response.content.decode() else 'primary'
+
+        results = []
+        results.append(('GET detail', served_by(client.get(detail)), 'replica'))
+
+        form_token = re.search(r'name="form_token" value="([^"]+)"', client.get('/contact/').content.decode()).group(1)
+        response = client.post('/contact/', {
+            'form_token': form_token, 'name': 'Visitor', 'email': 'visitor@example.com',
+            'subject': 'Replica check', 'message': 'Testing read-your-writes.',
+        })
+        pinned = db_router.PIN_COOKIE in response.cookies
+        results.append(('POST contact sets pin cookie', 'yes' if pinned else 'no', 'yes'))
+        results.append(('GET detail after the write', served_by(client.get(detail)), 'primary'))
+
+        client.cookies.pop(db_router.PIN_COOKIE, None)
+        results.append(('GET detail, pin cookie gone', served_by(client.get(detail)), 'replica'))
+
+        # Unreachable replica: the next health check fails
+        settings.DATABASES['replica1']['NAME'] = str(work / 'missing' / 'replica.sqlite3')
+        from django.db import connections
+        connections['replica1'].close()
+        connections['replica1'].settings_dict['NAME'] = settings.DATABASES['replica1']['NAME']
+        db_router._health.clear()
+        results.append(('GET detail, replica down', served_by(client.get(detail)), 'primary'))
+
+        failed = False
+        for name, got, expected in results:
+            status = 'ok' if got == expected else 'FAIL'
+            failed |= status == 'FAIL'
+            print(f'  {name:<32} {got:<8} {status}')
+        return 1 if failed else 0
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
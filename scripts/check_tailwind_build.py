@@ -1,18 +1,68 @@
 #!/usr/bin/env python3
-"""Simple smoke-test to check Tailwind compiled CSS presence and key utilities.
+"""Tailwind build smoke-test and CSS payload budget check.
 
-Usage: python scripts/check_tailwind_build.py
+Usage:
+    python scripts/check_tailwind_build.py
+    python scripts/check_tailwind_build.py --critical-dir theme/static/css/critical
+    python scripts/check_tailwind_build.py --max-gzip 16000 --list-unused 50
 
 Checks for the compiled CSS at the path referenced in templates and searches
 for a small set of utilities / classes to ensure the build contains them.
+Then:
+
+- collects every class-like token used in templates/, theme/templates/ and
+  the Python code that emits markup (forms, template tags)
+- reports the selectors in the compiled CSS whose classes are never used
+- extracts the critical (above-the-fold) CSS of each page template: the
+  rules needed by base.html's <head>/<nav> plus the first <section> of the
+  page (or its first --fold-chars characters of markup)
+- compares raw, gzip and brotli sizes against the budgets below
+
+Exit codes: 2 no compiled CSS, 3 smoke test failed, 4 over budget (the
+full report is printed either way).
+Brotli sizes need the optional `brotli` package and are skipped without it.
 """
+import argparse
+import gzip
+import re
 import sys
 from pathlib import Path
-import re
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 
 ROOT = Path(__file__).resolve().parents[1]
 
+TEMPLATE_DIRS = [
+    ROOT / 'templates',
+    ROOT / 'theme' / 'templates',
+]
+
+# Python modules that put class names into markup (form widgets, template tags)
+MARKUP_SOURCES = [
+    ROOT / 'main' / 'forms.py',
+    ROOT / 'main' / 'templatetags',
+]
+
+# Bytes. Critical CSS is inlined in the HTML, so it has to fit in the first
+# round trip (~14KB compressed) together with the rest of the <head>.
+BUDGETS = {
+    'raw': 100 * 1024,
+    'gzip': 16 * 1024,
+    'brotli': 14 * 1024,
+    'critical_raw': 40 * 1024,
+    'critical_gzip': 10 * 1024,
+}
+
+# Characters of a page's content block treated as above the fold when it has no <section>
+FOLD_CHARS = 4000
+
+# Groups whose children are rules; every other at-rule is kept as one block
+GROUPING_AT_RULES = ('@media', '@supports', '@layer', '@container')
+
 
 def find_compiled_css_candidates():
     # Common output paths used in this project
@@ -44,19 +94,257 @@ def scan_file_for_terms(path: Path):
     return results
 
 
-def main():
-    print('Running Tailwind smoke-test...')
-    found = find_compiled_css_candidates()
-    if not found:
-        print('ERROR: No compiled CSS found in common locations.')
-        print('Looked for:')
-        for p in find_compiled_css_candidates():
-            print(' -', p)
-        sys.exit(2)
+# --- Used classes -----------------------------------------------------------
 
-    path = found[0]
-    print('Using compiled CSS:', path)
+TOKEN_SPLIT_RE = re.compile(r"[\s\"'`<>=,;(){}]+|\{%|%\}|\{\{|\}\}")
+
+
+def tokens_in(text):
+    """Every class-like token in a file, the way Tailwind's content scanner sees it"""
+    return {token for token in TOKEN_SPLIT_RE.split(text) if token}
+
+
+def template_files():
+    for directory in TEMPLATE_DIRS:
+        if directory.exists():
+            yield from sorted(directory.rglob('*.html'))
+
+
+def markup_source_files():
+    for source in MARKUP_SOURCES:
+        if source.is_dir():
+            yield from sorted(source.rglob('*.py'))
+        elif source.exists():
+            yield source
+
+
+def collect_used_tokens():
+    used = set()
+    for path in [*template_files(), *markup_source_files()]:
+        used |= tokens_in(path.read_text(encoding='utf-8', errors='ignore'))
+    return used
+
+
+# --- CSS parsing ------------------------------------------------------------
+
+class Rule:
+    """A style rule, an at-rule block (@font-face, @keyframes) or a statement (@import)"""
+
+    def __init__(self, prelude, body=None):
+        self.prelude = prelude
+        self.body = body
+
+    @property
+    def is_style_rule(self):
+        return not self.prelude.startswith('@')
+
+    def css(self, selectors=None):
+        if self.body is None:
+            return self.prelude + ';'
+        prelude = ',\n'.join(selectors) if selectors is not None else self.prelude
+        return f'{prelude} {{{self.body}}}'
+
+
+class Group:
+    """@media/@supports/... wrapping child rules"""
+
+    def __init__(self, prelude, children):
+        self.prelude = prelude
+        self.children = children
+
+
+def matching_brace(text, start):
+    depth = 0
+    for i in range(start, len(text)):
+        if text[i] == '{':
+            depth += 1
+        elif text[i] == '}':
+            depth -= 1
+            if depth == 0:
+                return i
+    return len(text)
+
+
+def parse_css(text, start=0):
+    """Parse CSS into Rule/Group nodes; returns (nodes, end position)"""
+    nodes = []
+    i = start
+    while i < len(text):
+        match = re.compile(r'[{};]').search(text, i)
+        if match is None:
+            break
+        prelude = text[i:match.start()].strip()
+        if match.group() == '}':
+            return nodes, match.end()
+        if match.group() == ';':
+            if prelude:
+                nodes.append(Rule(prelude))
+            i = match.end()
+            continue
+        if prelude.startswith(GROUPING_AT_RULES):
+            children, i = parse_css(text, match.end())
+            nodes.append(Group(prelude, children))
+        else:
+            end = matching_brace(text, match.start())
+            nodes.append(Rule(prelude, text[match.start() + 1:end]))
+            i = end + 1
+    return nodes, i
+
+
+def load_stylesheet(path):
+    text = path.read_text(encoding='utf-8', errors='ignore')
+    text = re.sub(r'/\*.*?\*/', '', text, flags=re.S)
+    return parse_css(text)[0]
+
+
+def iter_rules(nodes, groups=()):
+    """Yield (rule, enclosing group preludes) for every rule, depth first"""
+    for node in nodes:
+        if isinstance(node, Group):
+            yield from iter_rules(node.children, groups + (node.prelude,))
+        else:
+            yield node, groups
+
+
+def split_selectors(prelude):
+    """Split a selector list on top-level commas (not inside :is(), :not(), ...)"""
+    selectors, depth, current = [], 0, ''
+    for char in prelude:
+        if char in '([':
+            depth += 1
+        elif char in ')]':
+            depth -= 1
+        if char == ',' and depth == 0:
+            selectors.append(current.strip())
+            current = ''
+        else:
+            current += char
+    selectors.append(current.strip())
+    return [selector for selector in selectors if selector]
+
+
+CLASS_RE = re.compile(r'\.((?:\\[0-9a-fA-F]{1,6}\s?|\\.|[\w-]|[^\x00-\x7f])+)')
+NEGATION_RE = re.compile(r':not\([^)]*\)')
 
+
+def unescape_class(name):
+    name = re.sub(r'\\([0-9a-fA-F]{1,6})\s?', lambda m: chr(int(m.group(1), 16)), name)
+    return re.sub(r'\\(.)', r'\1', name)
+
+
+def selector_classes(selector):
+    # Classes inside :not() don't need to be present for the selector to match
+    return {unescape_class(name) for name in CLASS_RE.findall(NEGATION_RE.sub('', selector))}
+
+
+def selector_used(selector, used):
+    return selector_classes(selector) <= used
+
+
+# --- Reports ----------------------------------------------------------------
+
+def unused_selectors(nodes, used):
+    """[(selector, group preludes)] whose classes never appear in the markup"""
+    unused = []
+    for rule, groups in iter_rules(nodes):
+        if not rule.is_style_rule:
+            continue
+        for selector in split_selectors(rule.prelude):
+            if not selector_used(selector, used):
+                unused.append((selector, groups))
+    return unused
+
+
+def prune(nodes, used):
+    """CSS text of the rules (and selectors) whose classes are all in `used`"""
+    keyframes = {}
+    out = []
+    for node in nodes:
+        if isinstance(node, Group):
+            inner = prune(node.children, used)
+            if inner:
+                out.append(f'{node.prelude} {{\n{inner}\n}}')
+        elif node.body is None:
+            # @import / @charset: never inline render-blocking imports
+            continue
+        elif node.prelude.startswith('@keyframes'):
+            keyframes[node.prelude.split()[1]] = node.css()
+        elif node.is_style_rule:
+            selectors = [s for s in split_selectors(node.prelude) if selector_used(s, used)]
+            if selectors:
+                out.append(node.css(selectors))
+        else:
+            out.append(node.css())
+    css = '\n'.join(out)
+    # Only the animations the kept rules refer to
+    css += ''.join('\n' + block for name, block in keyframes.items() if re.search(rf'\b{re.escape(name)}\b', css))
+    return css
+
+
+def minify(css):
+    """Whitespace-only minification, enough for inlined critical CSS"""
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{}])\s*', r'\1', css)
+    # Keep the space in Tailwind's empty custom properties (`--tw-pan-x: ;`)
+    css = re.sub(r'([^:])\s+;', r'\1;', css)
+    return re.sub(r';\s+', ';', css).strip()
+
+
+def content_block(text):
+    match = re.search(r'{%\s*block\s+content\s*%}(.*?){%\s*endblock', text, flags=re.S)
+    return match.group(1) if match else ''
+
+
+def above_the_fold(page_text, base_text, fold_chars):
+    """Markup visible before scrolling: base.html up to the content block, plus
+    the page's first <section> (or first `fold_chars` characters)"""
+    head = re.split(r'{%\s*block\s+content\s*%}', base_text)[0]
+    content = content_block(page_text)
+    section = re.search(r'<section\b.*?</section>', content, flags=re.S)
+    return head + (content[:section.end()] if section else content[:fold_chars])
+
+
+def page_templates():
+    """(name, template text, base text) for every template that extends another"""
+    for directory in TEMPLATE_DIRS:
+        if not directory.exists():
+            continue
+        for path in sorted(directory.rglob('*.html')):
+            text = path.read_text(encoding='utf-8', errors='ignore')
+            match = re.search(r'{%\s*extends\s+[\'"]([^\'"]+)[\'"]', text)
+            if not match:
+                continue
+            base = next((d / match.group(1) for d in TEMPLATE_DIRS if (d / match.group(1)).exists()), None)
+            if base is not None:
+                name = '-'.join(path.relative_to(directory).with_suffix('').parts)
+                yield name, text, base.read_text(encoding='utf-8', errors='ignore')
+
+
+def sizes(data):
+    result = {'raw': len(data), 'gzip': len(gzip.compress(data, 9))}
+    if brotli is not None:
+        result['brotli'] = len(brotli.compress(data))
+    return result
+
+
+def format_size(value):
+    return f'{value / 1024:.1f}KB'
+
+
+def check_budget(label, measured, budgets, prefix=''):
+    over = []
+    for kind, value in measured.items():
+        budget = budgets.get(prefix + kind)
+        if budget is None:
+            continue
+        status = 'ok' if value <= budget else 'OVER'
+        print(f'  {label} {kind}: {format_size(value)} (budget {format_size(budget)}) {status}')
+        if value > budget:
+            over.append(f'{label} {kind}')
+    return over
+
+
+def run_smoke_test(path):
     results = scan_file_for_terms(path)
 
     good = True
@@ -64,13 +352,82 @@ def main():
         print(f"{k}: {'FOUND' if v else 'MISSING'}")
         if not v:
             good = False
+    return good
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--css', type=Path, help='Compiled CSS to check (default: first one found)')
+    parser.add_argument('--critical-dir', type=Path, help='Write <page>.critical.css files here')
+    parser.add_argument('--fold-chars', type=int, default=FOLD_CHARS,
+                        help='Content markup treated as above the fold when a page has no <section>')
+    parser.add_argument('--list-unused', type=int, default=20, metavar='N',
+                        help='Print the first N unused selectors (0 for none)')
+    for kind, default in BUDGETS.items():
+        parser.add_argument(f'--max-{kind.replace("_", "-")}', type=int, default=default, metavar='BYTES',
+                            dest=f'max_{kind}')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    budgets = {kind: getattr(args, f'max_{kind}') for kind in BUDGETS}
+
+    print('Running Tailwind smoke-test...')
+    found = [args.css] if args.css else find_compiled_css_candidates()
+    if not found or not found[0].exists():
+        print('ERROR: No compiled CSS found in common locations.')
+        sys.exit(2)
+
+    path = found[0]
+    print('Using compiled CSS:', path)
 
-    if good:
+    smoke_ok = run_smoke_test(path)
+    if smoke_ok:
         print('\nSMOKE TEST PASS: Compiled CSS contains expected utilities.')
-        sys.exit(0)
     else:
         print('\nSMOKE TEST FAIL: Some expected utilities are missing from compiled CSS.')
+
+    nodes = load_stylesheet(path)
+    used = collect_used_tokens()
+
+    # Unused selectors
+    unused = unused_selectors(nodes, used)
+    total = sum(len(split_selectors(rule.prelude)) for rule, _ in iter_rules(nodes) if rule.is_style_rule)
+    used_css = prune(nodes, used).encode()
+    print(f'\nUnused selectors: {len(unused)} of {total}')
+    for selector, groups in unused[:args.list_unused]:
+        print(f"  {selector}{' in ' + ' / '.join(groups) if groups else ''}")
+    if len(unused) > args.list_unused > 0:
+        print(f'  ... and {len(unused) - args.list_unused} more')
+
+    # Budgets
+    over = []
+    print('\nPayload:')
+    over += check_budget('styles', sizes(path.read_bytes()), budgets)
+    print(f"  (used rules only: {', '.join(f'{k} {format_size(v)}' for k, v in sizes(used_css).items())})")
+    if brotli is None:
+        print('  brotli: skipped (pip install brotli)')
+
+    # Critical CSS per page
+    print('\nCritical CSS:')
+    if args.critical_dir:
+        args.critical_dir.mkdir(parents=True, exist_ok=True)
+    for label, text, base_text in page_templates():
+        critical = minify(prune(nodes, tokens_in(above_the_fold(text, base_text, args.fold_chars)))).encode()
+        over += check_budget(label, sizes(critical), budgets, prefix='critical_')
+        if args.critical_dir:
+            (args.critical_dir / f'{label}.critical.css').write_bytes(critical)
+
+    if over:
+        print(f"\nBUDGET FAIL: {', '.join(over)}")
+    else:
+        print('\nBUDGET PASS')
+
+    if not smoke_ok:
         sys.exit(3)
+    if over:
+        sys.exit(4)
 
 
 if __name__ == '__main__':
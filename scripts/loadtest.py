@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+"""Replay a weighted mix of visitor scenarios against a local gunicorn server.
+
+Usage: python scripts/loadtest.py [--worker-class sync gthread uvicorn] [--workers 1 2]
+       [--threads 4] [--concurrency 16] [--seconds 20] [--mix home=3,contact=0] [--json out.json]
+
+For every combination of --worker-class and --workers, creates a throwaway
+SQLite database and media directory seeded with `manage.py seed_portfolio`,
+starts gunicorn with sitecore/gunicorn_conf.py (the deployment's settings,
+bound to a free local port) and runs --concurrency virtual visitors for
+--seconds. Each visitor has its own cookies and repeatedly picks a scenario
+by weight:
+
+    home      the home page
+    list      the project list, plain, filtered by type, searched or paged
+    detail    a project detail page
+    renders   a page of the renders gallery
+    stats     the stats page and one of its JSON series
+    contact   the contact form, then a submission of it
+
+Reports requests/s, p50/p95/p99 latency and the error rate (connection
+failures and 4xx/5xx answers) per scenario, and the server's CPU use and
+memory (master and workers together, read from /proc, so Linux only).
+Nothing outside this machine is used; run it on a quiet machine and compare
+configurations within a single run.
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import re
+import subprocess
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+
+from _harness import ROOT, free_port, manage, wait_until_ready
+
+# --worker-class -> (SERVER_MODE, gunicorn worker class)
+WORKER_CLASSES = {
+    'sync': ('wsgi', 'sync'),
+    'gthread': ('wsgi', 'gthread'),
+    'uvicorn': ('asgi', 'uvicorn.workers.UvicornWorker'),
+}
+
+DEFAULT_MIX = {'home': 20, 'list': 25, 'detail': 25, 'renders': 10, 'stats': 10, 'contact': 10}
+
+PROJECT_TYPES = ['web', 'mobile', 'desktop', 'data', 'ml', 'other']
+SEARCH_TERMS = ['Django', 'Python', 'React', 'Project 1', 'nothing-matches']
+SERIES = ['metric=messages&granularity=day', 'metric=projects&granularity=month',
+          'metric=renders&granularity=week&periods=26']
+
+# Must match ProjectListView / RenderListView
+PROJECTS_PER_PAGE = 9
+RENDERS_PER_PAGE = 12
+
+CSRF_RE = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+FORM_TOKEN_RE = re.compile(r'name="form_token" value="([^"]+)"')
+
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Time a redirecting request (a contact submission) on its own"""
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class Visitor:
+    """One virtual visitor: its own cookies, recording (scenario, seconds, status)"""
+
+    def __init__(self, base, site, rng, results):
+        self.base = base
+        self.site = site
+        self.rng = rng
+        self.results = results
+        self.scenario = None
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), NoRedirect()
+        )
+
+    def request(self, path, data=None):
+        headers = {'Referer': self.base + path} if data else {}
+        request = urllib.request.Request(self.base + path, data=data, headers=headers)
+        body = ''
+        start = time.perf_counter()
+        try:
+            with self.opener.open(request, timeout=60) as response:
+                body = response.read().decode()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            status = e.code
+        except (urllib.error.URLError, ConnectionError, TimeoutError):
+            status = 0
+        self.results.append((self.scenario, time.perf_counter() - start, status))
+        return body
+
+    def home(self):
+        self.request('/')
+
+    def list(self):
+        choice = self.rng.randrange(4)
+        if choice == 0:
+            self.request('/projects/')
+        elif choice == 1:
+            self.request(f'/projects/?type={self.rng.choice(PROJECT_TYPES)}')
+        elif choice == 2:
+            self.request('/projects/?' + urllib.parse.urlencode({'q': self.rng.choice(SEARCH_TERMS)}))
+        else:
+            self.request(f"/projects/?page={self.rng.randint(1, self.site['project_pages'])}")
+
+    def detail(self):
+        self.request(f"/projects/sample-project-{self.rng.randint(1, self.site['projects'])}/")
+
+    def renders(self):
+        self.request(f"/renders/?page={self.rng.randint(1, self.site['render_pages'])}")
+
+    def stats(self):
+        self.request('/stats/')
+        self.request(f'/stats/series.json?{self.rng.choice(SERIES)}')
+
+    def contact(self):
+        page = self.request('/contact/')
+        csrf, form_token = CSRF_RE.search(page), FORM_TOKEN_RE.search(page)
+        if not csrf or not form_token:
+            return
+        n = self.rng.getrandbits(64)
+        self.request('/contact/', urllib.parse.urlencode({
+            'csrfmiddlewaretoken': csrf.group(1),
+            'form_token': form_token.group(1),
+            'name': 'Load Test',
+            'email': 'loadtest@example.com',
+            'subject': 'Load test',
+            # Unique, or the spam pre-filter drops it as a duplicate
+            'message': f'Load test submission {n:016x}.',
+        }).encode())
+
+    def run(self, scenario):
+        self.scenario = scenario
+        getattr(self, scenario)()
+
+
+def visit(base, site, mix, seed, deadline, results):
+    rng = random.Random(seed)
+    visitor = Visitor(base, site, rng, results)
+    names, weights = list(mix), list(mix.values())
+    while time.monotonic() < deadline:
+        visitor.run(rng.choices(names, weights)[0])
+
+
+def process_tree(pid):
+    """pid and all its descendants"""
+    children = defaultdict(list)
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # The command name may contain spaces, the fields after it don't
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children[ppid].append(int(entry))
+    tree, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        tree.append(current)
+        pending.extend(children[current])
+    return tree
+
+
+def process_usage(pid):
+    """(CPU seconds, resident bytes) of one process, or None once it's gone"""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+    except OSError:
+        return None
+    # utime and stime are fields 14 and 15, rss is 24 (see proc(5))
+    return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS, int(fields[21]) * PAGE_SIZE
+
+
+class ServerSampler(threading.Thread):
+    """Samples the gunicorn master and workers' CPU time and RSS every `interval` seconds"""
+
+    def __init__(self, pid, interval=0.25):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.cpu = {}
+        self.rss = []
+        self.available = os.path.exists(f'/proc/{pid}/stat')
+
+    def sample(self):
+        total_rss = 0
+        for pid in process_tree(self.pid):
+            usage = process_usage(pid)
+            if usage:
+                # Workers restarted mid-run keep the CPU time they used
+                self.cpu[pid] = usage[0]
+                total_rss += usage[1]
+        self.rss.append(total_rss)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def start(self):
+        if self.available:
+            self.sample()
+            self.baseline = sum(self.cpu.values())
+            self.started = time.monotonic()
+            super().start()
+
+    def stop(self):
+        """{'cpu': % of one core, 'rss_mean'/'rss_peak': MiB}, or {} without /proc"""
+        if not self.available:
+            return {}
+        self.stopped.set()
+        self.join()
+        self.sample()
+        elapsed = time.monotonic() - self.started
+        return {
+            'cpu': (sum(self.cpu.values()) - self.baseline) / elapsed * 100,
+            'rss_mean': sum(self.rss) / len(self.rss) / 2 ** 20,
+            'rss_peak': max(self.rss) / 2 ** 20,
+        }
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of sorted `values`, in milliseconds"""
+    if not values:
+        return 0
+    return values[min(int(len(values) * fraction), len(values) - 1)] * 1000
+
+
+def summarize(results, seconds):
+    latencies = sorted(latency for _, latency, _ in results)
+    errors = sum(1 for _, _, status in results if not 200 <= status < 400)
+    return {
+        'requests': len(results),
+        'rps': len(results) / seconds,
+        'p50': percentile(latencies, 0.50),
+        'p95': percentile(latencies, 0.95),
+        'p99': percentile(latencies, 0.99),
+        'error_rate': errors / len(results) * 100 if results else 0,
+    }
+
+
+def run_configuration(worker_class, workers, env, site, args):
+    server_mode, gunicorn_class = WORKER_CLASSES[worker_class]
+    port = free_port()
+    base = f'http://127.0.0.1:{port}'
+    command = ['gunicorn', '--config', 'python:sitecore.gunicorn_conf',
+               '--bind', f'127.0.0.1:{port}', '--workers', str(workers),
+               '--worker-class', gunicorn_class]
+    if worker_class == 'gthread':
+        command += ['--threads', str(args.threads)]
+    server = subprocess.Popen(
+        command, cwd=ROOT, env=dict(env, SERVER_MODE=server_mode),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_until_ready(base + '/')
+        # One pass over every scenario so each worker's caches aren't part of the run
+        warm = Visitor(base, site, random.Random(args.seed), [])
+        for _ in range(workers):
+            for scenario in args.mix:
+                warm.run(scenario)
+
+        results = []
+        sampler = ServerSampler(server.pid)
+        sampler.start()
+        start = time.monotonic()
+        deadline = start + args.seconds
+        threads = [
+            threading.Thread(target=visit, args=(base, site, args.mix, args.seed + i, deadline, results))
+            for i in range(args.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - start
+        server_usage = sampler.stop()
+    finally:
+        server.terminate()
+        server.wait()
+
+    by_scenario = defaultdict(list)
+    for result in results:
+        by_scenario[result[0]].append(result)
+    return {
+        'worker_class': worker_class,
+        'workers': workers,
+        'threads': args.threads if worker_class == 'gthread' else 1,
+        'total': summarize(results, elapsed),
+        'scenarios': {name: summarize(by_scenario[name], elapsed) for name in args.mix},
+        'server': server_usage,
+    }
+
+
+def parse_mix(value):
+    """'home=3,contact=0' -> DEFAULT_MIX with those weights replaced"""
+    mix = dict(DEFAULT_MIX)
+    for item in filter(None, value.split(',')):
+        name, _, weight = item.partition('=')
+        if name not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"unknown scenario {name!r}, use: {', '.join(DEFAULT_MIX)}")
+        try:
+            mix[name] = float(weight)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f'{item!r} is not scenario=weight')
+    mix = {name: weight for name, weight in mix.items() if weight > 0}
+    if not mix:
+        raise argparse.ArgumentTypeError('every scenario has weight 0')
+    return mix
+
+
+def print_result(result):
+    server = result['server']
+    label = f"{result['worker_class']} x{result['workers']}"
+    if result['worker_class'] == 'gthread':
+        label += f"/{result['threads']}t"
+    for name, summary in [*result['scenarios'].items(), ('total', result['total'])]:
+        line = (f"{label:<14} {name:<8} {summary['requests']:>8} {summary['rps']:>8.1f} "
+                f"{summary['p50']:>8.1f} {summary['p95']:>8.1f} {summary['p99']:>8.1f} "
+                f"{summary['error_rate']:>6.2f}%")
+        if name == 'total' and server:
+            line += f" {server['cpu']:>6.0f}% {server['rss_mean']:>8.1f} {server['rss_peak']:>8.1f}"
+        print(line)
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--worker-class', nargs='+', choices=list(WORKER_CLASSES), default=['sync'])
+    parser.add_argument('--workers', nargs='+', type=int, default=[2])
+    parser.add_argument('--threads', type=int, default=4, help='Threads per gthread worker')
+    parser.add_argument('--concurrency', type=int, default=16, help='Simultaneous virtual visitors')
+    parser.add_argument('--seconds', type=float, default=20)
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+                        help=f"Scenario weights, e.g. home=3,contact=0 (default: "
+                             f"{','.join(f'{k}={v}' for k, v in DEFAULT_MIX.items())})")
+    parser.add_argument('--projects', type=int, default=60)
+    parser.add_argument('--renders', type=int, default=4, help='Renders per project')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    site = {
+        'projects': args.projects,
+        'project_pages': max(1, -(-args.projects // PROJECTS_PER_PAGE)),
+        'render_pages': max(1, -(-args.projects * args.renders // RENDERS_PER_PAGE)),
+    }
+    print(f"{args.seconds:g}s per run, {args.concurrency} visitors, mix "
+          f"{', '.join(f'{k}={v:g}' for k, v in args.mix.items())}\n")
+    print(f"{'server':<14} {'scenario':<8} {'requests':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'errors':>7} {'cpu':>7} {'rss MiB':>8} {'peak MiB':>8}")
+    results = []
+    for worker_class in args.worker_class:
+        for workers in args.workers:
+            with tempfile.TemporaryDirectory() as tmp:
+                env = dict(
+                    os.environ,
+                    SQLITE_PATH=os.path.join(tmp, 'loadtest.sqlite3'),
+                    MEDIA_ROOT=os.path.join(tmp, 'media'),
+                    SHARED_CACHE_DIR=os.path.join(tmp, 'cache'),
+                    MEDIA_METADATA_CACHE_DIR=os.path.join(tmp, 'media-metadata'),
+                    ALLOWED_HOSTS='127.0.0.1,localhost',
+                    # Visitors submit the contact form as soon as they have it
+                    CONTACT_MIN_FILL_SECONDS='0',
+                )
+                manage(env, 'migrate', '--noinput')
+                manage(env, 'seed_portfolio', '--projects', str(args.projects),
+                       '--renders', str(args.renders), '--messages', '20', '--seed', str(args.seed))
+                result = run_configuration(worker_class, workers, env, site, args)
+            print_result(result)
+            results.append(result)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'arguments': {k: v for k, v in vars(args).items() if k != 'json'},
+                       'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,11 @@
+#!/usr/bin/env bash
+# Start the web server.
+#
+#   SERVER_MODE=wsgi (default)  gunicorn with sync workers (sitecore.wsgi)
+#   SERVER_MODE=asgi            gunicorn with uvicorn workers (sitecore.asgi),
+#                               the read-heavy pages use main/async_views.py
+set -o errexit
+
+# Worker class, bind address, preloading, migrations and warm-up live in the
+# config module (migrations are checked inside the gunicorn master)
+exec gunicorn --config python:sitecore.gunicorn_conf
@@ -11,6 +11,11 @@ import os
 
 from django.core.asgi import get_asgi_application
 
+from sitecore import startup
+from sitecore.early_hints import EarlyHintsMiddleware
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sitecore.settings')
 
-application = get_asgi_application()
+application = EarlyHintsMiddleware(get_asgi_application())
+
+startup.install()
@@ -0,0 +1,144 @@
+"""
+Read replica routing.
+
+ReplicaRouter sends ORM reads made while handling a public GET/HEAD/OPTIONS request
+to one of the DATABASE_REPLICAS aliases and everything else (writes, admin
+requests, management commands, reads inside a transaction) to `default`.
+
+Read-your-writes:
+- the first write of a request pins the rest of that request to the primary
+- a request that wrote sets a short-lived cookie (REPLICA_PIN_SECONDS) so
+  the follow-up requests, e.g. the redirect after the contact form, also
+  read from the primary until the replicas have caught up
+
+Replicas are health-checked at most every REPLICA_HEALTH_CHECK_INTERVAL
+seconds per process (a `SELECT 1`); failing ones are skipped until the next
+check, and with no healthy replica reads fall back to the primary.
+
+Configured from the environment: DATABASE_REPLICA_URLS in production.py,
+SQLITE_REPLICA_PATHS (local SQLite files standing in for replicas, e.g. a
+copy of the primary) in settings.py.
+"""
+import logging
+import random
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.utils.decorators import sync_and_async_middleware
+
+logger = logging.getLogger(__name__)
+
+PIN_COOKIE = 'primary_db_pin'
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class RoutingState:
+    """Per-request routing flags; mutable so ORM calls in worker threads can pin"""
+
+    def __init__(self, use_replicas):
+        self.use_replicas = use_replicas
+        self.wrote = False
+
+
+_state = ContextVar('replica_routing', default=None)
+
+# alias -> (healthy, checked at)
+_health = {}
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def check_replica(alias):
+    try:
+        with connections[alias].cursor() as cursor:
+            cursor.execute('SELECT 1')
+        return True
+    except DatabaseError as e:
+        logger.warning('Database replica %s failed its health check: %s', alias, e)
+        return False
+
+
+def is_healthy(alias):
+    healthy, checked_at = _health.get(alias, (None, 0))
+    if healthy is None or time.monotonic() - checked_at >= settings.REPLICA_HEALTH_CHECK_INTERVAL:
+        healthy = check_replica(alias)
+        _health[alias] = (healthy, time.monotonic())
+    return healthy
+
+
+def healthy_replicas():
+    return [alias for alias in replicas() if is_healthy(alias)]
+
+
+def pin_to_primary():
+    """Route the rest of the current request to the primary"""
+    state = _state.get()
+    if state is not None:
+        state.wrote = True
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or not state.use_replicas or state.wrote:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            # Reads inside a transaction belong with its writes
+            return DEFAULT_DB_ALIAS
+        candidates = healthy_replicas()
+        return random.choice(candidates) if candidates else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        pin_to_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        pool = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary
+        return db not in replicas()
+
+
+def uses_replicas(request):
+    if request.method not in SAFE_METHODS or request.COOKIES.get(PIN_COOKIE):
+        return False
+    return not request.path.startswith(settings.REPLICA_EXCLUDED_PATHS)
+
+
+def finish(request, response, state):
+    if state.wrote and replicas():
+        response.set_cookie(
+            PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite='Lax'
+        )
+    return response
+
+
+@sync_and_async_middleware
+def replica_routing_middleware(get_response):
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            state = RoutingState(bool(replicas()) and uses_replicas(request))
+            token = _state.set(state)
+            try:
+                return finish(request, await get_response(request), state)
+            finally:
+                _state.reset(token)
+    else:
+        def middleware(request):
+            state = RoutingState(bool(replicas()) and uses_replicas(request))
+            token = _state.set(state)
+            try:
+                return finish(request, get_response(request), state)
+            finally:
+                _state.reset(token)
+    return middleware
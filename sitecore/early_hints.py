@@ -0,0 +1,76 @@
+"""
+HTTP 103 Early Hints for ASGI servers that support them.
+
+Servers that can send informational responses advertise the
+``http.response.early_hint`` extension in the connection scope (Hypercorn,
+Granian; uvicorn does not). EarlyHintsMiddleware wraps the Django ASGI
+application and, for those servers, exposes a sender to views through a
+context variable. send_early_hints() is a no-op everywhere else, so views can
+call it unconditionally and rely on their `Link` response header instead
+(which CDNs such as Cloudflare also turn into 103s).
+
+Views run either on the event loop (async views) or in a worker thread (sync
+views under ASGI); the sender handles both and the wrapped `send` makes sure
+the hints go out before the final response starts.
+"""
+import asyncio
+from contextvars import ContextVar
+
+EARLY_HINT = 'http.response.early_hint'
+
+_current_sender = ContextVar('early_hints_sender', default=None)
+
+
+class EarlyHintsSender:
+    def __init__(self, send, loop):
+        self.send = send
+        self.loop = loop
+        self.sent = False
+        self.pending = None
+
+    def __call__(self, links):
+        if self.sent or not links:
+            return
+        self.sent = True
+        message = {'type': EARLY_HINT, 'links': [link.encode('latin-1') for link in links]}
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is self.loop:
+            # Async view: the response can't start before this task runs (see wrap_send)
+            self.pending = self.loop.create_task(self.send(message))
+        else:
+            asyncio.run_coroutine_threadsafe(self.send(message), self.loop).result()
+
+    def wrap_send(self):
+        async def send(message):
+            if message['type'] == 'http.response.start' and self.pending is not None:
+                pending, self.pending = self.pending, None
+                await pending
+            await self.send(message)
+        return send
+
+
+def send_early_hints(links):
+    """Send `links` (Link header values) as a 103 response, if the server supports it"""
+    sender = _current_sender.get()
+    if sender is not None:
+        sender(links)
+
+
+class EarlyHintsMiddleware:
+    """ASGI middleware enabling send_early_hints() for HTTP requests"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or EARLY_HINT not in scope.get('extensions', {}):
+            return await self.app(scope, receive, send)
+        sender = EarlyHintsSender(send, asyncio.get_running_loop())
+        token = _current_sender.set(sender)
+        try:
+            return await self.app(scope, receive, sender.wrap_send())
+        finally:
+            _current_sender.reset(token)
@@ -0,0 +1,73 @@
+"""
+Gunicorn configuration.
+
+Usage: gunicorn --config python:sitecore.gunicorn_conf
+
+The application is loaded once in the master (``preload_app``) and warmed up
+before any worker is forked, so workers start with imports, URL patterns,
+compiled templates and primed caches already in memory.
+
+Environment:
+    PORT             port to bind (default 8000)
+    WEB_CONCURRENCY  number of workers (default 1)
+    SERVER_MODE      'wsgi' (sync workers) or 'asgi' (uvicorn workers)
+    MIGRATE_ON_BOOT  set to 'false' to skip the pending-migrations check
+    WARMUP           set to 'false' to skip the warm-up routine
+"""
+import os
+
+SERVER_MODE = os.getenv('SERVER_MODE', 'wsgi')
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', '1'))
+
+if SERVER_MODE == 'asgi':
+    wsgi_app = 'sitecore.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'sitecore.wsgi:application'
+    worker_class = 'sync'
+
+preload_app = True
+
+
+def on_starting(server):
+    """
+    Apply pending migrations inside the preloaded master.
+
+    migrate_if_needed skips migrate entirely when the migration files haven't
+    changed, and running it here saves booting a separate manage.py process.
+    """
+    if os.getenv('MIGRATE_ON_BOOT', 'true').lower() != 'true':
+        return
+
+    from django.core.management import call_command
+    from django.db import connections
+    from sitecore import startup
+
+    call_command('migrate_if_needed')
+    connections.close_all()
+    startup.mark('migrations checked')
+
+
+def when_ready(server):
+    """Warm the preloaded application before workers start accepting traffic"""
+    if os.getenv('WARMUP', 'true').lower() != 'true':
+        return
+
+    from sitecore.warmup import format_timings, warm_up
+
+    server.log.info(format_timings(warm_up()))
+
+
+def post_fork(server, worker):
+    """Give each sync worker its own DB connection up front"""
+    if worker_class != 'sync':
+        return
+
+    from django.db import connections
+
+    try:
+        connections['default'].ensure_connection()
+    except Exception as e:
+        server.log.warning('Could not open DB connection in worker: %s', e)
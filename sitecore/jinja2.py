@@ -0,0 +1,65 @@
+"""
+Jinja2 environment for the optional Jinja2 template engine (JINJA2_TEMPLATES).
+
+The public pages (home, project detail, renders, stats and the partials they
+include) have Jinja2 versions under jinja2/, tried before the Django templates
+in templates/ when the engine is on. The image tags and filters are the same
+functions as main/templatetags, exposed as globals and filters:
+
+    {{ responsive_image(project.featured_image, 'large', project.title, 'w-full') }}
+    {{ picture_element(project.featured_image, project.title) }}
+    {{ get_image_rendition(project.featured_image, 'medium') }}
+    {{ resized_image_url(project.featured_image, 1280, 960, 'fit', 'webp') }}
+    {{ counts|get_item('web') }}  {{ series|to_json }}
+
+Compiled templates are kept in memory per process and written as bytecode to
+JINJA2_BYTECODE_DIR, so a new worker loads them instead of parsing the
+sources again.
+"""
+import os
+
+from django.conf import settings
+from django.template import defaultfilters
+from django.templatetags.static import static
+from django.urls import reverse
+from django.utils import dateformat, timezone
+from jinja2 import Environment, FileSystemBytecodeCache
+
+from main.templatetags.custom_filters import get_item, to_json
+from main.templatetags.image_utils import get_image_rendition, picture_element, resized_image_url, responsive_image
+
+
+def url(viewname, *args, **kwargs):
+    return reverse(viewname, args=args or None, kwargs=kwargs or None)
+
+
+def now(format_string):
+    """The {% now %} tag"""
+    return dateformat.format(timezone.localtime(), format_string)
+
+
+def bytecode_cache():
+    os.makedirs(settings.JINJA2_BYTECODE_DIR, exist_ok=True)
+    return FileSystemBytecodeCache(settings.JINJA2_BYTECODE_DIR)
+
+
+def environment(**options):
+    options.setdefault('bytecode_cache', bytecode_cache())
+    env = Environment(**options)
+    env.globals.update({
+        'static': static,
+        'url': url,
+        'now': now,
+        'responsive_image': responsive_image,
+        'picture_element': picture_element,
+        'get_image_rendition': get_image_rendition,
+        'resized_image_url': resized_image_url,
+    })
+    env.filters.update({
+        'get_item': get_item,
+        'to_json': to_json,
+        'date': defaultfilters.date,
+        'linebreaks': lambda value: defaultfilters.linebreaks_filter(value, autoescape=True),
+        'truncatewords': defaultfilters.truncatewords,
+    })
+    return env
@@ -0,0 +1,232 @@
+"""
+Media serving for deployments that keep MEDIA_ROOT on local disk.
+
+django.views.static.serve is only meant for development: it reads whole
+files, ignores Range and sends no caching headers. serve_media streams the
+file (through wsgi.file_wrapper where available), answers single byte
+ranges with 206, honours ETag/Last-Modified validators and serves the .br/.gz
+siblings written by the compress_media command when the client accepts them
+(q=0 refuses an encoding).
+
+Under ASGI (SERVER_MODE) Django reads a sync iterator given to a streaming
+response into a list before sending anything, so there files are read
+through an async iterator instead, one CHUNK_SIZE block at a time.
+
+Renditions under __sized__/ and content-addressed uploads (main/uploads.py)
+never change under the same name, so they are cached for a year as
+immutable; other files get MEDIA_CACHE_MAX_AGE.
+"""
+import mimetypes
+import os
+import re
+import stat
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_etags
+from django.views.decorators.http import require_safe
+
+from main.uploads import IMMUTABLE_CACHE_CONTROL, is_content_addressed
+
+# Checked in order of preference
+PRECOMPRESSED_ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+CHUNK_SIZE = 64 * 1024
+
+
+def is_immutable(path):
+    return path.startswith('__sized__/') or is_content_addressed(path)
+
+
+def cache_control(path):
+    if is_immutable(path):
+        return IMMUTABLE_CACHE_CONTROL
+    return f"public, max-age={getattr(settings, 'MEDIA_CACHE_MAX_AGE', 3600)}"
+
+
+def file_etag(stat_result, encoding=None):
+    # Same scheme as WhiteNoise: cheap, and changes with either mtime or size.
+    # Each encoding is a different representation, so it gets its own tag.
+    suffix = f'-{encoding}' if encoding else ''
+    return f'"{int(stat_result.st_mtime):x}-{stat_result.st_size:x}{suffix}"'
+
+
+def parse_range(header, size):
+    """
+    Return (start, end) (inclusive) for a single `bytes=` range, None to
+    ignore the header, or False if the range can't be satisfied.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        # Multiple or malformed ranges: fall back to the whole file
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # Suffix range: the last N bytes
+        length = int(end)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def parse_accept_encoding(header):
+    """{coding: q} of an Accept-Encoding header"""
+    codings = {}
+    for part in header.split(','):
+        coding, *params = [item.strip() for item in part.split(';')]
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        codings[coding.lower()] = quality
+    return codings
+
+
+def accepted_variant(request, path):
+    codings = parse_accept_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    # Highest q first, our order of preference between equals
+    candidates = sorted(
+        (-codings.get(encoding, codings.get('*', 0)), preference, encoding, suffix)
+        for preference, (encoding, suffix) in enumerate(PRECOMPRESSED_ENCODINGS)
+    )
+    for negative_quality, _, encoding, suffix in candidates:
+        if negative_quality < 0 and os.path.isfile(path + suffix):
+            return encoding, path + suffix
+    return None, path
+
+
+def iter_range(file, start, length):
+    try:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+async def aiter_range(file, start, length):
+    # Not thread-sensitive: file reads don't need the request's thread
+    read = sync_to_async(file.read, thread_sensitive=False)
+    try:
+        file.seek(start)
+        while length > 0:
+            chunk = await read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+def file_chunks(file, start, length):
+    """`length` bytes of `file` from `start`, as the server mode needs them"""
+    if settings.SERVER_MODE == 'asgi':
+        return aiter_range(file, start, length)
+    return iter_range(file, start, length)
+
+
+@require_safe
+def serve_media(request, path, document_root=None):
+    document_root = document_root or settings.MEDIA_ROOT
+    path = path.lstrip('/')
+    try:
+        fullpath = safe_join(document_root, path)
+    except (SuspiciousFileOperation, ValueError):
+        raise Http404('Invalid path')
+
+    try:
+        stat_result = os.stat(fullpath)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404('File not found')
+    if not stat.S_ISREG(stat_result.st_mode):
+        raise Http404('File not found')
+
+    range_header = request.META.get('HTTP_RANGE')
+    # Ranges always refer to the identity encoding
+    encoding, variant = (None, fullpath) if range_header else accepted_variant(request, fullpath)
+
+    etag = file_etag(stat_result, encoding)
+    last_modified = http_date(stat_result.st_mtime)
+    content_type, _ = mimetypes.guess_type(fullpath)
+
+    def add_headers(response):
+        response['ETag'] = etag
+        response['Last-Modified'] = last_modified
+        response['Cache-Control'] = cache_control(path)
+        response['Accept-Ranges'] = 'bytes'
+        response['Vary'] = 'Accept-Encoding'
+        return response
+
+    conditional = get_conditional_response(
+        request, etag=etag, last_modified=int(stat_result.st_mtime)
+    )
+    if conditional is not None:
+        return add_headers(conditional)
+
+    size = stat_result.st_size
+    byte_range = None
+    if range_header:
+        if_range = request.META.get('HTTP_IF_RANGE')
+        if not if_range or if_range in (etag, last_modified) or etag in parse_etags(if_range):
+            byte_range = parse_range(range_header, size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return add_headers(response)
+
+    if byte_range is not None:
+        start, end = byte_range
+        length = end - start + 1
+        response = StreamingHttpResponse(
+            file_chunks(open(fullpath, 'rb'), start, length) if request.method == 'GET' else [],
+            status=206,
+            content_type=content_type or 'application/octet-stream',
+        )
+        response['Content-Length'] = str(length)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        return add_headers(response)
+
+    if settings.SERVER_MODE == 'asgi':
+        variant_size = os.stat(variant).st_size if encoding else size
+        response = StreamingHttpResponse(
+            file_chunks(open(variant, 'rb'), 0, variant_size) if request.method == 'GET' else [],
+            content_type=content_type or 'application/octet-stream',
+        )
+        response['Content-Length'] = str(variant_size)
+        response['Content-Disposition'] = content_disposition_header(False, os.path.basename(fullpath))
+    else:
+        response = FileResponse(
+            open(variant, 'rb'),
+            content_type=content_type or 'application/octet-stream',
+            filename=os.path.basename(fullpath),
+        )
+    if encoding:
+        response['Content-Encoding'] = encoding
+    if request.method == 'HEAD':
+        response.streaming_content = []
+    return add_headers(response)
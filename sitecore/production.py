@@ -1,4 +1,5 @@
 import os
+from importlib.util import find_spec
 from .settings import *
 
 # Load environment variables
@@ -34,14 +35,27 @@ if DATABASE_URL and HAS_DJ_DATABASE_URL:
             conn_health_checks=True,
         )
     }
+    # Read replicas for the public pages (sitecore/db_router.py)
+    for index, url in enumerate(filter(None, os.getenv('DATABASE_REPLICA_URLS', '').split(',')), start=1):
+        # parse(), not config(): config() would prefer DATABASE_URL
+        DATABASES[f'replica{index}'] = dj_database_url.parse(
+            url.strip(),
+            conn_max_age=600,
+            conn_health_checks=True,
+        )
+        DATABASES[f'replica{index}']['TEST'] = {'MIRROR': 'default'}
 else:
     # Free tier: use SQLite (data will reset on redeploy)
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
-            'NAME': BASE_DIR / 'db.sqlite3',
+            'NAME': os.getenv('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
         }
     }
+    if SQLITE_TUNING:
+        tune_databases(DATABASES)
+
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
 
 # Static files (WhiteNoise)
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
@@ -50,10 +64,23 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 # Media files configuration - simplified for free tier
 # Use local storage (files will be lost on redeploy)
 MEDIA_URL = '/media/'
-MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+MEDIA_ROOT = os.getenv('MEDIA_ROOT', os.path.join(BASE_DIR, 'media'))
 
 # Note: For free tier, external storage (S3/Cloudinary) is not configured
 # Files uploaded to the portfolio will be lost when the service spins down
+# Local media is served by sitecore.media.serve_media (see SERVE_MEDIA)
+
+# Optional S3 media storage (paid tier): set AWS_STORAGE_BUCKET_NAME and install
+# boto3 + django-storages. AWS_S3_ENDPOINT_URL points at any S3-compatible
+# server instead of AWS (MinIO, moto_server) for local testing.
+AWS_STORAGE_BUCKET_NAME = os.getenv('AWS_STORAGE_BUCKET_NAME')
+if AWS_STORAGE_BUCKET_NAME and find_spec('storages') and find_spec('boto3'):
+    DEFAULT_FILE_STORAGE = 'sitecore.storage_backends.PublicMediaStorage'
+    SERVE_MEDIA = False
+    AWS_ACCESS_KEY_ID = os.getenv('AWS_ACCESS_KEY_ID')
+    AWS_SECRET_ACCESS_KEY = os.getenv('AWS_SECRET_ACCESS_KEY')
+    AWS_S3_REGION_NAME = os.getenv('AWS_S3_REGION_NAME', 'us-east-1')
+    AWS_S3_ENDPOINT_URL = os.getenv('AWS_S3_ENDPOINT_URL') or None
 
 # Email configuration - disabled for free tier
 # EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'  # Logs to console
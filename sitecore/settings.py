@@ -1,7 +1,10 @@
 import os
+import tempfile
 from pathlib import Path
 from dotenv import load_dotenv
 
+from sitecore.sqlite_tuning import DEFAULT_PRAGMAS, tune_databases
+
 # Load environment variables
 load_dotenv()
 
@@ -11,156 +14,281 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # Determine environment
 ENVIRONMENT = os.getenv('ENVIRONMENT', 'development')
 
-if ENVIRONMENT == 'production':
-    from .production import *
-else:
-    # Development settings
-    SECRET_KEY = os.getenv('SECRET_KEY', 'django-insecure-development-key-change-in-production')
-    
-    DEBUG = os.getenv('DEBUG', 'True').lower() == 'true'
-    
-    ALLOWED_HOSTS = os.getenv('ALLOWED_HOSTS', '').split(',') if os.getenv('ALLOWED_HOSTS') else ['localhost', '127.0.0.1']
-    
-    # Database
-    DATABASES = {
-        'default': {
-            'ENGINE': 'django.db.backends.sqlite3',
-            'NAME': BASE_DIR / 'db.sqlite3',
-        }
+# Development settings (production.py overrides these below)
+SECRET_KEY = os.getenv('SECRET_KEY', 'django-insecure-development-key-change-in-production')
+
+DEBUG = os.getenv('DEBUG', 'True').lower() == 'true'
+
+ALLOWED_HOSTS = os.getenv('ALLOWED_HOSTS', '').split(',') if os.getenv('ALLOWED_HOSTS') else ['localhost', '127.0.0.1']
+
+# Database
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.getenv('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
     }
-    
-    # Static files (CSS, JavaScript, Images)
-    STATIC_URL = '/static/'
-    STATIC_ROOT = BASE_DIR / 'staticfiles'
-    STATICFILES_DIRS = [
-        BASE_DIR / 'static',
-        BASE_DIR / 'theme' / 'static',
-    ]
-    
-    # Media files
-    MEDIA_URL = '/media/'
-    MEDIA_ROOT = BASE_DIR / 'media'
-    
-    # WhiteNoise configuration
-    STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
-    
-    # Email backend for development
-    EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
-    
-    # Application definition
-    INSTALLED_APPS = [
-        'django.contrib.admin',
-        'django.contrib.auth',
-        'django.contrib.contenttypes',
-        'django.contrib.sessions',
-        'django.contrib.messages',
-        'django.contrib.staticfiles',
-        
-        # Third-party apps
-        'tailwind',
-        'theme',
-        'versatileimagefield',
-        
-        # Local apps
-        'main',
-    ]
-    
-    MIDDLEWARE = [
-        'django.middleware.security.SecurityMiddleware',
-        'whitenoise.middleware.WhiteNoiseMiddleware',
-        'django.contrib.sessions.middleware.SessionMiddleware',
-        'django.middleware.common.CommonMiddleware',
-        'django.middleware.csrf.CsrfViewMiddleware',
-        'django.contrib.auth.middleware.AuthenticationMiddleware',
-        'django.contrib.messages.middleware.MessageMiddleware',
-        'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    ]
-    
-    ROOT_URLCONF = 'sitecore.urls'
-    
-    TEMPLATES = [
-        {
-            'BACKEND': 'django.template.backends.django.DjangoTemplates',
-            'DIRS': [BASE_DIR / 'templates'],
-            'APP_DIRS': True,
-            'OPTIONS': {
-                'context_processors': [
-                    'django.template.context_processors.debug',
-                    'django.template.context_processors.request',
-                    'django.contrib.auth.context_processors.auth',
-                    'django.contrib.messages.context_processors.messages',
-                ],
-            },
+}
+
+# Read replicas (sitecore/db_router.py). Locally, comma-separated SQLite files
+# stand in for them, e.g. a copy of the primary's file.
+for index, path in enumerate(filter(None, os.getenv('SQLITE_REPLICA_PATHS', '').split(',')), start=1):
+    DATABASES[f'replica{index}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': path,
+        # Tests use the primary's test database for every replica
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['sitecore.db_router.ReplicaRouter']
+# After a write, the client reads from the primary for this many seconds
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', '5'))
+REPLICA_HEALTH_CHECK_INTERVAL = int(os.getenv('REPLICA_HEALTH_CHECK_INTERVAL', '30'))
+# Requests under these paths always use the primary
+REPLICA_EXCLUDED_PATHS = ('/admin/',)
+
+# Opt-in SQLite tuning (sitecore/sqlite_tuning.py): WAL, synchronous=NORMAL,
+# mmap/page cache, busy timeout and persistent connections
+SQLITE_TUNING = os.getenv('SQLITE_TUNING', 'False').lower() == 'true'
+SQLITE_PRAGMAS = {
+    **DEFAULT_PRAGMAS,
+    'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', DEFAULT_PRAGMAS['mmap_size'])),
+    'cache_size': int(os.getenv('SQLITE_CACHE_SIZE', DEFAULT_PRAGMAS['cache_size'])),
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', DEFAULT_PRAGMAS['busy_timeout'])),
+}
+if SQLITE_TUNING:
+    tune_databases(DATABASES)
+
+# Static files (CSS, JavaScript, Images)
+STATIC_URL = '/static/'
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+STATICFILES_DIRS = [
+    BASE_DIR / 'static',
+    BASE_DIR / 'theme' / 'static',
+]
+
+# Media files
+MEDIA_URL = '/media/'
+MEDIA_ROOT = os.getenv('MEDIA_ROOT', BASE_DIR / 'media')
+
+# Serve MEDIA_ROOT through sitecore.media.serve_media (Range, ETag, immutable
+# caching for renditions). Turned off when media lives in object storage.
+SERVE_MEDIA = os.getenv('SERVE_MEDIA', 'true').lower() == 'true'
+MEDIA_CACHE_MAX_AGE = int(os.getenv('MEDIA_CACHE_MAX_AGE', '3600'))
+
+# exists()/size()/url() memoization for the media storages in storage_backends.py,
+# shared so a save or delete in one worker is seen by the others. A cache of
+# its own, sized for the media tree: culling it must not evict the keys in 'shared'
+MEDIA_METADATA_CACHE = 'media-metadata'
+MEDIA_METADATA_CACHE_TTL = int(os.getenv('MEDIA_METADATA_CACHE_TTL', '300'))
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Seen by every worker on the host; small, rarely written keys only
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('SHARED_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'portfolio-shared-cache')),
+        'TIMEOUT': None,
+    },
+    'media-metadata': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv(
+            'MEDIA_METADATA_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'portfolio-media-metadata')
+        ),
+        'OPTIONS': {
+            # About three keys per file (exists/size/url) and one listing per directory
+            'MAX_ENTRIES': int(os.getenv('MEDIA_METADATA_CACHE_MAX_ENTRIES', '50000')),
         },
-    ]
+    },
+}
+
+# Version key of the per-process Profile cache (main/context_processors.py)
+PROFILE_VERSION_CACHE = 'shared'
+
+# Version key of the per-process search suggestion index (main/typeahead.py)
+TYPEAHEAD_VERSION_CACHE = 'shared'
+
+# Contact form spam pre-filter (main/spam.py)
+CONTACT_MIN_FILL_SECONDS = int(os.getenv('CONTACT_MIN_FILL_SECONDS', '3'))
+CONTACT_FORM_MAX_AGE = 24 * 60 * 60
+CONTACT_FILTER_WINDOW = int(os.getenv('CONTACT_FILTER_WINDOW', '3600'))
+# Reverse proxies in front of the app that append to X-Forwarded-For; 0 uses
+# REMOTE_ADDR as the client's IP
+TRUSTED_PROXY_COUNT = int(os.getenv('TRUSTED_PROXY_COUNT', '0'))
+SPAM_COUNTER_CACHE = 'shared'
+
+# WhiteNoise configuration
+STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+
+# Email backend for development
+EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+
+# Application definition
+INSTALLED_APPS = [
+    'django.contrib.admin',
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
     
-    WSGI_APPLICATION = 'sitecore.wsgi.application'
+    # Third-party apps
+    'tailwind',
+    'theme',
+    'versatileimagefield',
     
-    # Password validation
-    AUTH_PASSWORD_VALIDATORS = [
-        {
-            'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
-        },
-        {
-            'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
-        },
-        {
-            'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
-        },
-        {
-            'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
+    # Local apps
+    'main',
+]
+
+MIDDLEWARE = [
+    'django.middleware.security.SecurityMiddleware',
+    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'sitecore.db_router.replica_routing_middleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'main.renditions.rendition_resolver_middleware',
+]
+
+ROOT_URLCONF = 'sitecore.urls'
+
+TEMPLATES = [
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'DIRS': [BASE_DIR / 'templates'],
+        'APP_DIRS': True,
+        'OPTIONS': {
+            'context_processors': [
+                'django.template.context_processors.debug',
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+                'django.contrib.messages.context_processors.messages',
+                'main.context_processors.profile',
+            ],
         },
+    },
+]
+
+# Optional Jinja2 engine (sitecore/jinja2.py, needs the Jinja2 package): the
+# public pages in jinja2/ are then found before their Django versions
+JINJA2_TEMPLATES = os.getenv('JINJA2_TEMPLATES', 'false').lower() == 'true'
+JINJA2_BYTECODE_DIR = os.getenv('JINJA2_BYTECODE_DIR', os.path.join(tempfile.gettempdir(), 'portfolio-jinja2'))
+JINJA2_ENGINE = {
+    'BACKEND': 'django.template.backends.jinja2.Jinja2',
+    'DIRS': [BASE_DIR / 'jinja2'],
+    'APP_DIRS': False,
+    'OPTIONS': {
+        'environment': 'sitecore.jinja2.environment',
+        'context_processors': TEMPLATES[0]['OPTIONS']['context_processors'],
+    },
+}
+if JINJA2_TEMPLATES:
+    TEMPLATES.insert(0, JINJA2_ENGINE)
+
+WSGI_APPLICATION = 'sitecore.wsgi.application'
+ASGI_APPLICATION = 'sitecore.asgi.application'
+
+# Server mode: 'wsgi' runs sync gunicorn workers, 'asgi' runs uvicorn workers
+# and routes the read-heavy pages to the async views in main/async_views.py
+SERVER_MODE = os.getenv('SERVER_MODE', 'wsgi')
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', str(SERVER_MODE == 'asgi')).lower() == 'true'
+
+# Password validation
+AUTH_PASSWORD_VALIDATORS = [
+    {
+        'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
+    },
+]
+
+# Internationalization
+LANGUAGE_CODE = 'en-us'
+TIME_ZONE = 'UTC'
+USE_I18N = True
+USE_TZ = True
+
+# Static files (CSS, JavaScript, Images)
+STATIC_URL = 'static/'
+
+# Default primary key field type
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Tailwind configuration
+TAILWIND_APP_NAME = 'theme'
+INTERNAL_IPS = ["127.0.0.1"]
+
+# VersatileImageField Configuration
+VERSATILEIMAGEFIELD_SETTINGS = {
+    'cache_length': 2592000,
+    'cache_name': 'versatileimagefield_cache',
+    'jpeg_resize_quality': 85,
+    'sized_directory_name': '__sized__',
+    'filtered_directory_name': '__filtered__',
+    'placeholder_directory_name': '__placeholder__',
+    'create_images_on_demand': True,
+    'progressive_jpeg': False
+}
+
+# Upload-time image normalization (main/uploads.py): originals are capped at
+# IMAGE_UPLOAD_MAX_EDGE px and anything over IMAGE_UPLOAD_MAX_PIXELS is rejected
+IMAGE_UPLOAD_MAX_EDGE = int(os.getenv('IMAGE_UPLOAD_MAX_EDGE', '2560'))
+IMAGE_UPLOAD_MAX_PIXELS = int(os.getenv('IMAGE_UPLOAD_MAX_PIXELS', '50000000'))
+IMAGE_UPLOAD_QUALITY = int(os.getenv('IMAGE_UPLOAD_QUALITY', '85'))
+
+# Admin bulk render upload (main/chunked_uploads.py): where the files are
+# assembled, the largest accepted file and how long unfinished ones are kept
+RENDER_UPLOAD_DIR = os.getenv('RENDER_UPLOAD_DIR', os.path.join(tempfile.gettempdir(), 'render-uploads'))
+RENDER_UPLOAD_MAX_SIZE = int(os.getenv('RENDER_UPLOAD_MAX_SIZE', 50 * 1024 * 1024))
+RENDER_UPLOAD_MAX_AGE = 24 * 60 * 60
+
+# Signed on-the-fly resizes (main/image_resize.py): where the variants are
+# cached, the cache's size cap (least recently used evicted first) and the
+# largest width or height that can be asked for
+IMAGE_RESIZE_CACHE_DIR = os.getenv('IMAGE_RESIZE_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'portfolio-resized'))
+IMAGE_RESIZE_CACHE_MAX_BYTES = int(os.getenv('IMAGE_RESIZE_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+IMAGE_RESIZE_MAX_EDGE = int(os.getenv('IMAGE_RESIZE_MAX_EDGE', IMAGE_UPLOAD_MAX_EDGE))
+
+VERSATILEIMAGEFIELD_RENDITION_KEY_SETS = {
+    'profile_image': [
+        ('full_size', 'url'),
+        ('thumbnail', 'thumbnail__100x100'),
+        ('small_square_crop', 'crop__150x150'),
+        ('medium_square_crop', 'crop__300x300'),
+        ('large_square_crop', 'crop__500x500'),
+    ],
+    'project_featured': [
+        ('full_size', 'url'),
+        ('thumbnail', 'thumbnail__100x75'),
+        ('small', 'thumbnail__320x240'),
+        ('medium', 'thumbnail__640x480'),
+        ('large', 'thumbnail__1024x768'),
+        ('hero', 'thumbnail__1600x900'),
+    ],
+    'project_gallery': [
+        ('full_size', 'url'),
+        ('thumbnail', 'thumbnail__100x75'),
+        ('card', 'thumbnail__400x300'),
+        ('gallery', 'thumbnail__800x600'),
+        ('lightbox', 'thumbnail__1200x900'),
     ]
-    
-    # Internationalization
-    LANGUAGE_CODE = 'en-us'
-    TIME_ZONE = 'UTC'
-    USE_I18N = True
-    USE_TZ = True
-    
-    # Static files (CSS, JavaScript, Images)
-    STATIC_URL = 'static/'
-    
-    # Default primary key field type
-    DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
-    
-    # Tailwind configuration
-    TAILWIND_APP_NAME = 'theme'
-    INTERNAL_IPS = ["127.0.0.1"]
-    
-    # VersatileImageField Configuration
-    VERSATILEIMAGEFIELD_SETTINGS = {
-        'cache_length': 2592000,
-        'cache_name': 'versatileimagefield_cache',
-        'jpeg_resize_quality': 85,
-        'sized_directory_name': '__sized__',
-        'filtered_directory_name': '__filtered__',
-        'placeholder_directory_name': '__placeholder__',
-        'create_images_on_demand': True,
-        'progressive_jpeg': False
-    }
-    
-    VERSATILEIMAGEFIELD_RENDITION_KEY_SETS = {
-        'profile_image': [
-            ('full_size', 'url'),
-            ('thumbnail', 'thumbnail__100x100'),
-            ('small_square_crop', 'crop__150x150'),
-            ('medium_square_crop', 'crop__300x300'),
-            ('large_square_crop', 'crop__500x500'),
-        ],
-        'project_featured': [
-            ('full_size', 'url'),
-            ('thumbnail', 'thumbnail__100x75'),
-            ('small', 'thumbnail__320x240'),
-            ('medium', 'thumbnail__640x480'),
-            ('large', 'thumbnail__1024x768'),
-            ('hero', 'thumbnail__1600x900'),
-        ],
-        'project_gallery': [
-            ('full_size', 'url'),
-            ('thumbnail', 'thumbnail__100x75'),
-            ('card', 'thumbnail__400x300'),
-            ('gallery', 'thumbnail__800x600'),
-            ('lightbox', 'thumbnail__1200x900'),
-        ]
-    }
+}
+
+# Production overrides
+if ENVIRONMENT == 'production':
+    from .production import *
+
+from . import startup
+startup.mark('settings loaded')
@@ -0,0 +1,118 @@
+"""
+Startup timing report.
+
+Records named marks while the process boots (settings loaded, apps ready,
+application loaded, warm-up done) and prints a report once the first real
+request has been answered, i.e. the time-to-first-byte a visitor sees after a
+cold boot. Times are measured from process start as reported by /proc, falling
+back to the moment this module was imported.
+
+Imports known to be slow (TIMED_IMPORTS) are timed by a meta path hook
+rather than by marks around the import statements, so no module has to be
+written around the report; the report shows when they started and finished.
+`python -X importtime` gives the full breakdown.
+"""
+import os
+import sys
+import time
+
+IMPORTED_AT = time.time()
+
+
+def process_start_time():
+    """Wall-clock time the current process was started (Linux only)"""
+    try:
+        with open('/proc/self/stat') as f:
+            # Fields after the command name; starttime is field 22 of the full line
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    age = uptime - start_ticks / os.sysconf('SC_CLK_TCK')
+    return time.time() - age
+
+
+PROCESS_START = process_start_time() or IMPORTED_AT
+
+marks = [('process start', PROCESS_START)]
+_reported = False
+
+
+def mark(name):
+    """Record that the boot reached `name`"""
+    marks.append((name, time.time()))
+
+
+class ImportTimer:
+    """
+    Meta path hook marking the start and end of the first import of each
+    module in `names` (found by the other finders, then timed around exec_module)
+    """
+
+    def __init__(self, names):
+        self.names = dict(names)
+
+    def find_spec(self, fullname, path, target=None):
+        label = self.names.pop(fullname, None)
+        if label is None:
+            return None
+        if not self.names:
+            sys.meta_path.remove(self)
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+        if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+            exec_module = spec.loader.exec_module
+
+            def timed_exec_module(module):
+                mark(f'{label} import started')
+                try:
+                    exec_module(module)
+                finally:
+                    mark(f'{label} imported')
+
+            spec.loader.exec_module = timed_exec_module
+        return spec
+
+
+# Module -> label in the report. Pillow can't be deferred: versatileimagefield
+# imports it (fields -> files -> mixins -> datastructures.base) and the models
+# need the field, so its import shows up inside the models' import.
+TIMED_IMPORTS = {'PIL.Image': 'Pillow'}
+
+if not sys.modules.keys() & TIMED_IMPORTS.keys():
+    sys.meta_path.insert(0, ImportTimer(TIMED_IMPORTS))
+
+
+def format_report(first_response):
+    lines = [f'Startup timing (pid {os.getpid()}):']
+    previous = PROCESS_START
+    for name, at in marks[1:] + [('first response', first_response)]:
+        lines.append(
+            f'  {name:<22} {(at - PROCESS_START) * 1000:>8.0f}ms  (+{(at - previous) * 1000:.0f}ms)'
+        )
+        previous = at
+    return '\n'.join(lines)
+
+
+def report_first_response(sender, **kwargs):
+    global _reported
+    # Warm-up requests made through django.test.Client don't count
+    if _reported or sender is None or sender.__module__.startswith('django.test'):
+        return
+    _reported = True
+    print(format_report(time.time()), flush=True)
+
+
+def install():
+    """Called by the WSGI/ASGI entry points once the application is loaded"""
+    from django.core.signals import request_finished
+
+    mark('application loaded')
+    request_finished.connect(report_first_response, dispatch_uid='startup-report')
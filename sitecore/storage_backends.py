@@ -1,28 +1,197 @@
-from storages.backends.s3boto3 import S3Boto3Storage
+import hashlib
+import posixpath
+
 from django.conf import settings
+from django.core.cache import caches
+from django.core.files.storage import FileSystemStorage
+from django.utils.functional import cached_property
+
+from main.uploads import IMMUTABLE_CACHE_CONTROL, is_content_addressed
 
 try:
     from storages.backends.s3boto3 import S3Boto3Storage
+    from storages.utils import clean_name
     HAS_S3 = True
 except ImportError:
     HAS_S3 = False
     S3Boto3Storage = None
 
-class StaticStorage(S3Boto3Storage):
-    location = 'static'
-    default_acl = 'public-read'
-    file_overwrite = True
 
-class PublicMediaStorage(S3Boto3Storage):
-    location = 'media'
-    default_acl = 'public-read'
-    file_overwrite = False
+class CachedMetadataMixin:
+    """
+    Memoizes exists(), size(), get_modified_time() and url() in the Django cache.
+
+    versatileimagefield checks every rendition with exists()/url(), which is a
+    network round trip per call on S3. A miss on exists() lists the whole
+    directory once and caches the listing under one key, so the following
+    lookups for sibling renditions are cache hits, and a file is only ever
+    reported missing by the listing it is missing from (an evicted key means
+    listing again, never a wrong answer). Entries expire after
+    MEDIA_METADATA_CACHE_TTL seconds; save() and delete() record the file's
+    new state and drop its directory's listing. The cache (MEDIA_METADATA_CACHE)
+    is shared by the workers so they all see the update. Code about to rely
+    on a file being there (skipping a write because it is) asks
+    exists_uncached() instead.
+    """
+    metadata_cache_alias = None
+    metadata_cache_ttl = None
+
+    @cached_property
+    def metadata_cache(self):
+        return caches[self.metadata_cache_alias or getattr(settings, 'MEDIA_METADATA_CACHE', 'default')]
+
+    @cached_property
+    def metadata_ttl(self):
+        if self.metadata_cache_ttl is not None:
+            return self.metadata_cache_ttl
+        return getattr(settings, 'MEDIA_METADATA_CACHE_TTL', 300)
+
+    @property
+    def url_ttl(self):
+        return self.metadata_ttl
+
+    def metadata_key(self, kind, name):
+        namespace = f'{self.__class__.__name__}:{getattr(self, "location", "")}'
+        digest = hashlib.md5(f'{namespace}:{name}'.encode()).hexdigest()
+        return f'media-meta:{kind}:{digest}'
+
+    def list_directory(self, directory):
+        """
+        Return {filename: (size, modified_time) or None} for a directory.
+
+        Backends whose listing call returns metadata (S3) fill in the tuple so
+        size() and get_modified_time() can be answered from the same call.
+        """
+        try:
+            _, files = self.listdir(directory)
+        except (FileNotFoundError, NotADirectoryError):
+            return {}
+        return {filename: None for filename in files}
+
+    def listing(self, directory):
+        """list_directory(directory), from the cache when it was listed recently"""
+        key = self.metadata_key('listing', directory)
+        entries = self.metadata_cache.get(key)
+        if entries is None:
+            entries = self.list_directory(directory)
+            self.metadata_cache.set(key, entries, self.metadata_ttl)
+        return entries
+
+    def listed_metadata(self, name):
+        """(size, modified_time) of `name` from its directory's listing, or None"""
+        return self.listing(posixpath.dirname(name)).get(posixpath.basename(name))
+
+    def exists(self, name):
+        cached = self.metadata_cache.get(self.metadata_key('exists', name))
+        if cached is not None:
+            return cached
+        return posixpath.basename(name) in self.listing(posixpath.dirname(name))
+
+    def exists_uncached(self, name):
+        """exists() answered by the storage itself; the cache is refreshed with the answer"""
+        exists = super().exists(name)
+        self.metadata_cache.set(self.metadata_key('exists', name), exists, self.metadata_ttl)
+        return exists
+
+    def size(self, name):
+        key = self.metadata_key('size', name)
+        value = self.metadata_cache.get(key)
+        if value is None:
+            metadata = self.listed_metadata(name)
+            value = metadata[0] if metadata else super().size(name)
+            self.metadata_cache.set(key, value, self.metadata_ttl)
+        return value
+
+    def get_modified_time(self, name):
+        key = self.metadata_key('modified', name)
+        value = self.metadata_cache.get(key)
+        if value is None:
+            metadata = self.listed_metadata(name)
+            value = metadata[1] if metadata else super().get_modified_time(name)
+            self.metadata_cache.set(key, value, self.metadata_ttl)
+        return value
+
+    def url(self, name, *args, **kwargs):
+        if args or any(value is not None for value in kwargs.values()):
+            return super().url(name, *args, **kwargs)
 
-class PrivateMediaStorage(S3Boto3Storage):
-    location = 'private'
-    default_acl = 'private'
-    file_overwrite = False
-    custom_domain = False
+        key = self.metadata_key('url', name)
+        value = self.metadata_cache.get(key)
+        if value is None:
+            value = super().url(name)
+            self.metadata_cache.set(key, value, self.url_ttl)
+        return value
+
+    def forget(self, name, exists):
+        self.metadata_cache.delete_many([
+            self.metadata_key('size', name),
+            self.metadata_key('modified', name),
+            self.metadata_key('url', name),
+            self.metadata_key('listing', posixpath.dirname(name)),
+        ])
+        self.metadata_cache.set(self.metadata_key('exists', name), exists, self.metadata_ttl)
+
+    def _save(self, name, content):
+        name = super()._save(name, content)
+        self.forget(name, exists=True)
+        return name
+
+    def delete(self, name):
+        super().delete(name)
+        self.forget(name, exists=False)
+
+
+class CachedFileSystemStorage(CachedMetadataMixin, FileSystemStorage):
+    """Local media storage with the metadata cache (also used in tests)"""
+
+
+if HAS_S3:
+    class CachedS3Storage(CachedMetadataMixin, S3Boto3Storage):
+        """S3 storage whose directory listings also provide sizes and modified times"""
+
+        @property
+        def url_ttl(self):
+            # Signed URLs must be regenerated well before they expire
+            if self.querystring_auth:
+                return min(self.metadata_ttl, self.querystring_expire // 2)
+            return self.metadata_ttl
+
+        def list_directory(self, directory):
+            path = self._normalize_name(clean_name(directory))
+            if path and not path.endswith('/'):
+                path += '/'
+
+            entries = {}
+            paginator = self.connection.meta.client.get_paginator('list_objects_v2')
+            for page in paginator.paginate(Bucket=self.bucket_name, Delimiter='/', Prefix=path):
+                for entry in page.get('Contents', ()):
+                    if entry['Key'] != path:
+                        filename = posixpath.relpath(entry['Key'], path)
+                        entries[filename] = (entry['Size'], entry['LastModified'])
+            return entries
+
+    class StaticStorage(S3Boto3Storage):
+        location = 'static'
+        default_acl = 'public-read'
+        file_overwrite = True
+
+    class PublicMediaStorage(CachedS3Storage):
+        location = 'media'
+        default_acl = 'public-read'
+        file_overwrite = False
+        
+        def get_object_parameters(self, name):
+            params = super().get_object_parameters(name)
+            if is_content_addressed(name):
+                # The name changes whenever the content does
+                params.setdefault('CacheControl', IMMUTABLE_CACHE_CONTROL)
+            return params
+
+    class PrivateMediaStorage(CachedS3Storage):
+        location = 'private'
+        default_acl = 'private'
+        file_overwrite = False
+        custom_domain = False
 
 # Cloudinary configuration (alternative to S3)
 def configure_cloudinary():
@@ -30,7 +199,7 @@ def configure_cloudinary():
         import cloudinary
         import cloudinary.uploader
         import cloudinary.api
-        
+
         cloudinary.config(
             cloud_name=settings.CLOUDINARY_CLOUD_NAME,
             api_key=settings.CLOUDINARY_API_KEY,
@@ -38,4 +207,4 @@ def configure_cloudinary():
             secure=True
         )
     except ImportError:
-        raise ImportError("Cloudinary package is not installed. Install it with: pip install cloudinary")
\ No newline at end of file
+        raise ImportError("Cloudinary package is not installed. Install it with: pip install cloudinary")
@@ -0,0 +1,124 @@
+"""
+Boot-time warm-up.
+
+Pays the one-off costs of a fresh process (imports, URL resolver, template
+compilation, DB connection, first render of the main pages) before the server
+accepts traffic, so the first visitor after a spin-down doesn't pay for them.
+Called from the gunicorn ``when_ready`` hook in sitecore/gunicorn_conf.py.
+"""
+import logging
+import time
+from importlib import import_module
+from pathlib import Path
+
+from django.conf import settings
+
+from sitecore import startup
+
+logger = logging.getLogger(__name__)
+
+VIEW_MODULES = ['main.views', 'main.async_views']
+WARM_PATHS = ['/', '/projects/']
+WARM_DETAIL_PAGES = 3
+
+
+def import_views():
+    import_module(settings.ROOT_URLCONF)
+    for module in VIEW_MODULES:
+        import_module(module)
+
+
+def resolve_urls():
+    from django.urls import NoReverseMatch, get_resolver, reverse
+
+    resolver = get_resolver()
+    for name in [key for key in resolver.reverse_dict if isinstance(key, str)]:
+        try:
+            reverse(name)
+        except NoReverseMatch:
+            # Pattern needs arguments, populating the resolver is enough
+            pass
+    for path in WARM_PATHS:
+        resolver.resolve(path)
+
+
+def compile_templates():
+    from django.template import engines
+
+    count = 0
+    # Each engine's own copies (the Jinja2 pages, when enabled, and the Django ones)
+    for engine in engines.all():
+        for template_dir in engine.dirs:
+            template_dir = Path(template_dir)
+            for path in sorted((template_dir / 'main').rglob('*.html')):
+                engine.get_template(path.relative_to(template_dir).as_posix())
+                count += 1
+    return count
+
+
+def open_connections():
+    from django.db import connections
+
+    for alias in connections:
+        connections[alias].ensure_connection()
+
+
+def warm_host():
+    for host in settings.ALLOWED_HOSTS:
+        if host and host != '*':
+            return host.lstrip('.')
+    return 'localhost'
+
+
+def prime_pages():
+    from django.test import Client
+    from main.models import Project
+
+    slugs = Project.objects.filter(is_published=True).values_list('slug', flat=True)[:WARM_DETAIL_PAGES]
+    paths = WARM_PATHS + [f'/projects/{slug}/' for slug in slugs]
+
+    client = Client(HTTP_HOST=warm_host())
+    for path in paths:
+        response = client.get(path, secure=not settings.DEBUG)
+        if response.status_code != 200:
+            logger.warning('Warm-up request to %s returned %s', path, response.status_code)
+    return len(paths)
+
+
+STEPS = [
+    ('import views', import_views),
+    ('resolve urls', resolve_urls),
+    ('compile templates', compile_templates),
+    ('open db connections', open_connections),
+    ('prime page caches', prime_pages),
+]
+
+
+def warm_up():
+    """
+    Run every warm-up step and return a list of (step, seconds) tuples.
+
+    A failing step is logged and skipped so a cold database or a broken page
+    never stops the server from booting.
+    """
+    from django.db import connections
+
+    timings = []
+    for name, step in STEPS:
+        start = time.perf_counter()
+        try:
+            step()
+        except Exception:
+            logger.exception('Warm-up step "%s" failed', name)
+        timings.append((name, time.perf_counter() - start))
+
+    # Connections must not be shared with forked workers
+    connections.close_all()
+    startup.mark('warm-up done')
+    return timings
+
+
+def format_timings(timings):
+    total = sum(seconds for _, seconds in timings)
+    parts = ', '.join(f'{name} {seconds * 1000:.0f}ms' for name, seconds in timings)
+    return f'Warm-up finished in {total * 1000:.0f}ms ({parts})'
@@ -10,6 +10,10 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/wsgi/
 import os
 from django.core.wsgi import get_wsgi_application
 
+from sitecore import startup
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sitecore.settings')
 
-application = get_wsgi_application()
\ No newline at end of file
+application = get_wsgi_application()
+
+startup.install()
\ No newline at end of file